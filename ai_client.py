@@ -0,0 +1,240 @@
+"""
+AI 模型客户端
+=============
+Gemini REST 接口（generateContent / streamGenerateContent）的非阻塞客户端：
+
+- 进程内只创建一次，请求在后台线程执行，界面轮询结果，可随时取消；
+- 每个请求有连接 / 读取超时，上游变慢不会拖住页面；
+- 流式接口（SSE）边收边累积，界面轮询 partial() 逐段显示，缩短首字等待；
+- 应答按规范化后的 (问题, 报表, 期间, 币种, 模型) 缓存到 SQLite，跨会话、跨用户复用；
+- base_url 可配置，开发时指向 tools/stub_model_server.py 启动的本地桩服务。
+"""
+
+import hashlib
+import http.client
+import json
+import socket
+import threading
+import unicodedata
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com"
+DEFAULT_MODEL    = "gemini-2.0-flash-exp"
+DEFAULT_TIMEOUT  = 20.0
+
+
+class AIError(Exception):
+    """上游模型调用失败（网络、超时、非 200 应答或应答格式不符）"""
+
+
+# ====================================================================
+# 应答缓存
+# ====================================================================
+def normalize_query(text: str) -> str:
+    """全角转半角、去首尾空白、合并连续空白、英文转小写"""
+    return " ".join(unicodedata.normalize("NFKC", text).split()).casefold()
+
+
+def cache_key(query: str, report: str, period: str, currency: str, model: str) -> str:
+    raw = "\x1f".join((normalize_query(query), report, period, currency, model))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """ai_cache 表读写；db 为 db.Database"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def get(self, key: str):
+        row = self.db.query_one("SELECT response FROM ai_cache WHERE key=?", (key,))
+        if row is None:
+            return None
+        try:
+            self.db.execute("UPDATE ai_cache SET hits = hits + 1 WHERE key=?", (key,))
+        except Exception:
+            pass
+        return row[0]
+
+    def put(self, key: str, query: str, report: str, period: str, currency: str,
+            model: str, response: str):
+        self.db.execute(
+            "INSERT OR REPLACE INTO ai_cache (key,query,report,period,currency,model,response,created_at,hits) "
+            "VALUES (?,?,?,?,?,?,?,?,0)",
+            (key, query, report, period, currency, model, response, datetime.now().isoformat()),
+        )
+
+
+# ====================================================================
+# 请求
+# ====================================================================
+class AIRequest:
+    """进行中的一次模型调用：done() 轮询、result() 取结果、cancel() 取消"""
+
+    def __init__(self):
+        self.future: Future = Future()
+        self._conn = None
+        self._sock = None
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._chunks: list = []
+
+    def _attach(self, conn):
+        """记录已建立的连接；套接字单独保存——应答要求关闭连接时 http.client 会清空 conn.sock，
+        而应答体仍在该套接字上读取"""
+        with self._lock:
+            if self._cancelled.is_set():
+                conn.close()
+                raise CancelledError()
+            self._conn = conn
+            self._sock = conn.sock
+
+    def cancel(self):
+        """取消请求：关闭连接，后台线程阻塞中的读取随即中断"""
+        self._cancelled.set()
+        with self._lock:
+            if self._sock is not None:
+                try:
+                    self._sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            if self._conn is not None:
+                self._conn.close()
+        self.future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _append(self, text: str):
+        with self._lock:
+            self._chunks.append(text)
+
+    def partial(self) -> str:
+        """流式请求目前已收到的文本"""
+        with self._lock:
+            return "".join(self._chunks)
+
+    def done(self) -> bool:
+        return self.future.done()
+
+    def result(self, timeout: float = None) -> str:
+        return self.future.result(timeout)
+
+
+class GeminiClient:
+    """Gemini REST 客户端（线程安全，进程内共用一个）"""
+
+    def __init__(self, api_key: str, base_url: str = DEFAULT_BASE_URL, model: str = DEFAULT_MODEL,
+                 timeout: float = DEFAULT_TIMEOUT, cache: ResponseCache = None, max_workers: int = 8):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.timeout = timeout
+        self.cache = cache
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai")
+
+    def _post(self, req: AIRequest, path: str, body: dict) -> http.client.HTTPResponse:
+        url = urlsplit(self.base_url)
+        conn_cls = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conn = conn_cls(url.netloc, timeout=self.timeout)
+        conn.connect()
+        req._attach(conn)
+        sep = "&" if "?" in path else "?"
+        conn.request(
+            "POST", f"{url.path}{path}{sep}key={self.api_key}",
+            body=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json; charset=utf-8"},
+        )
+        resp = conn.getresponse()
+        if resp.status != 200:
+            detail = resp.read(500).decode("utf-8", "replace")
+            raise AIError(f"HTTP {resp.status}: {detail}")
+        return resp
+
+    @staticmethod
+    def _body(prompt: str) -> dict:
+        return {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+
+    @staticmethod
+    def _text(payload: dict) -> str:
+        try:
+            parts = payload["candidates"][0]["content"]["parts"]
+        except (KeyError, IndexError, TypeError):
+            raise AIError(f"无法解析的应答：{str(payload)[:200]}") from None
+        return "".join(p.get("text", "") for p in parts)
+
+    def _generate(self, req: AIRequest, prompt: str) -> str:
+        try:
+            resp = self._post(req, f"/v1beta/models/{self.model}:generateContent", self._body(prompt))
+            return self._text(json.loads(resp.read().decode("utf-8"))).strip()
+        except (CancelledError, AIError):
+            raise
+        except Exception as e:
+            if req.cancelled:
+                raise CancelledError() from None
+            raise AIError(f"{type(e).__name__}: {e}") from None
+        finally:
+            if req._conn is not None:
+                req._conn.close()
+
+    def _stream(self, req: AIRequest, prompt: str) -> str:
+        """SSE 流式生成：每个 data 事件的文本追加到 req，返回完整文本"""
+        try:
+            resp = self._post(req, f"/v1beta/models/{self.model}:streamGenerateContent?alt=sse",
+                              self._body(prompt))
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                line = line.decode("utf-8").strip()
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                req._append(self._text(json.loads(data)))
+            if req.cancelled:      # 取消时连接被关闭，readline 读到 EOF 正常退出
+                raise CancelledError()
+            return req.partial().strip()
+        except (CancelledError, AIError):
+            raise
+        except Exception as e:
+            if req.cancelled:
+                raise CancelledError() from None
+            raise AIError(f"{type(e).__name__}: {e}") from None
+        finally:
+            if req._conn is not None:
+                req._conn.close()
+
+    def submit(self, prompt: str, cache_on: tuple = None, stream: bool = False) -> AIRequest:
+        """后台发起请求并立即返回。cache_on = (问题, 报表, 期间, 币种) 时先查缓存、成功后写缓存；
+        stream=True 走流式接口，进行中可用 partial() 取已生成的部分"""
+        req = AIRequest()
+        key = cache_key(*cache_on, self.model) if cache_on and self.cache else None
+        if key:
+            hit = self.cache.get(key)
+            if hit is not None:
+                req._append(hit)
+                req.future.set_result(hit)
+                return req
+
+        def run():
+            if not req.future.set_running_or_notify_cancel():
+                return
+            try:
+                text = (self._stream if stream else self._generate)(req, prompt)
+            except BaseException as e:
+                req.future.set_exception(e)
+                return
+            if key and text:
+                try:
+                    self.cache.put(key, *cache_on, self.model, text)
+                except Exception:
+                    pass
+            req.future.set_result(text)
+
+        self._pool.submit(run)
+        return req
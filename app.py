@@ -5,14 +5,36 @@
 央企级 · 智能财务 · 多币种 · AI驱动
 """
 
+from __future__ import annotations
+
 import streamlit as st
-import pandas as pd
 import os
-import sqlite3
-from datetime import datetime
-from pathlib import Path
+import hashlib
 import io
+from datetime import datetime, timedelta
+from pathlib import Path
+import threading
 import time
+import zipfile
+from functools import partial
+import multiprocessing as mp
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING
+
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from ai_client import DEFAULT_BASE_URL, DEFAULT_MODEL, DEFAULT_TIMEOUT, AIError, GeminiClient, ResponseCache
+import metrics
+from db import Database
+from jobs import Job, JobError, JobQueue
+from rule_engine import RuleError, load_rules
+
+# pandas / numpy / xlsxwriter 及依赖它们的报表模块在首次用到时才导入：
+# 冷启动时页头、期间选择和侧边栏不必等这些库加载完即可显示
+if TYPE_CHECKING:
+    from engine import LedgerFacts, ReportEngine
+    from workbook import LazyWorkbook, SheetCache
 
 # ── 页面配置 ──
 st.set_page_config(
@@ -45,42 +67,6 @@ def get_api_key(key_name: str):
     return None
 
 
-def format_cell(x):
-    if x is None or (isinstance(x, float) and pd.isna(x)):
-        return ""
-    if isinstance(x, (int, float)):
-        if float(x) == int(x):
-            return f"{int(x)}"
-        return f"{x:.2f}"
-    if isinstance(x, str):
-        s = x.strip()
-        if not s:
-            return ""
-        try:
-            num = float(s)
-            if num == int(num):
-                return f"{int(num)}"
-            return f"{num:.2f}"
-        except (ValueError, OverflowError):
-            pass
-    return str(x)
-
-
-def prepare_for_display(df):
-    display_df = df.copy()
-    new_cols = []
-    for i, c in enumerate(display_df.columns):
-        s = str(c)
-        new_cols.append(f"列{i+1}" if s.startswith("Unnamed") else s)
-    display_df.columns = new_cols
-    for col in display_df.columns:
-        if display_df[col].dtype == object:
-            display_df[col] = display_df[col].ffill()
-    for col in display_df.columns:
-        display_df[col] = display_df[col].apply(format_cell)
-    return display_df
-
-
 def period_options():
     now = datetime.now()
     opts = []
@@ -124,19 +110,6 @@ def fmt_size(b):
         return f"{b / 1024 ** 2:.1f} MB"
 
 
-def read_excel_file(path_or_bytes, ext: str) -> dict:
-    if ext == "csv":
-        if isinstance(path_or_bytes, (str, Path)):
-            return {"Sheet1": pd.read_csv(path_or_bytes)}
-        return {"Sheet1": pd.read_csv(io.BytesIO(path_or_bytes))}
-    engine = "xlrd" if ext == "xls" else "openpyxl"
-    if isinstance(path_or_bytes, (str, Path)):
-        xls = pd.ExcelFile(path_or_bytes, engine=engine)
-    else:
-        xls = pd.ExcelFile(io.BytesIO(path_or_bytes), engine=engine)
-    return {name: xls.parse(name) for name in xls.sheet_names}
-
-
 # ====================================================================
 # 路径 & 数据库
 # ====================================================================
@@ -144,51 +117,279 @@ BASE_DIR     = Path(__file__).parent
 DATA_DIR     = BASE_DIR / "data"
 OUTPUT_DIR   = BASE_DIR / "output"
 MAPPING_DIR  = BASE_DIR / "mappings"
+RULES_DIR    = BASE_DIR / "rules"
 TEMPLATE_DIR = BASE_DIR / "templates"
 DB_PATH      = DATA_DIR / "platform.db"
 
-for _d in [DATA_DIR, OUTPUT_DIR, MAPPING_DIR, TEMPLATE_DIR]:
-    _d.mkdir(exist_ok=True)
-
-
-def init_db():
-    conn = sqlite3.connect(str(DB_PATH))
-    c = conn.cursor()
-    c.execute("""CREATE TABLE IF NOT EXISTS uploads (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        period TEXT NOT NULL DEFAULT '',
-        filename TEXT NOT NULL,
-        file_type TEXT,
-        sheet_count INTEGER DEFAULT 0,
-        row_count INTEGER DEFAULT 0,
-        upload_time TEXT NOT NULL,
-        file_path TEXT,
-        status TEXT DEFAULT '已上传'
-    )""")
-    c.execute("""CREATE TABLE IF NOT EXISTS generations (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        period TEXT NOT NULL DEFAULT '',
-        source_upload_id INTEGER,
-        ai_model TEXT,
-        output_filename TEXT,
-        output_path TEXT,
-        status TEXT DEFAULT '生成中',
-        created_at TEXT NOT NULL,
-        duration_seconds REAL
-    )""")
-    for tbl in ("uploads", "generations"):
-        cols = [r[1] for r in c.execute(f"PRAGMA table_info({tbl})").fetchall()]
-        if "period" not in cols:
-            c.execute(f"ALTER TABLE {tbl} ADD COLUMN period TEXT NOT NULL DEFAULT ''")
-    conn.commit()
-    conn.close()
-
-
-init_db()
-
-
-def get_db():
-    return sqlite3.connect(str(DB_PATH))
+
+@st.cache_resource
+def get_database() -> Database:
+    """进程级数据库连接池；运行期目录创建、表结构迁移只在首次创建时执行一次"""
+    for d in [DATA_DIR, OUTPUT_DIR, MAPPING_DIR, TEMPLATE_DIR]:
+        d.mkdir(exist_ok=True)
+    return Database(DB_PATH)
+
+
+def period_data_version(period: str) -> str:
+    """期间源数据版本：该期间全部上传记录的摘要，保存新文件后即变化"""
+    rows = get_database().query(
+        "SELECT id, filename, upload_time FROM uploads WHERE period=? ORDER BY id", (period,),
+    )
+    return hashlib.sha1(repr(rows).encode("utf-8")).hexdigest()[:16]
+
+
+# ====================================================================
+# 性能埋点（PERF_METRICS=1 开启；管理员以 ?admin=<ADMIN_TOKEN> 访问可见性能面板）
+# ====================================================================
+METRICS_KEEP_DAYS = 30
+PERF_STAGES = {
+    "total": "整次运行", "parse": "文件解析", "sqlite": "SQLite", "compute": "报表运算",
+    "render": "HTML 渲染", "ai": "AI 应答", "other": "其他（Streamlit / 页面逻辑）",
+}
+PERF_WINDOWS = {"最近 1 小时": 1, "最近 24 小时": 24, "最近 7 天": 24 * 7, "最近 30 天": 24 * 30}
+
+
+def save_metrics(db: Database, record: dict):
+    """一次运行的各环节汇总写入 metrics 表（另加一行 total）"""
+    head = (record["run_id"], record["started_at"], record["scope"])
+    rows = [(*head, stage, calls, round(sec, 6)) for stage, (calls, sec) in record["stages"].items()]
+    rows.append((*head, metrics.STAGE_TOTAL, 1, round(record["total"], 6)))
+    with db.write() as conn:
+        conn.executemany(
+            "INSERT INTO metrics (run_id,started_at,scope,stage,calls,seconds) VALUES (?,?,?,?,?,?)", rows,
+        )
+
+
+@st.cache_resource
+def init_metrics() -> dict:
+    """进程级埋点设置（只执行一次）：记录写入 platform.db，清理超过保留期的旧记录"""
+    db = get_database()
+    metrics.configure(partial(save_metrics, db))
+    metrics.set_enabled(str(get_api_key("PERF_METRICS") or "").lower() in ("1", "true", "yes", "on"))
+    cutoff = (datetime.now() - timedelta(days=METRICS_KEEP_DAYS)).isoformat()
+    db.execute("DELETE FROM metrics WHERE started_at < ?", (cutoff,))
+    return {"admin_token": get_api_key("ADMIN_TOKEN")}
+
+
+def is_admin() -> bool:
+    token = init_metrics()["admin_token"]
+    return bool(token) and st.query_params.get("admin") == token
+
+
+def _fragment_run() -> bool:
+    ctx = get_script_run_ctx()
+    return bool(ctx and ctx.fragment_ids_this_run)
+
+
+def perf_scope(name: str):
+    """片段单独重跑时作为一次独立运行记录（scope = 片段名）"""
+    return metrics.scoped(name, standalone=_fragment_run)
+
+
+init_metrics()
+metrics.begin("app")
+
+
+# 已解析 Sheet 缓存（跨会话、跨重启）
+SHEET_CACHE_DIR    = DATA_DIR / "sheet_cache"
+SHEET_CACHE_BUDGET = 1024 ** 3   # 1 GB
+INCOMING_DIR       = DATA_DIR / "incoming"   # 上传暂存（按内容哈希命名）
+OBJECTS_DIR        = DATA_DIR / "objects"    # 已保存文件的内容寻址存储（期间目录中为硬链接）
+PREVIEW_ROWS       = 50_000                  # 资料库预览行数上限
+
+
+@st.cache_resource
+def get_sheet_cache() -> SheetCache:
+    from workbook import SheetCache
+    return SheetCache(SHEET_CACHE_DIR, SHEET_CACHE_BUDGET)
+
+
+@st.cache_resource(max_entries=16)
+def _open_workbook(key: str, _source, ext: str) -> LazyWorkbook:
+    from workbook import LazyWorkbook
+    return LazyWorkbook(_source, ext, cache=get_sheet_cache(), key=key)
+
+
+def load_workbook(path_or_bytes, ext: str) -> LazyWorkbook:
+    """按内容哈希复用惰性工作簿，已打开过的 Sheet 在会话间共享"""
+    from workbook import SheetCache
+    return _open_workbook(SheetCache.key_for(path_or_bytes, ext), path_or_bytes, ext)
+
+
+# ====================================================================
+# 报表运算
+# ====================================================================
+def _backfill_ledger(period: str):
+    """本功能上线前上传、尚未识别过的文件补录入账"""
+    from ledger import extract_ledger, store_ledger
+    db = get_database()
+    pending = db.query(
+        "SELECT id, file_type, file_path FROM uploads WHERE period=? AND ledger_rows IS NULL", (period,),
+    )
+    for upload_id, file_type, file_path in pending:
+        try:
+            if not file_path or not Path(file_path).exists():
+                raise FileNotFoundError(file_path)
+            tb = extract_ledger(load_workbook(file_path, file_type or Path(file_path).suffix.lstrip(".")))
+        except Exception:
+            tb = None
+        with db.write() as conn:
+            store_ledger(conn, upload_id, period, tb)
+
+
+def load_trial_balance(period: str):
+    """期间科目余额：各核算单位取最近一次上传，按索引从 ledger 表查询；没有则返回 None"""
+    import pandas as pd
+    _backfill_ledger(period)
+    with get_database().read() as conn:
+        df = pd.read_sql_query(
+            "SELECT l.entity, l.account_code, l.account_name, l.opening, l.debit, l.credit, l.closing "
+            "FROM ledger l JOIN (SELECT entity, MAX(upload_id) AS upload_id FROM ledger "
+            "                    WHERE period=? GROUP BY entity) latest "
+            "ON l.entity = latest.entity AND l.upload_id = latest.upload_id "
+            "WHERE l.period=?",
+            conn, params=(period, period),
+        )
+    return df if len(df) else None
+
+
+class PeriodSnapshots:
+    """期间快照：映射结果存 period_lines 表，往期取用的科目存 period_accounts 表；
+    每个期间保留最新版本一份，按主键查询"""
+
+    _TABLES = {   # 节点 → (表, 数据列)
+        "lines": ("period_lines", "line_key,opening,debit,credit,closing"),
+        "accounts": ("period_accounts", "account_code,account_name,opening,debit,credit,closing"),
+    }
+
+    def _version(self, period: str, version: str) -> str:
+        return f"{version}:{period_data_version(period)}"
+
+    def get(self, period: str, version: str, node: str = "lines") -> list:
+        table, cols = self._TABLES[node]
+        return get_database().query(
+            f"SELECT {cols} FROM {table} WHERE period=? AND version=?", (period, self._version(period, version)),
+        )
+
+    def put(self, period: str, version: str, rows: list, node: str = "lines"):
+        table, cols = self._TABLES[node]
+        version = self._version(period, version)
+        marks = ",".join("?" * (2 + len(cols.split(","))))
+        with get_database().write() as conn:
+            conn.execute(f"DELETE FROM {table} WHERE period=?", (period,))
+            conn.executemany(
+                f"INSERT INTO {table} (period,version,{cols}) VALUES ({marks})",
+                ((period, version, *r) for r in rows),
+            )
+
+
+def fx_rate(period: str, currency: str):
+    """1 单位外币折合人民币元：取本期设置的汇率，本期未设置时沿用此前最近一期；均未设置时为 None"""
+    row = get_database().query_one(
+        "SELECT rate FROM fx_rates WHERE currency=? AND period<=? ORDER BY period DESC LIMIT 1",
+        (currency, period),
+    )
+    return row[0] if row else None
+
+
+def save_fx_rate(period: str, currency: str, rate: float):
+    get_database().execute(
+        "INSERT OR REPLACE INTO fx_rates (period,currency,rate,updated_at) VALUES (?,?,?,?)",
+        (period, currency, rate, datetime.now().isoformat()),
+    )
+
+
+@st.cache_resource
+def get_engine() -> ReportEngine:
+    from engine import ReportEngine
+    from mapping import load_mappings
+    return ReportEngine(
+        load_trial_balance, period_data_version, lambda: load_mappings(MAPPING_DIR),
+        snapshots=PeriodSnapshots(), fx_rate=fx_rate,
+    )
+
+
+def materialize_period(period: str):
+    """入库后立即生成期间快照，后续同比 / 环比及按科目取往期数据只需按主键查询"""
+    from engine import SNAPSHOT_NODES
+    ctx = get_engine().context(period)
+    for node in SNAPSHOT_NODES:
+        try:
+            ctx.get(node)
+        except Exception:
+            pass
+
+
+@st.cache_resource
+def get_process_pool():
+    """报表并行运算进程池（进程常驻，避免每次运算重新启动解释器）"""
+    return ProcessPoolExecutor(max_workers=os.cpu_count() or 2, mp_context=mp.get_context("spawn"))
+
+
+def run_reports(report_names, period: str, currency: str) -> tuple:
+    """并行运算一批报表：逐张显示进度与失败原因，耗时写入 generations。
+    返回 (成功报表, 失败报表)"""
+    bar = st.progress(0.0, text="正在运算…")
+    status = st.status(f"正在运算 {len(report_names)} 张报表…", expanded=False)
+    ok, failed, records = [], [], []
+
+    def on_done(name, result, seconds, error):
+        if error:
+            failed.append(name)
+            status.write(f"❌ {name}：{error}")
+        else:
+            ok.append(name)
+            src = "" if result.source == "ledger" else "（演示数据）"
+            status.write(f"✅ {name}{src} · {seconds:.2f}s")
+        records.append((period, "engine", name, "失败" if error else "完成",
+                        datetime.now().isoformat(), round(seconds, 4)))
+        n = len(ok) + len(failed)
+        bar.progress(n / len(report_names), text=f"已完成 {n}/{len(report_names)}：{name}")
+
+    engine = get_engine()
+    try:
+        engine.compute_parallel(report_names, period, currency, get_process_pool(), on_done)
+    except BrokenProcessPool:
+        # 进程池不可用（如子进程被系统回收）时退回本进程计算
+        get_process_pool.clear()
+        done = set(ok) | set(failed)
+        engine.compute_parallel([r for r in report_names if r not in done], period, currency, None, on_done)
+
+    with get_database().write() as conn:
+        conn.executemany(
+            "INSERT INTO generations (period,ai_model,output_filename,status,created_at,duration_seconds) "
+            "VALUES (?,?,?,?,?,?)", records,
+        )
+    status.update(
+        label=f"运算完成：成功 {len(ok)} 张" + (f"，失败 {len(failed)} 张" if failed else ""),
+        state="error" if failed else "complete",
+    )
+    return ok, failed
+
+
+# ====================================================================
+# 上传记录查询
+# ====================================================================
+LIBRARY_PAGE_SIZE = 30
+SIDEBAR_FILES     = 20
+
+
+def list_uploads(search: str = "", after=None, limit: int = LIBRARY_PAGE_SIZE) -> tuple:
+    """基础资料库文件列表：按 (期间, 上传时间, id) 倒序键集分页，after 为上一页最后一行的游标。
+    返回 (本页记录, 是否还有下一页)"""
+    sql = ("SELECT id, period, filename, sheet_count, row_count, file_path, upload_time "
+           "FROM uploads WHERE 1=1")
+    params = []
+    if search:
+        sql += " AND filename LIKE ? ESCAPE '\\'"
+        params.append("%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+    if after is not None:
+        sql += " AND (period, upload_time, id) < (?, ?, ?)"
+        params.extend(after)
+    sql += " ORDER BY period DESC, upload_time DESC, id DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = get_database().query(sql, params)
+    return rows[:limit], len(rows) > limit
 
 
 # ====================================================================
@@ -235,515 +436,533 @@ REPORT_MODULES = {
 }
 
 
-def gen_demo_df(report_name: str, currency: str) -> pd.DataFrame:
-    """根据报表名称生成演示数据"""
-    unit = "万美元" if currency == "美元" else "万元"
-
-    if "资产负债" in report_name:
-        return pd.DataFrame({
-            "项  目": [
-                "一、流动资产", "  货币资金", "  应收账款", "  预付账款", "  存货", "  其他流动资产",
-                "  流动资产合计", "",
-                "二、非流动资产", "  固定资产", "  累计折旧", "  固定资产净值", "  无形资产",
-                "  非流动资产合计", "",
-                "资  产  总  计", "",
-                "一、流动负债", "  短期借款", "  应付账款", "  预收账款", "  其他流动负债",
-                "  流动负债合计", "",
-                "二、非流动负债", "  长期借款",
-                "  非流动负债合计", "",
-                "负  债  合  计", "",
-                "实收资本", "未分配利润", "所有者权益合计", "",
-                "负债和所有者权益合计",
-            ],
-            f"期末余额（{unit}）": [
-                "", "12450", "8320", "1800", "15680", "510",
-                "38760", "",
-                "", "95430", "(3420)", "92010", "2140",
-                "94150", "",
-                "132910", "",
-                "", "5200", "3840", "680", "2930",
-                "12650", "",
-                "", "45000",
-                "45000", "",
-                "57650", "",
-                "30000", "45260", "75260", "",
-                "132910",
-            ],
-            f"期初余额（{unit}）": [
-                "", "10230", "7890", "1450", "14320", "1290",
-                "35180", "",
-                "", "92100", "(2640)", "89460", "2380",
-                "91840", "",
-                "127020", "",
-                "", "4800", "3560", "540", "2300",
-                "11200", "",
-                "", "42000",
-                "42000", "",
-                "53200", "",
-                "30000", "43820", "73820", "",
-                "127020",
-            ],
-            "增减幅度": [
-                "", "↑21.7%", "↑5.5%", "↑24.1%", "↑9.5%", "↓60.5%",
-                "↑10.2%", "",
-                "", "↑3.6%", "", "↑2.9%", "↓10.1%",
-                "↑2.5%", "",
-                "↑4.6%", "",
-                "", "↑8.3%", "↑7.9%", "↑25.9%", "↑27.4%",
-                "↑12.9%", "",
-                "", "↑7.1%",
-                "↑7.1%", "",
-                "↑8.4%", "",
-                "—", "↑3.3%", "↑2.0%", "",
-                "↑4.6%",
-            ],
-        })
-
-    elif "利润" in report_name:
-        return pd.DataFrame({
-            "项  目": [
-                "一、营业收入",
-                "减：营业成本", "    营业税金及附加", "    销售费用",
-                "    管理费用", "    财务费用", "    资产减值损失",
-                "加：公允价值变动收益", "    投资收益",
-                "二、营业利润",
-                "加：营业外收入", "减：营业外支出",
-                "三、利润总额", "减：所得税费用",
-                "四、净  利  润",
-            ],
-            f"本期金额（{unit}）": [
-                "85420",
-                "62180", "850", "1240",
-                "3680", "1120", "—",
-                "—", "230",
-                "16580",
-                "420", "180",
-                "16820", "2523",
-                "14297",
-            ],
-            f"上年同期（{unit}）": [
-                "78930",
-                "58640", "790", "1180",
-                "3420", "980", "—",
-                "—", "180",
-                "14100",
-                "360", "210",
-                "14250", "2138",
-                "12112",
-            ],
-            "同比增减": [
-                "↑8.2%",
-                "↑6.0%", "↑7.6%", "↑5.1%",
-                "↑7.6%", "↑14.3%", "—",
-                "—", "↑27.8%",
-                "↑17.6%",
-                "↑16.7%", "↓14.3%",
-                "↑18.0%", "↑18.0%",
-                "↑18.0%",
-            ],
-        })
-
-    elif "生产经营" in report_name:
-        return pd.DataFrame({
-            "指  标": [
-                "一、产量", "  铜产量（吨）", "  硫酸联产量（吨）",
-                "二、质量", "  综合回收率（%）", "  铜品位（%）",
-                "三、能耗", "  电耗（度/吨铜）", "  水耗（吨/吨铜）", "  蒸汽耗（吨/吨铜）",
-                "四、投入", "  处理矿石量（吨）",
-            ],
-            "本月完成": ["", "2086", "8240", "", "91.3%", "99.8%", "", "1850", "42.5", "3.2", "", "38400"],
-            "月度计划": ["", "2100", "8200", "", "91.0%", "99.5%", "", "1900", "45.0", "3.5", "", "38000"],
-            "完  成  率": ["", "99.3%", "100.5%", "", "✅达标", "✅达标", "", "✅达标", "✅达标", "✅达标", "", "101.1%"],
-            "上月实际": ["", "2050", "8120", "", "90.8%", "99.6%", "", "1870", "43.0", "3.3", "", "37800"],
-            "环  比": ["", "↑1.8%", "↑1.5%", "", "↑0.5%", "↑0.2%", "", "↓1.1%", "↓1.2%", "↓3.0%", "", "↑1.6%"],
-            "本年累计": ["", "12380", "48960", "", "—", "—", "", "—", "—", "—", "", "229800"],
-            "年度计划": ["", "25200", "98000", "", "—", "—", "", "—", "—", "—", "", "456000"],
-            "进  度": ["", "49.1%", "50.0%", "", "—", "—", "", "—", "—", "—", "", "50.4%"],
-        })
+# ====================================================================
+# 报表区渲染（明细表分页 + 片段缓存）
+# ====================================================================
+FT_PAGE_ROWS = 500   # 单页行数；明细表超过一页时只渲染当前页
+
+
+def report_kpi_html(report_name: str, currency: str) -> str:
+    """报表区顶部 4 张 KPI 卡片；无卡片的报表返回空串"""
+    ustr = "美元" if currency == "美元" else "元"
+
+    # 生产经营月度快报 → 生产类
+    if "生产经营" in report_name:
+        return f"""
+<div class="kpi-grid">
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
+    <div class="kpi-body"><div class="kpi-val">2086</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;2100</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">综合回收率</span><span class="kpi-unit">百分比</span></div>
+    <div class="kpi-body"><div class="kpi-val">91.3%</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑0.5%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;91.0%</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">处理矿石量</span><span class="kpi-unit">吨/月</span></div>
+    <div class="kpi-body"><div class="kpi-val">38400</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.6%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;38000</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">电    耗</span><span class="kpi-unit">度/吨铜</span></div>
+    <div class="kpi-body"><div class="kpi-val">1850</div></div>
+    <div class="kpi-foot"><span class="kpi-chg dn">↓1.1%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;1900</span></div>
+  </div>
+</div>"""
 
+    # 资金情况月报 → 资金类
     elif "资金情况" in report_name:
-        return pd.DataFrame({
-            "项  目": [
-                "一、货币资金", "  库存现金", "  银行存款（境内）", "  银行存款（境外）",
-                "  货币资金合计", "",
-                "二、应收款项", "  应收账款", "  预付账款", "  其他应收款",
-                "  应收合计", "",
-                "三、应付款项", "  应付账款", "  预收账款", "  其他应付款",
-                "  应付合计", "",
-                "四、负债情况", "  短期借款", "  长期借款（当年到期）", "  带息负债合计",
-                "资产负债率（%）",
-            ],
-            f"本月末（{unit}）": [
-                "", "70", "8320", "4060",
-                "12450", "",
-                "", "8320", "1800", "980",
-                "11100", "",
-                "", "3840", "680", "1120",
-                "5640", "",
-                "", "5200", "2000", "7200",
-                "43.4%",
-            ],
-            f"上月末（{unit}）": [
-                "", "65", "7950", "3890",
-                "11905", "",
-                "", "8050", "1650", "940",
-                "10640", "",
-                "", "3650", "620", "1080",
-                "5350", "",
-                "", "5000", "2000", "7000",
-                "42.8%",
-            ],
-            "环比变动": [
-                "", "↑7.7%", "↑4.7%", "↑4.4%",
-                "↑4.6%", "",
-                "", "↑3.4%", "↑9.1%", "↑4.3%",
-                "↑4.3%", "",
-                "", "↑5.2%", "↑9.7%", "↑3.7%",
-                "↑5.4%", "",
-                "", "↑4.0%", "—", "↑2.9%",
-                "↑0.6pp",
-            ],
-            f"上年同期（{unit}）": [
-                "", "55", "7420", "3810",
-                "11285", "",
-                "", "7890", "1450", "860",
-                "10200", "",
-                "", "3560", "540", "980",
-                "5080", "",
-                "", "4800", "2000", "6800",
-                "41.9%",
-            ],
-            "同比变动": [
-                "", "↑27.3%", "↑12.1%", "↑6.5%",
-                "↑10.3%", "",
-                "", "↑5.5%", "↑24.1%", "↑14.0%",
-                "↑8.8%", "",
-                "", "↑7.9%", "↑25.9%", "↑14.3%",
-                "↑11.0%", "",
-                "", "↑8.3%", "—", "↑5.9%",
-                "↑1.5pp",
-            ],
-        })
-
-    elif "人力资源" in report_name:
-        return pd.DataFrame({
-            "指  标": [
-                "一、人员总量", "  在岗职工（人）", "  其中：境外员工", "  劳务派遣人员",
-                "  合同制员工", "",
-                "二、本期变动", "  本期新入职（人）", "  本期离职（人）",
-                "  净增减（人）", "",
-                "三、人工成本", f"  工资总额（{unit}）", f"  福利费（{unit}）", f"  人均薪酬（{unit}）",
-            ],
-            "本  月": ["", "486", "42", "38", "406", "", "", "3", "2", "↑1", "", "", "420", "84", "0.87"],
-            "上  月": ["", "485", "41", "38", "406", "", "", "2", "3", "↓1", "", "", "415", "83", "0.86"],
-            "环  比": ["", "↑0.2%", "↑2.4%", "—", "—", "", "", "—", "—", "—", "", "", "↑1.2%", "↑1.2%", "↑1.2%"],
-            "本年累计": ["", "—", "—", "—", "—", "", "", "12", "8", "↑4", "", "", "2480", "496", "—"],
-            "年度计划": ["", "490", "—", "—", "—", "", "", "—", "—", "—", "", "", "—", "—", "—"],
-        })
-
-    elif "环保安全" in report_name:
-        return pd.DataFrame({
-            "指  标": [
-                "一、安全生产", "  本月安全生产天数（天）", "  累计安全生产天数（天）",
-                "  安全培训人次", "  安全检查次数", "  隐患整改完成率（%）", "",
-                "二、环保指标", "  外排废水达标率（%）", "  废气排放达标率（%）",
-                "  固废综合利用率（%）", "  污水处理量（吨）",
-                "  硫酸雾排放浓度（mg/m³）", "",
-                "三、应急管理", "  应急演练（次）", "  消防检查（次）",
-            ],
-            "本  月": ["", "31", "365", "286", "12", "100%", "", "", "100%", "100%", "96.5%", "18600", "0.42", "", "", "2", "4"],
-            "达标要求": ["", "31", "—", "—", "≥8", "≥95%", "", "", "≥95%", "≥95%", "≥90%", "—", "≤5.0", "", "", "≥1", "≥2"],
-            "达标状态": ["", "✅达标", "—", "—", "✅达标", "✅达标", "", "", "✅达标", "✅达标", "✅达标", "—", "✅达标", "", "", "✅达标", "✅达标"],
-            "上  月": ["", "28", "334", "312", "14", "97.8%", "", "", "100%", "100%", "95.8%", "17200", "0.38", "", "", "1", "3"],
-            "本年累计": ["", "55", "—", "—", "26", "—", "", "", "—", "—", "—", "35800", "—", "", "", "3", "7"],
-        })
-
-    elif "快报" in report_name or "指标" in report_name:
-        return pd.DataFrame({
-            "指  标": [
-                "铜产量（吨）", "铜销量（吨）", "综合回收率（%）",
-                "电耗（度/吨铜）", "生产成本（美元/吨）",
-                "销售收入（万美元）", "净利润（万美元）",
-                "员工人数（人）",
-            ],
-            "本月完成": ["2086", "2140", "91.3%", "1850", "4280", "20330", "1430", "486"],
-            "月度计划": ["2100", "2100", "91.0%", "1900", "4350", "20000", "1400", "490"],
-            "完  成  率": ["99.3%", "101.9%", "✅达标", "✅达标", "✅达标", "✅达标", "✅达标", "99.2%"],
-            "上月实际": ["2050", "2095", "90.8%", "1870", "4310", "19820", "1380", "485"],
-            "环  比": ["↑1.8%", "↑2.1%", "↑0.5%", "↓1.1%", "↓0.7%", "↑2.6%", "↑3.6%", "↑0.2%"],
-            "本年累计": ["12380", "12590", "—", "—", "—", "119450", "8640", "—"],
-        })
+        return f"""
+<div class="kpi-grid">
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">货 币 资 金</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">12450</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑4.6%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;11285</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">应 收 账 款</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">8320</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑3.4%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;7890</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">带 息 负 债</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">7200</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑2.9%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;6800</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">资产负债率</span><span class="kpi-unit">百分比</span></div>
+    <div class="kpi-body"><div class="kpi-val">43.4%</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑0.6pp&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;41.9%</span></div>
+  </div>
+</div>"""
 
+    # 产销存快报 → 产销库存类
     elif "产销存" in report_name:
-        return pd.DataFrame({
-            "项  目": [
-                "一、生产", "  铜产量（吨）", "  硫酸联产量（吨）", "  综合回收率（%）", "",
-                "二、销售", "  铜销量（吨）", "  铜销售收入（万美元）", "  铜均价（美元/吨）", "",
-                "三、库存", "  铜库存（吨）", "  原料库存（吨）", "  硫酸库存（吨）",
-            ],
-            "本  月": ["", "2086", "8240", "91.3%", "", "", "2140", "20330", "9500", "", "", "450", "12300", "3200"],
-            "上  月": ["", "2050", "8120", "90.8%", "", "", "2095", "19820", "9460", "", "", "404", "11800", "3050"],
-            "环  比": ["", "↑1.8%", "↑1.5%", "↑0.5%", "", "", "↑2.1%", "↑2.6%", "↑0.4%", "", "", "↑11.4%", "↑4.2%", "↑4.9%"],
-            "本年累计": ["", "12380", "48960", "—", "", "", "12590", "119450", "9488", "", "", "—", "—", "—"],
-            "年度计划": ["", "25200", "98000", "—", "", "", "25200", "245000", "9500", "", "", "—", "—", "—"],
-            "计划进度": ["", "49.1%", "50.0%", "—", "", "", "50.0%", "48.8%", "—", "", "", "—", "—", "—"],
-        })
-
-    elif "同比" in report_name or "环比" in report_name or "分析" in report_name or "底稿" in report_name:
-        return pd.DataFrame({
-            "分  析  项  目": [
-                "营业收入", "营业成本", "毛利润", "毛利率",
-                "管理费用", "财务费用", "净利润", "净利率",
-                "资产总额", "负债合计", "资产负债率",
-            ],
-            f"本期（{unit}）": [
-                "85420", "62180", "23240", "27.2%",
-                "3680", "1120", "14297", "16.7%",
-                "132910", "57650", "43.4%",
-            ],
-            f"对比期（{unit}）": [
-                "78930", "58640", "20290", "25.7%",
-                "3420", "980", "12112", "15.3%",
-                "127020", "53200", "41.9%",
-            ],
-            "变  动  幅  度": [
-                "↑8.2%", "↑6.0%", "↑14.5%", "↑1.5pp",
-                "↑7.6%", "↑14.3%", "↑18.0%", "↑1.4pp",
-                "↑4.6%", "↑8.4%", "↑1.5pp",
-            ],
-            "综合评价": [
-                "✅ 良好", "✅ 正常", "✅ 优秀", "✅ 改善",
-                "✅ 正常", "⚠️ 关注", "✅ 优秀", "✅ 改善",
-                "✅ 正常", "⚠️ 关注", "⚠️ 关注",
-            ],
-        })
-
-    elif "成本" in report_name:
-        return pd.DataFrame({
-            "成本项目": [
-                "一、直接材料", "  矿石原料", "  硫酸", "  电解液", "  其他辅料",
-                "二、直接人工", "  工资", "  福利费",
-                "三、制造费用", "  折旧", "  维修费", "  电力费", "  其他",
-                "四、生产成本合计",
-                "五、单位成本（美元/吨铜）",
-            ],
-            f"本月金额（{unit}）": [
-                "", "5820", "1240", "340", "680",
-                "", "420", "84",
-                "", "2860", "380", "3700", "540",
-                "16064",
-                "4280（美元/吨）",
-            ],
-            "本月占比": [
-                "", "36.2%", "7.7%", "2.1%", "4.2%",
-                "", "2.6%", "0.5%",
-                "", "17.8%", "2.4%", "23.0%", "3.4%",
-                "100%",
-                "—",
-            ],
-            f"上月金额（{unit}）": [
-                "", "5690", "1210", "330", "660",
-                "", "415", "83",
-                "", "2820", "370", "3720", "520",
-                "15818",
-                "4310（美元/吨）",
-            ],
-            "环比变化": [
-                "", "↑2.3%", "↑2.5%", "↑3.0%", "↑3.0%",
-                "", "↑1.2%", "↑1.2%",
-                "", "↑1.4%", "↑2.7%", "↓0.5%", "↑3.8%",
-                "↑1.6%",
-                "↓0.7%",
-            ],
-        })
+        return f"""
+<div class="kpi-grid">
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
+    <div class="kpi-body"><div class="kpi-val">2086</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">本年累计&nbsp;12380</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 销 量</span><span class="kpi-unit">吨/月</span></div>
+    <div class="kpi-body"><div class="kpi-val">2140</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑2.1%&nbsp;环比</span><span class="kpi-base">本年累计&nbsp;12590</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 库 存</span><span class="kpi-unit">吨</span></div>
+    <div class="kpi-body"><div class="kpi-val">450</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑11.4%&nbsp;环比</span><span class="kpi-base">上月库存&nbsp;404</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 均 价</span><span class="kpi-unit">美元/吨</span></div>
+    <div class="kpi-body"><div class="kpi-val">9500</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑0.4%&nbsp;环比</span><span class="kpi-base">年度计划&nbsp;9500</span></div>
+  </div>
+</div>"""
 
+    # 成本费用快报 → 成本类
+    elif "成本费用" in report_name:
+        return f"""
+<div class="kpi-grid">
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">单位生产成本</span><span class="kpi-unit">美元/吨铜</span></div>
+    <div class="kpi-body"><div class="kpi-val">4280</div></div>
+    <div class="kpi-foot"><span class="kpi-chg dn">↓0.7%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;4350</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">生产成本合计</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">16064</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.6%&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;15818</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">毛 利 率</span><span class="kpi-unit">百分比</span></div>
+    <div class="kpi-body"><div class="kpi-val">27.2%</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.5pp&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;25.7%</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">电力费占比</span><span class="kpi-unit">百分比</span></div>
+    <div class="kpi-body"><div class="kpi-val">23.0%</div></div>
+    <div class="kpi-foot"><span class="kpi-chg dn">↓0.1pp&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;23.1%</span></div>
+  </div>
+</div>"""
+
+    # 人力资源快报 / 环保安全快报 → 仅明细表
+    elif "人力资源" in report_name or "环保安全" in report_name:
+        return ""
+
+    # 分析底稿 + 其他分析类 → 财务摘要；基础报表无卡片
+    elif any(k in report_name for k in ["同比", "环比", "分析", "底稿"]):
+        return f"""
+<div class="kpi-grid">
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">净 利 润</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">14297</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑18.0%&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;12112</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">营业收入</span><span class="kpi-unit">万{ustr}</span></div>
+    <div class="kpi-body"><div class="kpi-val">85420</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑8.2%&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;78930</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">毛 利 率</span><span class="kpi-unit">百分比</span></div>
+    <div class="kpi-body"><div class="kpi-val">27.2%</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.5pp&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;25.7%</span></div>
+  </div>
+  <div class="kpi-card">
+    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
+    <div class="kpi-body"><div class="kpi-val">2086</div></div>
+    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;2050</span></div>
+  </div>
+</div>"""
+    return ""
+
+
+@metrics.timed("render")
+def render_report_body(report_name: str, period: str, currency: str,
+                       computed: bool = False, page: int = 1) -> tuple:
+    """报表区 HTML（KPI 卡片 + 财务表格）及表格总页数。
+
+    已运算的报表取运算引擎结果（来自本期科目余额表），未运算时显示演示数据。
+    """
+    from demo_data import gen_demo_df
+    from display import render_finance_table, render_quick_report
+    # 重要指标快报 → 8大卡片（同比/环比/完成率全展示）
+    if "指标" in report_name and "快报" in report_name:
+        return render_quick_report(report_name, currency), 1
+    note = ""
+    if computed:
+        result = get_engine().compute(report_name, period, currency)
+        df = result.df
+        kpi = "" if result.source == "ledger" else report_kpi_html(report_name, currency)
+        if result.note:
+            note = f'<div class="rpt-note">ℹ️ {result.note}</div>'
     else:
-        # 通用 / 科目余额表
-        return pd.DataFrame({
-            "科目编码": ["1001", "1002", "1012", "1122", "1221", "1231", "1401", "1501", "1502", "6001"],
-            "科目名称": ["库存现金", "银行存款", "其他货币资金", "应收票据", "应收账款", "预付账款", "存货", "固定资产", "累计折旧", "主营业务收入"],
-            f"期初余额（{unit}）": ["50", "10180", "2220", "—", "8320", "1450", "14230", "92100", "(2640)", "—"],
-            f"本期借方（{unit}）": ["2400", "58230", "—", "—", "12450", "3200", "8900", "3330", "780", "—"],
-            f"本期贷方（{unit}）": ["2380", "56480", "—", "—", "12050", "2850", "7570", "—", "—", "85420"],
-            f"期末余额（{unit}）": ["70", "11930", "2220", "—", "8720", "1800", "15560", "95430", "(3420)", "85420"],
-        })
+        df = gen_demo_df(report_name, currency)
+        kpi = report_kpi_html(report_name, currency)
+    pages = max(1, -(-len(df) // FT_PAGE_ROWS))
+    start = (min(page, pages) - 1) * FT_PAGE_ROWS
+    table = render_finance_table(df, report_name, start, start + FT_PAGE_ROWS)
+    return note + kpi + table, pages
+
+
+@st.cache_data(max_entries=512, show_spinner=False)
+def render_report_fragment(report_name: str, period: str, currency: str,
+                           data_version: str, mapping_version: str, computed: bool = False,
+                           page: int = 1, rate: float = None) -> tuple:
+    """按 (报表, 期间, 币种, 源数据版本, 映射规则版本, 是否已运算, 页码, 汇率) 缓存报表区 HTML，跨会话共享。
+
+    期间上传新文件后 data_version 随之变化、修改科目映射规则后 mapping_version 随之变化、
+    修改汇率后 rate 随之变化，旧片段自然失效。
+    """
+    return render_report_body(report_name, period, currency, computed, page)
 
 
 # ====================================================================
-# 国企风格财务表格渲染
+# 导出
 # ====================================================================
-def render_finance_table(df: pd.DataFrame, report_name: str = "") -> str:
-    """将 DataFrame 渲染为国企风格 HTML 财务表格"""
-
-    SECTION_PREFIXES = ("一、", "二、", "三、", "四、", "五、", "六、", "七、", "八、", "九、", "十、")
-    TOTAL_KEYWORDS   = ("合计", "总计", "净利润", "负债和所有者")
-
-    def classify(first_val: str):
-        s = str(first_val)
-        stripped = s.strip()
-        if not stripped:
-            return "sep", 0
-        indent = len(s) - len(stripped)
-        level  = indent // 2
-        # 顶级合计（无缩进且含关键词）
-        if indent == 0 and any(k in stripped for k in TOTAL_KEYWORDS):
-            return "grandtotal", 0
-        # 一级分类标题
-        if any(stripped.startswith(p) for p in SECTION_PREFIXES):
-            return "section", 0
-        # 子合计（有缩进 + 含合计）
-        if indent > 0 and "合计" in stripped:
-            return "subtotal", level
-        return "normal", level
-
-    def colorize(val: str) -> str:
-        v = str(val)
-        if v.startswith("↑"):
-            return f'<span style="color:#16a34a;font-weight:600">{v}</span>'
-        if v.startswith("↓"):
-            return f'<span style="color:#dc2626;font-weight:600">{v}</span>'
-        if v.startswith("✅"):
-            return f'<span style="color:#16a34a">{v}</span>'
-        if v.startswith("⚠️"):
-            return f'<span style="color:#d97706">{v}</span>'
-        return v
-
-    cols = list(df.columns)
-
-    # ── 表头 ──
-    ths = "".join(
-        f'<th style="text-align:{"left" if i == 0 else "right"}">{c}</th>'
-        for i, c in enumerate(cols)
-    )
-    thead = f"<thead><tr>{ths}</tr></thead>"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
 
-    # ── 表体 ──
-    rows_html = []
-    odd = True
-    for _, row in df.iterrows():
-        first_val = str(row.iloc[0]) if len(row) > 0 else ""
-        rtype, level = classify(first_val)
 
-        if rtype == "sep":
-            rows_html.append(f'<tr class="ft-sep"><td colspan="{len(cols)}"></td></tr>')
-            continue
+def report_sheet(engine: ReportEngine, report_name: str, period: str, currency: str) -> tuple:
+    """导出用的 (报表名称, 数值型 DataFrame, 副标题)"""
+    result = engine.compute(report_name, period, currency, numeric=True)
+    unit = engine.money(period, currency)[1] if result.source == "ledger" else (
+        "万美元" if currency == "美元" else "万元")
+    note = f"（{result.note}）" if result.note else ""
+    return report_name, result.df, f"{period_label(period)} · 单位：{unit}{note}"
 
-        indent_px = level * 16 + 10
-        first_td = f'<td style="text-align:left;padding-left:{indent_px}px">{first_val.strip()}</td>'
-        rest_tds  = "".join(
-            f'<td style="text-align:right">{colorize(str(v))}</td>'
-            for v in list(row)[1:]
-        )
 
-        if rtype == "normal":
-            cls = f"ft-normal ft-{'odd' if odd else 'even'}"
-            odd = not odd
+def export_report_xlsx(engine: ReportEngine, report_name: str, period: str, currency: str) -> bytes:
+    """单张报表导出为 xlsx；由下载按钮在点击时调用，页面重跑时不生成"""
+    from excel_export import write_reports
+    buf = io.BytesIO()
+    write_reports(buf, [report_sheet(engine, report_name, period, currency)])
+    return buf.getvalue()
+
+
+WORD_TEMPLATE = "月度财务分析报告.docx"
+COMPANY_NAME  = "中色华鑫马本德矿业有限公司"
+
+
+def word_report_path(period: str, currency: str) -> Path:
+    return period_output_dir(period) / f"月度财务分析报告_{period.replace('-', '')}_{currency}.docx"
+
+
+def word_attention(engine: ReportEngine, period: str, currency: str) -> str:
+    """需关注事项：同比分析底稿中评价为「关注」的项目"""
+    df = engine.compute("同比分析底稿", period, currency).df
+    label, cur, chg, verdict = df.columns[0], df.columns[1], df.columns[3], df.columns[4]
+    items = [
+        f"{i}. {r[label].strip()}：本期 {r[cur]}，同比{r[chg]}"
+        for i, (_, r) in enumerate(df[df[verdict].str.contains("关注")].iterrows(), start=1)
+    ]
+    return "\n".join(items) if items else "本期主要指标同比均向好，无需特别关注的事项。"
+
+
+def word_values(engine: ReportEngine, period: str, currency: str) -> LedgerFacts:
+    from engine import LedgerFacts
+    return LedgerFacts(engine, period, {
+        "company": COMPANY_NAME, "period": period_label(period), "currency": currency,
+        "generated_at": datetime.now().strftime("%Y-%m-%d"),
+        "attention": lambda: word_attention(engine, period, currency),
+    }, currency=currency)
+
+
+def word_template():
+    """编译后的 Word 模板（进程内按文件修改时间缓存）；模板缺失时先写出默认模板"""
+    from word_report import ensure_template, load_template
+    return load_template(ensure_template(TEMPLATE_DIR / WORD_TEMPLATE))
+
+
+def generate_word_report(job: Job, engine: ReportEngine, period: str, currency: str) -> Path:
+    """后台任务：按模板生成本期 Word 报告，写入 output/YYYYMM/"""
+    from engine import NoLedgerData
+    from word_report import TemplateError
+    try:
+        template = word_template()
+        tables = {}
+        for i, name in enumerate(template.tables):
+            job.progress(i, len(template.tables) + 1, name)
+            tables[name] = engine.compute(name, period, currency).df
+        job.progress(len(tables), len(tables) + 1, "写出报告")
+        data = template.render(word_values(engine, period, currency), tables)
+    except NoLedgerData:
+        raise JobError(f"{period_label(period)}尚未上传科目余额表，无法生成报告。") from None
+    except TemplateError as e:
+        raise JobError(f"报告模板有误：{e}") from None
+    path = word_report_path(period, currency)
+    part = path.with_name(path.name + ".part")
+    part.write_bytes(data)
+    os.replace(part, path)
+    return path
+
+
+@metrics.timed("render")
+def word_preview_html(period: str, currency: str) -> str:
+    """报告预览：按模板段落顺序输出标题、正文与数据表格"""
+    from display import render_finance_table
+    engine = get_engine()
+    values = word_values(engine, period, currency)
+    html = []
+    for style, text in word_template().preview(values):
+        if style == "table":
+            html.append(render_finance_table(engine.compute(text, period, currency).df, text))
+        elif style in ("Title", "Subtitle"):
+            continue
+        elif style.startswith("Heading"):
+            html.append(f'<p style="font-weight:700;color:#0c3060;margin:14px 0 4px">{text}</p>')
+        elif style == "Caption":
+            html.append(f'<p style="text-align:center;font-weight:600;color:#1e4a8a;margin:10px 0 0">{text}</p>')
         else:
-            cls = f"ft-{rtype}"
+            html.append('<div class="ai-reply">' + text.replace("\n", "<br>") + "</div>")
+    return "".join(html)
 
-        rows_html.append(f'<tr class="{cls}">{first_td}{rest_tds}</tr>')
 
-    tbody = f"<tbody>{''.join(rows_html)}</tbody>"
-    return f'<div class="ft-wrap"><table class="ft">{thead}{tbody}</table></div>'
+BUNDLE_FORMATS = {"xlsx": "单一工作簿", "zip": "压缩包（含 Word 报告）"}
+JOB_WORKERS    = 2     # 后台任务工作线程数
+JOB_POLL       = 0.5   # 页面轮询任务进度的间隔（秒）
 
 
-# ====================================================================
-# 重要指标快报 — 大卡片可视化
-# ====================================================================
-def render_quick_report(report_name: str, currency: str) -> str:
-    """将重要指标快报渲染为 4 列大卡片网格，同比/环比突出显示"""
-    u = "美元" if currency == "美元" else "元人民币"
-
-    kpis = [
-        {"name": "铜产量",    "val": "2086",  "unit": "吨",
-         "yoy": "+3.8%", "yoy_up": True,  "mom": "+1.8%", "mom_up": True,
-         "plan": "2100",  "rate": 99.3,  "yoy_base": "2010"},
-        {"name": "铜销量",    "val": "2140",  "unit": "吨",
-         "yoy": "+2.4%", "yoy_up": True,  "mom": "+2.1%", "mom_up": True,
-         "plan": "2100",  "rate": 101.9, "yoy_base": "2090"},
-        {"name": "综合回收率", "val": "91.3",  "unit": "%",
-         "yoy": "+0.8%", "yoy_up": True,  "mom": "+0.5%", "mom_up": True,
-         "plan": "91.0",   "rate": 100.3, "yoy_base": "90.6"},
-        {"name": "生产成本",  "val": "4280",  "unit": f"{u}/吨",
-         "yoy": "−1.2%", "yoy_up": False, "mom": "−0.7%", "mom_up": False,
-         "plan": "4350",  "rate": 101.6, "yoy_base": "4332"},
-        {"name": "销售收入",  "val": "20330", "unit": f"万{u}",
-         "yoy": "+8.2%", "yoy_up": True,  "mom": "+2.6%", "mom_up": True,
-         "plan": "20000", "rate": 101.7, "yoy_base": "18790"},
-        {"name": "净利润",    "val": "1430",  "unit": f"万{u}",
-         "yoy": "+18.0%","yoy_up": True,  "mom": "+3.6%", "mom_up": True,
-         "plan": "1400",  "rate": 102.1, "yoy_base": "1212"},
-        {"name": "电耗",      "val": "1850",  "unit": "度/吨铜",
-         "yoy": "−2.1%", "yoy_up": False, "mom": "−1.1%", "mom_up": False,
-         "plan": "1900",  "rate": 102.6, "yoy_base": "1890"},
-        {"name": "员工人数",  "val": "486",    "unit": "人",
-         "yoy": "+1.5%", "yoy_up": True,  "mom": "+0.2%", "mom_up": True,
-         "plan": "490",    "rate": 99.2,  "yoy_base": "479"},
+def bundle_reports() -> list:
+    """打包导出的报表：月度快报、基础报表、分析底稿全部报表"""
+    return [
+        rpt for mn, rlist in REPORT_MODULES.items()
+        if mn not in ("🗄️ 基础资料库", "📝 Word报告")
+        for rpt in rlist
     ]
 
-    cards = []
-    for k in kpis:
-        yoy_c = "#16a34a" if k["yoy_up"] else "#dc2626"
-        mom_c = "#16a34a" if k["mom_up"] else "#dc2626"
-        ya    = "▲" if k["yoy_up"] else "▼"
-        ma    = "▲" if k["mom_up"] else "▼"
-        bar_w = min(k["rate"], 100)
-        bar_c = "#22c55e" if k["rate"] >= 100 else "#f59e0b" if k["rate"] >= 95 else "#ef4444"
-
-        cards.append(f"""<div class="kd-card">
-  <div class="kd-name">{k["name"]}</div>
-  <div class="kd-val">{k["val"]}<span class="kd-unit"> {k["unit"]}</span></div>
-  <div class="kd-yoy" style="color:{yoy_c}">{ya} {k["yoy"]} <span class="kd-yoy-label">同比</span></div>
-  <div class="kd-divider"></div>
-  <div class="kd-row2">
-    <span style="color:{mom_c};font-weight:600">{ma} {k["mom"]} 环比</span>
-    <span class="kd-plan-val">计划 {k["plan"]}</span>
-  </div>
-  <div class="kd-prog-wrap"><div class="kd-prog-bar" style="width:{bar_w}%;background:{bar_c}"></div></div>
-  <div class="kd-rate-row">
-    <span style="color:{bar_c};font-weight:600">完成率 {k["rate"]}%</span>
-    <span class="kd-yoy-base">上年同期 {k["yoy_base"]}</span>
-  </div>
-</div>""")
 
-    return f'<div class="kd-grid">{"".join(cards)}</div>'
+def bundle_path(period: str, currency: str, fmt: str) -> Path:
+    """本期打包文件路径；文件名带数据版本与映射规则版本（zip 另带本币种 Word 报告的修改时间），
+    源数据变化或重新生成 Word 报告后自动重新生成"""
+    rate = fx_rate(period, currency) if currency == "美元" else None
+    word = None
+    if fmt == "zip":
+        doc = word_report_path(period, currency)
+        word = doc.stat().st_mtime_ns if doc.exists() else None
+    tag = hashlib.sha1(
+        f"{period_data_version(period)}|{get_engine().mapping().version}|{rate}|{word}".encode("utf-8")
+    ).hexdigest()[:8]
+    return period_output_dir(period) / f"全部报表_{period.replace('-', '')}_{currency}_{tag}.{fmt}"
+
+
+def _build_bundle(job: Job, engine: ReportEngine, period: str, currency: str, fmt: str, path: str) -> Path:
+    """后台任务：本期全部报表写成一个工作簿，zip 格式再附上本期本币种已生成的 Word 报告"""
+    from excel_export import write_reports
+    path = Path(path)
+    part = path.with_name(path.name + ".part")
+    names = bundle_reports()
+
+    def sheets():
+        for i, rpt in enumerate(names):
+            job.progress(i, len(names), rpt)
+            yield report_sheet(engine, rpt, period, currency)
+
+    try:
+        if fmt == "xlsx":
+            write_reports(part, sheets())
+        else:
+            xlsx = path.with_name(path.stem + ".xlsx.part")
+            write_reports(xlsx, sheets())
+            with zipfile.ZipFile(part, "w", zipfile.ZIP_DEFLATED) as zf:
+                zf.write(xlsx, f"全部报表_{period_label(period)}.xlsx")
+                doc = word_report_path(period, currency)
+                if doc.exists():
+                    zf.write(doc, doc.name)
+            xlsx.unlink()
+        os.replace(part, path)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    # 同期间同格式的旧版本打包文件不再有用
+    for old in path.parent.glob(f"全部报表_{period.replace('-', '')}_{currency}_*.{fmt}"):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """进程级后台任务队列；创建时把重启前未完成的任务重新排队"""
+    engine = get_engine()
+    return JobQueue(get_database(), {
+        "bundle": partial(_build_bundle, engine=engine),
+        "word-template": partial(generate_word_report, engine=engine),
+    }, workers=JOB_WORKERS)
+
+
+@st.fragment(run_every=JOB_POLL)
+def job_progress(job_id: int):
+    """任务进度条：本片段定时刷新，不占用页面脚本；任务结束后整页重跑以显示结果"""
+    job = get_job_queue().get(job_id)
+    if job is None or job.finished:
+        st.rerun()
+    text = f"{job.status} {job.done}/{job.total}：{job.message}" if job.total else f"{job.status}…"
+    st.progress(job.fraction, text=text)
+
+
+@st.fragment
+@perf_scope("bundle_panel")
+def bundle_panel(period: str, currency: str):
+    """导出本期全部：已生成直接下载；生成中显示进度（只刷新本片段）"""
+    fmt = st.radio(
+        "bundle_fmt", list(BUNDLE_FORMATS), format_func=BUNDLE_FORMATS.get,
+        key="bundle_fmt", horizontal=True, label_visibility="collapsed",
+    )
+    path = bundle_path(period, currency, fmt)
+    queue = get_job_queue()
+    key = f"bundle:{path.name}"
+    job = queue.latest(key)
+    if (job is None or job.finished) and not path.exists():
+        if job is not None and job.error:
+            st.error(f"打包失败：{job.error}")
+        if not st.button("📦 导出本期全部", key="bundle_btn", use_container_width=True):
+            st.caption(f"{len(bundle_reports())} 张报表合并为一个文件，后台生成，再次下载无需等待")
+            return
+        job = queue.get(queue.submit("bundle", key, period=period, currency=currency, fmt=fmt, path=str(path)))
+    if job is not None and not job.finished:
+        job_progress(job.id)
+        return
+    st.download_button(
+        f"📥 下载本期全部（{fmt_size(path.stat().st_size)}）",
+        data=lambda p=path: p.read_bytes(),
+        file_name=f"全部报表_{period_label(period)}_{currency}.{fmt}",
+        mime=XLSX_MIME if fmt == "xlsx" else "application/zip",
+        on_click="ignore", key="bundle_dl", use_container_width=True,
+    )
+    st.caption(f"生成于 {datetime.fromtimestamp(path.stat().st_mtime):%m-%d %H:%M}，源数据未变化时直接下载")
+
+
+@st.fragment
+@perf_scope("word_toolbar")
+def word_toolbar(period: str, currency: str):
+    """Word 报告工具栏：生成任务在后台执行，本片段轮询进度，完成后整页刷新预览与下载"""
+    queue = get_job_queue()
+    key = f"word:{period}:{currency}"
+    job = queue.latest(key)
+    word_path = word_report_path(period, currency)
+    t1, t2, t3, t4 = st.columns([1.5, 1.5, 1.5, 3.5])
+    with t1:
+        if st.button("🤖 生成报告", type="primary", use_container_width=True, key="gen_word_btn"):
+            job = queue.get(queue.submit("word-template", key, period=period, currency=currency))
+    with t2:
+        st.download_button(
+            "📥 下载 Word",
+            data=lambda p=word_path: p.read_bytes(),
+            file_name=f"月度财务分析报告_{period_label(period)}.docx",
+            mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            on_click="ignore", disabled=not word_path.exists(),
+            key="dl_word", use_container_width=True,
+        )
+    with t3:
+        st.button(
+            "📥 下载 PDF", disabled=True, help="暂不支持导出 PDF，请下载 Word 后另存为 PDF",
+            key="dl_word_pdf", use_container_width=True,
+        )
+    if job is not None and not job.finished:
+        job_progress(job.id)
+    elif job is not None and job.error:
+        st.warning(job.error)
 
 
 # ====================================================================
 # AI 响应
 # ====================================================================
-def ai_respond(query: str, report_name: str, period: str, currency: str) -> str:
-    gemini_key = get_api_key("GEMINI_API_KEY")
-    if gemini_key:
+AI_WAIT_TICK   = 0.25   # 等待应答时刷新界面的间隔（秒），期间可响应取消 / 重跑
+AI_STREAM_TICK = 0.08   # 流式输出时回复框的刷新间隔（秒）
+
+
+@st.cache_resource
+def get_ai_client():
+    """进程内共用的模型客户端；未配置 GEMINI_API_KEY 时返回 None"""
+    api_key = get_api_key("GEMINI_API_KEY")
+    if not api_key:
+        return None
+    return GeminiClient(
+        api_key,
+        base_url=get_api_key("AI_BASE_URL") or DEFAULT_BASE_URL,
+        model=get_api_key("AI_MODEL") or DEFAULT_MODEL,
+        timeout=float(get_api_key("AI_TIMEOUT") or DEFAULT_TIMEOUT),
+        cache=ResponseCache(get_database()),
+    )
+
+
+def ai_prompt(query: str, report_name: str, period: str, currency: str) -> str:
+    return (
+        f"你是一个央企财务分析助手。当前报表：{report_name}，"
+        f"期间：{period_label(period)}，币种：{currency}。"
+        f"用户指令：{query}\n"
+        "请用简洁专业中文回答（2~3句），若涉及取数规则给出科目编码和字段名。"
+    )
+
+
+def ai_reply_html(text: str, typing: bool = False) -> str:
+    return f'<div class="ai-reply">🤖 {text}{"▌" if typing else ""}</div>'
+
+
+def wait_ai(req, status, timeout: float, reply=None) -> str:
+    """轮询后台请求并刷新等待提示；reply 不为空时把已生成的部分逐段写入回复框。
+    超时、点击取消或页面重跑时取消请求"""
+    t0 = time.monotonic()
+    shown = ""
+    try:
+        while not req.done():
+            elapsed = time.monotonic() - t0
+            if elapsed > timeout:
+                raise TimeoutError(f"AI 应答超时（{timeout:.0f}s）")
+            text = req.partial() if reply is not None else ""
+            if text and text != shown:
+                reply.markdown(ai_reply_html(text, typing=True), unsafe_allow_html=True)
+                shown = text
+            status.caption(f"AI 处理中… {elapsed:.1f}s")
+            time.sleep(AI_WAIT_TICK if not shown else AI_STREAM_TICK)
+        return req.result()
+    finally:
+        if not req.done():
+            req.cancel()
+        status.empty()
+
+
+@metrics.timed("ai")
+def ai_respond(query: str, report_name: str, period: str, currency: str,
+               status=None, reply=None) -> str:
+    """优先调用模型（带缓存、超时与取消），传入 reply 占位时流式生成并逐段显示；
+    未配置 GEMINI_API_KEY 或调用失败时退回规则引擎"""
+    client = get_ai_client()
+    if client is not None:
+        req = client.submit(
+            ai_prompt(query, report_name, period, currency),
+            cache_on=(query, report_name, period, currency),
+            stream=reply is not None,
+        )
+        # 流式应答逐段到达，每次读取仍受连接超时限制，总时长放宽到 3 倍
+        budget = client.timeout * (3 if reply is not None else 1) + 1
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=gemini_key)
-            model = genai.GenerativeModel("gemini-2.0-flash-exp")
-            prompt = (
-                f"你是一个央企财务分析助手。当前报表：{report_name}，"
-                f"期间：{period_label(period)}，币种：{currency}。"
-                f"用户指令：{query}\n"
-                "请用简洁专业中文回答（2~3句），若涉及取数规则给出科目编码和字段名。"
-            )
-            resp = model.generate_content(prompt)
-            return resp.text.strip()
-        except Exception:
+            return wait_ai(req, status or st.empty(), budget, reply)
+        except (AIError, CancelledError, TimeoutError):
             pass
+    return rule_respond(query, report_name, period, currency)
 
-    # 规则引擎演示
-    q = query
-    if "收入" in q or "6001" in q:
-        return f"主营业务收入取自科目余额表科目编码 6001，取「本期贷方发生额」。{period_label(period)}实现营业收入 **85420 万{currency}**，同比增长 8.2%，主要来自铜精矿销售。"
-    elif "成本" in q or "6401" in q:
-        return f"营业成本取自科目余额表科目编码 6401，取「本期借方发生额」。本期成本 **62180 万{currency}**，毛利率 27.2%，较上期提升 1.5pp，成本管控成效显著。"
-    elif "净利" in q or "利润" in q:
-        return f"本期净利润 **14297 万{currency}**，同比增长 18.0%。主因铜价上涨驱动收入增长 8.2%，同时生产降本使毛利率提升至 27.2%，盈利能力持续改善。"
-    elif "铜" in q or "产量" in q:
-        return f"本月铜产量 **2086 吨**，完成计划 99.3%；综合回收率 91.3%，优于 91.0% 的计划目标；年度累计 12380 吨，完成年度计划 49.1%，进度正常。"
-    elif "分析" in q or "变动" in q or "原因" in q:
-        return f"{report_name}显示本期经营情况良好：收入增长 8.2%，净利润增长 18.0%，盈利能力持续提升。建议关注财务费用同比上涨 14.3%，可优化融资结构降低资金成本。"
-    else:
-        return f"已接收指令：「{query[:50]}」。系统将从基础资料库（科目余额表、成本表）自动匹配取数规则并填入 **{report_name}** 对应单元格。如需指定科目编码，请在指令中注明。"
+
+def rule_respond(query: str, report_name: str, period: str, currency: str) -> str:
+    """按 rules/*.csv 的问答规则应答，金额取自所选期间的科目余额表"""
+    from engine import LedgerFacts, NoLedgerData
+    facts = LedgerFacts(get_engine(), period, {
+        "query": query[:50], "report": report_name, "period": period_label(period),
+        "currency": currency,
+    }, currency=currency)
+    try:
+        return load_rules(RULES_DIR).respond(query, facts)
+    except NoLedgerData:
+        return (f"{period_label(period)}尚未上传科目余额表，无法按实际数据回答。"
+                f"请先在「基础资料库」上传本期科目余额表，或切换到已有数据的期间。")
+    except (RuleError, KeyError, ValueError) as e:
+        return f"问答规则配置有误（{e}），请检查 rules 目录下的规则文件。"
 
 
 # ====================================================================
@@ -846,6 +1065,7 @@ div[data-testid="stRadio"] div[role="radiogroup"] label[data-checked="true"]::be
 }
 .rpt-title { font-size: 1.0rem; font-weight: 700; color: #081c38; }
 .rpt-meta { font-size: 0.88rem; color: #3a5070; font-weight: 500; letter-spacing: 0.02em; }
+.rpt-note { font-size: 0.82rem; color: #8a6d1f; background: #fdf8e8; border: 1px solid #efe0b0; border-radius: 5px; padding: 5px 10px; margin-bottom: 8px; }
 .badge { display: inline-block; border-radius: 3px; padding: 2px 8px; font-size: 0.70rem; font-weight: 600; }
 .badge-ok   { background: #d1fae5; color: #065f46; }
 .badge-wait { background: #fef3c7; color: #92400e; }
@@ -1030,7 +1250,6 @@ def _ss(key, default):
 _ss("currency", "美元")
 _ss("computed_reports", set())
 _ss("ai_responses", {})
-_ss("word_generated", False)
 
 
 # ====================================================================
@@ -1038,10 +1257,8 @@ _ss("word_generated", False)
 # ====================================================================
 period_opts = period_options()
 
-conn = get_db()
-upload_count   = conn.execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
-gen_count      = conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
-conn.close()
+upload_count   = get_database().counter("uploads")
+gen_count      = get_database().counter("generations")
 
 
 # ====================================================================
@@ -1078,6 +1295,8 @@ with hc3:
     )
     st.session_state.currency = currency
 
+data_version = period_data_version(selected_period)
+
 
 # ====================================================================
 # 侧边栏 — 数据上传 + 统计
@@ -1093,44 +1312,83 @@ with st.sidebar:
     )
     if uploaded_file:
         try:
-            file_bytes = uploaded_file.read()
             file_ext   = uploaded_file.name.rsplit(".", 1)[-1].lower()
-            df_dict    = read_excel_file(file_bytes, file_ext)
-            total_rows = sum(len(df) for df in df_dict.values())
-            st.caption(f"✅ {len(df_dict)} 个Sheet，共 {total_rows:,} 行")
-            if st.button("💾 保存到平台", type="primary", use_container_width=True):
-                save_path = period_data_dir(selected_period) / uploaded_file.name
-                with open(save_path, "wb") as f:
-                    f.write(file_bytes)
-                conn = get_db()
-                cur = conn.execute(
-                    "INSERT INTO uploads (period,filename,file_type,sheet_count,row_count,upload_time,file_path) "
-                    "VALUES (?,?,?,?,?,?,?)",
-                    (selected_period, uploaded_file.name, file_ext,
-                     len(df_dict), total_rows, datetime.now().isoformat(), str(save_path)),
-                )
-                if len(file_bytes) < 10 * 1024 * 1024:
-                    st.session_state[f"fc_{cur.lastrowid}"] = file_bytes
-                conn.commit(); conn.close()
-                st.success("已保存！")
+            # 分块写盘后按路径流式解析，不在内存中复制整个文件
+            stage_key  = f"staged_{getattr(uploaded_file, 'file_id', uploaded_file.name)}"
+            if stage_key not in st.session_state or not os.path.exists(st.session_state[stage_key]):
+                from workbook import stage_upload
+                st.session_state[stage_key] = str(stage_upload(uploaded_file, INCOMING_DIR, file_ext))
+            staged_path = st.session_state[stage_key]
+            digest = Path(staged_path).stem          # 暂存文件以内容哈希命名
+            # 内容相同的文件已保存过：直接沿用其 Sheet 数、行数与入账结果，不再解析
+            from ledger import copy_ledger, extract_ledger, find_upload, store_ledger
+            known = find_upload(get_database(), digest, selected_period)
+            if known is not None:
+                wb, sheet_count, total_rows = None, known[3], known[4]
+            else:
+                wb = load_workbook(staged_path, file_ext)
+                if wb.streamable and not wb.ingested:
+                    with st.spinner("正在流式解析入库…"):
+                        wb.ingest()
+                sheet_count, total_rows = len(wb.sheet_names), wb.total_rows
+            st.caption(f"✅ {sheet_count} 个Sheet，共 {total_rows:,} 行")
+            if known is not None and known[1] == selected_period:
+                st.info(f"本期已于 {known[6][:16].replace('T', ' ')} 保存过内容相同的「{known[2]}」，无需重复保存")
+            elif st.button("💾 保存到平台", type="primary", use_container_width=True):
+                from workbook import store_upload
+                save_path = store_upload(staged_path, OBJECTS_DIR, period_data_dir(selected_period), uploaded_file.name)
+                tb = extract_ledger(wb) if known is None else None
+                with get_database().write() as conn:
+                    upload_id = conn.execute(
+                        "INSERT INTO uploads (period,filename,file_type,sheet_count,row_count,upload_time,"
+                        "file_path,sha256) VALUES (?,?,?,?,?,?,?,?)",
+                        (selected_period, uploaded_file.name, file_ext, sheet_count, total_rows,
+                         datetime.now().isoformat(), str(save_path), digest),
+                    ).lastrowid
+                    if known is None:
+                        ledger_rows = store_ledger(conn, upload_id, selected_period, tb)
+                    elif known[5] is not None:
+                        ledger_rows = copy_ledger(conn, upload_id, selected_period, known[0])
+                    else:
+                        ledger_rows = 0      # 来源文件尚未识别入账，打开本期报表时补录
+                if ledger_rows:
+                    materialize_period(selected_period)
+                if uploaded_file.size < 10 * 1024 * 1024:
+                    st.session_state[f"fc_{upload_id}"] = uploaded_file.getvalue()
+                st.success(f"已保存！科目余额入账 {ledger_rows:,} 行" if ledger_rows else "已保存！")
                 st.rerun()
         except Exception as e:
             st.error(f"解析失败：{e}")
 
+    st.markdown("---")
+    st.markdown("### 💱 本期汇率")
+    # 科目余额表以人民币记账，美元报表按此汇率折算；本期未设置时沿用此前最近一期
+    usd_rate = fx_rate(selected_period, "美元")
+    new_rate = st.number_input(
+        "1 美元折合人民币（元）", min_value=0.0, value=usd_rate, step=0.01, format="%.4f",
+        placeholder="未设置", key=f"fx_usd_{selected_period}",
+    )
+    if new_rate and new_rate != usd_rate:
+        save_fx_rate(selected_period, "美元", new_rate)   # 主界面在侧边栏之后渲染，本次运行即生效
+
     st.markdown("---")
     st.markdown("### 📁 本期文件")
-    conn = get_db()
-    period_uploads = conn.execute(
-        "SELECT id, filename FROM uploads WHERE period=? ORDER BY upload_time DESC",
-        (selected_period,),
-    ).fetchall()
-    conn.close()
+    period_uploads = get_database().query(
+        "SELECT id, filename FROM uploads WHERE period=? ORDER BY upload_time DESC, id DESC LIMIT ?",
+        (selected_period, SIDEBAR_FILES + 1),
+    )
     if period_uploads:
-        for u in period_uploads:
+        for u in period_uploads[:SIDEBAR_FILES]:
             st.caption(f"📄 {u[1]}")
+        if len(period_uploads) > SIDEBAR_FILES:
+            st.caption(f"…仅显示最近 {SIDEBAR_FILES} 个，更多请在「基础资料库」中检索")
     else:
         st.caption("暂无文件，请上传")
 
+    st.markdown("---")
+    st.markdown("### 📦 本期打包导出")
+    bundle_panel(selected_period, currency)
+
     st.markdown("---")
     st.markdown("### 📊 平台统计")
     st.caption(f"已上传文件：**{upload_count}** 个")
@@ -1140,470 +1398,423 @@ with st.sidebar:
 
 
 # ====================================================================
-# 主界面 — 模块标签页
+# 主界面 — 模块（每个模块是独立的片段：模块内的操作只重跑本模块）
 # ====================================================================
-module_names = list(REPORT_MODULES.keys())
-tabs = st.tabs(module_names)
-
-for mod_name, tab in zip(module_names, tabs):
-    with tab:
+@st.fragment
+@perf_scope("library_module")
+def library_module():
+    """🗄️ 基础资料库：上传文件检索、分页与内容预览"""
+    lc, rc = st.columns([1.4, 4.6])
+    with lc:
+        st.markdown(
+            '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
+            'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
+            'UPLOADED FILES</p>',
+            unsafe_allow_html=True,
+        )
+        search = st.text_input(
+            "search", key="lib_search", placeholder="🔍 搜索文件名",
+            label_visibility="collapsed",
+        ).strip()
+        # 翻页游标栈：每页起点的 (期间, 上传时间, id)；搜索条件变化时回到第一页
+        if st.session_state.get("lib_search_prev") != search:
+            st.session_state.lib_search_prev = search
+            st.session_state.lib_cursors = [None]
+        cursors = st.session_state.setdefault("lib_cursors", [None])
+        all_files, has_next = list_uploads(search, cursors[-1])
+
+        if not all_files:
+            st.caption("没有匹配的文件" if search else "暂无文件，请在侧边栏上传")
+            sel_file = None
+        else:
+            file_labels = [
+                f"【{period_label(f[1]) if f[1] else '—'}】 {f[2]}"
+                for f in all_files
+            ]
+            sel_idx = st.radio(
+                "files", range(len(all_files)),
+                format_func=lambda i: file_labels[i],
+                key=f"lib_sel_{cursors[-1]}", label_visibility="collapsed",
+            )
+            sel_file = all_files[sel_idx]
+        if len(cursors) > 1 or has_next:
+            pc1, pc2, pc3 = st.columns([1, 1, 1])
+            with pc1:
+                if st.button("‹ 上一页", key="lib_prev", disabled=len(cursors) == 1,
+                             use_container_width=True):
+                    cursors.pop()
+                    st.rerun(scope="fragment")
+            with pc2:
+                st.caption(f"第 {len(cursors)} 页")
+            with pc3:
+                if st.button("下一页 ›", key="lib_next", disabled=not has_next,
+                             use_container_width=True):
+                    last = all_files[-1]
+                    cursors.append((last[1], last[6], last[0]))
+                    st.rerun(scope="fragment")
+
+    with rc:
+        if not all_files:
+            st.info("请先在左侧侧边栏上传 NC 系统导出的数据文件（科目余额表、成本表等）。")
+        else:
+            fpath, fname = sel_file[5], sel_file[2]
+            cache_key = f"fc_{sel_file[0]}"
+
+            st.markdown(
+                f'<div class="rpt-header">'
+                f'<div class="rpt-title">📂 {fname}</div>'
+                f'<div class="rpt-meta">期间：{period_label(sel_file[1])} · '
+                f'{sel_file[3]} 个Sheet · {sel_file[4]:,} 行</div>'
+                f'</div>',
+                unsafe_allow_html=True,
+            )
 
-        # ── 基础资料库 ──────────────────────────────────────────────
-        if mod_name == "🗄️ 基础资料库":
-            conn = get_db()
-            all_files = conn.execute(
-                "SELECT id, period, filename, sheet_count, row_count, file_path "
-                "FROM uploads ORDER BY period DESC, upload_time DESC"
-            ).fetchall()
-            conn.close()
-
-            lc, rc = st.columns([1.4, 4.6])
-            with lc:
-                st.markdown(
-                    '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
-                    'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
-                    'UPLOADED FILES</p>',
-                    unsafe_allow_html=True,
-                )
-                if not all_files:
-                    st.caption("暂无文件，请在侧边栏上传")
-                    sel_file = None
-                else:
-                    file_labels = [
-                        f"【{period_label(f[1]) if f[1] else '—'}】 {f[2]}"
-                        for f in all_files
-                    ]
-                    sel_idx = st.radio(
-                        "files", range(len(all_files)),
-                        format_func=lambda i: file_labels[i],
-                        key="lib_sel", label_visibility="collapsed",
+            wb = None
+            if fpath and os.path.exists(fpath):
+                try:
+                    ext = fpath.rsplit(".", 1)[-1].lower()
+                    wb = load_workbook(fpath, ext)
+                except Exception:
+                    pass
+            elif cache_key in st.session_state:
+                try:
+                    ext = fname.rsplit(".", 1)[-1].lower()
+                    wb = load_workbook(st.session_state[cache_key], ext)
+                except Exception:
+                    pass
+
+            if wb and wb.sheet_names:
+                from display import prepare_for_display
+                sheet_names = wb.sheet_names
+                if len(sheet_names) == 1:
+                    st.dataframe(
+                        prepare_for_display(wb.head(sheet_names[0], PREVIEW_ROWS)),
+                        use_container_width=True, height=480, hide_index=True,
                     )
-                    sel_file = all_files[sel_idx]
-
-            with rc:
-                if not all_files:
-                    st.info("请先在左侧侧边栏上传 NC 系统导出的数据文件（科目余额表、成本表等）。")
                 else:
-                    fpath, fname = sel_file[5], sel_file[2]
-                    cache_key = f"fc_{sel_file[0]}"
-
-                    st.markdown(
-                        f'<div class="rpt-header">'
-                        f'<div class="rpt-title">📂 {fname}</div>'
-                        f'<div class="rpt-meta">期间：{period_label(sel_file[1])} · '
-                        f'{sel_file[3]} 个Sheet · {sel_file[4]:,} 行</div>'
-                        f'</div>',
-                        unsafe_allow_html=True,
+                    # 只解析当前选中的 Sheet；行列数来自上传时记录的索引
+                    sn = st.radio(
+                        "sheets", sheet_names,
+                        format_func=lambda n: f"📄 {n}",
+                        key=f"lib_sheet_{sel_file[0]}", horizontal=True,
+                        label_visibility="collapsed",
+                    )
+                    n_rows, n_cols = wb.dims(sn)
+                    more = f"（预览前 {PREVIEW_ROWS:,} 行）" if n_rows > PREVIEW_ROWS else ""
+                    st.caption(f"{n_rows:,} 行 × {n_cols} 列{more}")
+                    st.dataframe(
+                        prepare_for_display(wb.head(sn, PREVIEW_ROWS)),
+                        use_container_width=True, height=440, hide_index=True,
                     )
+            else:
+                st.warning("⚠️ 文件不可读（云端会话缓存已过期），请重新上传。")
+
+
+@st.fragment
+@perf_scope("word_module")
+def word_module(selected_period: str, currency: str):
+    """📝 Word报告：按模板生成、下载与预览"""
+    lc, rc = st.columns([1.4, 4.6])
+    with lc:
+        st.markdown(
+            '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
+            'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
+            'REPORT LIST</p>',
+            unsafe_allow_html=True,
+        )
+        st.radio(
+            "word_rpts", ["月度财务分析报告（完整版）"],
+            key="word_rpt_sel", label_visibility="collapsed",
+        )
+    with rc:
+        word_toolbar(selected_period, currency)
+        word_path = word_report_path(selected_period, currency)
+        generated = word_path.exists()
+        badge = '<span class="badge badge-ok">已生成</span>' if generated else '<span class="badge badge-wait">待生成</span>'
+        n_tables = len(word_template().tables)
+        st.markdown(
+            f'<div class="rpt-header">'
+            f'<div class="rpt-title">{COMPANY_NAME}<br>'
+            f'{period_label(selected_period)}月度财务分析报告</div>'
+            f'<div class="rpt-meta">模板生成 · 含{n_tables}张数据表格 · {badge}</div>'
+            f'</div>',
+            unsafe_allow_html=True,
+        )
 
-                    df_dict = None
-                    if fpath and os.path.exists(fpath):
-                        try:
-                            ext = fpath.rsplit(".", 1)[-1].lower()
-                            df_dict = read_excel_file(fpath, ext)
-                        except Exception:
-                            pass
-                    elif cache_key in st.session_state:
-                        try:
-                            ext = fname.rsplit(".", 1)[-1].lower()
-                            df_dict = read_excel_file(st.session_state[cache_key], ext)
-                        except Exception:
-                            pass
-
-                    if df_dict:
-                        sheet_names = list(df_dict.keys())
-                        if len(sheet_names) == 1:
-                            st.dataframe(
-                                prepare_for_display(df_dict[sheet_names[0]]),
-                                use_container_width=True, height=480, hide_index=True,
-                            )
-                        else:
-                            ptabs = st.tabs([f"📄 {sn}" for sn in sheet_names[:12]])
-                            for ptab, sn in zip(ptabs, sheet_names[:12]):
-                                with ptab:
-                                    df = df_dict[sn]
-                                    st.caption(f"{len(df):,} 行 × {len(df.columns)} 列")
-                                    st.dataframe(
-                                        prepare_for_display(df),
-                                        use_container_width=True, height=440, hide_index=True,
-                                    )
-                    else:
-                        st.warning("⚠️ 文件不可读（云端会话缓存已过期），请重新上传。")
+        if generated:
+            from engine import NoLedgerData
+            from word_report import TemplateError
+            try:
+                st.markdown(word_preview_html(selected_period, currency), unsafe_allow_html=True)
+            except (NoLedgerData, TemplateError) as e:
+                st.warning(f"无法预览报告：{e}")
+        else:
+            st.info(
+                "点击「生成报告」，系统将按 templates 目录下的报告模板，取本期科目余额表的实际数据"
+                "生成月度财务分析报告：主要经营指标 · 利润总额同比分析 · 成本费用 · 两金及资产负债 · "
+                f"需关注事项，含{n_tables}张数据表格，生成后可下载 Word。"
+            )
 
-        # ── Word 报告 ────────────────────────────────────────────────
-        elif mod_name == "📝 Word报告":
-            lc, rc = st.columns([1.4, 4.6])
-            with lc:
-                st.markdown(
-                    '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
-                    'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
-                    'REPORT LIST</p>',
-                    unsafe_allow_html=True,
-                )
-                st.radio(
-                    "word_rpts", ["月度财务分析报告（完整版）"],
-                    key="word_rpt_sel", label_visibility="collapsed",
-                )
-            with rc:
-                # 工具栏
-                t1, t2, t3, t4 = st.columns([1.5, 1.5, 1.5, 3.5])
-                with t1:
-                    if st.button("🤖 AI生成报告", type="primary",
-                                  use_container_width=True, key="gen_word_btn"):
-                        with st.spinner("AI 正在撰写月度财务分析报告…"):
-                            time.sleep(2.5)
-                        st.session_state.word_generated = True
-                        st.rerun()
-                with t2:
-                    st.download_button(
-                        "📥 下载 Word",
-                        data=b"demo placeholder",
-                        file_name=f"月度财务分析报告_{period_label(selected_period)}.docx",
-                        key="dl_word", use_container_width=True,
-                    )
-                with t3:
-                    st.download_button(
-                        "📥 下载 PDF",
-                        data=b"demo placeholder",
-                        file_name=f"月度财务分析报告_{period_label(selected_period)}.pdf",
-                        key="dl_word_pdf", use_container_width=True,
-                    )
 
-                badge = '<span class="badge badge-ok">已生成</span>' if st.session_state.word_generated else '<span class="badge badge-wait">待生成</span>'
-                st.markdown(
-                    f'<div class="rpt-header">'
-                    f'<div class="rpt-title">中色华鑫马本德矿业有限公司<br>'
-                    f'{period_label(selected_period)}月度财务分析报告</div>'
-                    f'<div class="rpt-meta">AI智能生成 · 7章节 · 含5张数据表格 · {badge}</div>'
-                    f'</div>',
-                    unsafe_allow_html=True,
-                )
-
-                if st.session_state.word_generated:
-                    st.markdown("""
-<div class="ai-reply">
-<b>一、市场铜价情况</b><br>
-2026年1月，LME铜均价 9500 美元/吨，较上月上涨 0.4%，同比上涨 6.8%。受美元走弱及全球制造业PMI回暖影响，铜价月内整体维持高位震荡。公司本月铜均价实现 9500 美元/吨，与 LME 持平，价格传导正常。<br><br>
-
-<b>二、年度主要考核指标完成情况</b><br>
-本月实现利润总额 <b>16820 万美元</b>，完成年度计划进度 14.0%，进度正常；净资产收益率（ROE）年化约 19.0%，超出年度目标。年度累计铜产量 12380 吨，完成年度计划 49.1%。<br><br>
-
-<b>三、阴极铜产销量情况</b><br>
-本月铜产量 <b>2086 吨</b>，完成月度计划 99.3%，环比增长 1.8%；铜销量 2140 吨，超产量 54 吨，月末铜库存 450 吨，库存结构合理。硫酸联产量 8240 吨，综合回收率 91.3%，均完成月度计划。<br><br>
-
-<b>四、单位生产成本情况</b><br>
-本月阴极铜单位生产成本 <b>4280 美元/吨</b>，低于计划成本 4350 美元/吨，环比下降 0.7%。直接材料占比 50.2%，电力费用占比 23.0%，为最主要成本项。矿石原料成本 5820 万美元，受矿石品位稳定影响，处理成本环比略升 2.3%。<br><br>
-
-<b>五、利润总额情况（同比分析）</b><br>
-本月利润总额 16820 万美元，同比增长 18.0%，主要驱动因素：①铜价同比上涨 6.8%，拉动收入增加 6490 万美元；②产量同比增长 3.8%，增加收入约 780 万美元；③单位成本同比下降 1.2%，节约成本约 190 万美元。<br><br>
-
-<b>六、两金情况</b><br>
-本月末两金合计 <b>28020 万美元</b>，较上月增加 620 万美元（↑2.3%）。其中：存货 15680 万美元（原料库存 12300 吨、产成品库存 450 吨）；应收账款 8320 万美元，账龄结构正常，无逾期风险。两金占流动资产比例 62.3%，处于合理范围内。<br><br>
-
-<b>七、生产经营存在的问题</b><br>
-① 财务费用同比上涨 14.3%，建议优化融资结构，适时置换高息负债；<br>
-② 电耗较上月有所下降，但仍高于行业标杆，建议深入推进节能降耗专项行动；<br>
-③ 应付账款环比增长 5.2%，需关注供应商付款节奏，维护供应链稳定；<br>
-④ 矿石库存 12300 吨，约满足 10 天生产用量，建议提前做好备料计划；<br>
-⑤ 外籍员工管理成本上升，建议加快本地化培训，提升本地员工占比。<br><br>
-
-<i style="color:#8090a8;font-size:0.80rem;">
-（以上为AI演示生成内容，正式版本将基于 NC 系统实际数据自动生成，含5张数据明细表格及图表分析）
-</i>
-</div>""", unsafe_allow_html=True)
-                else:
-                    st.info(
-                        "点击「AI生成报告」，系统将基于本期财务数据自动撰写完整月度财务分析报告，"
-                        "包含：市场铜价情况 · 年度考核指标完成情况 · 阴极铜产销量情况 · "
-                        "单位生产成本情况 · 利润总额同比分析 · 两金情况 · 生产经营问题建议。"
-                        "含5张数据明细表格及图表分析，一键导出 Word/PDF。"
-                    )
+@st.fragment
+@perf_scope("report_module")
+def report_module(mod_name: str, selected_period: str, currency: str, data_version: str):
+    """月度快报 / 基础报表 / 分析底稿：左侧报表导航，右侧运算工具栏、报表与 AI 取数对话"""
+    reports = REPORT_MODULES[mod_name]
+    if not reports:
+        st.info("该模块暂无报表配置。")
+        return
+
+    # 模块 key（去掉 emoji）
+    mod_key = mod_name.split(" ", 1)[-1].replace(" ", "_")
+    nav_key = f"nav_{mod_key}"
+    _ss(nav_key, reports[0])
+
+    lc, rc = st.columns([1.4, 4.6])
+
+    # ── 左侧导航 ──
+    with lc:
+        st.markdown(
+            '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
+            'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
+            'REPORT LIST</p>',
+            unsafe_allow_html=True,
+        )
+        selected_rpt = st.radio(
+            "rpt_nav", reports,
+            key=nav_key, label_visibility="collapsed",
+        )
 
-        # ── 普通报表模块（月度快报 / 基础报表 / 分析底稿）──────────
-        else:
-            reports = REPORT_MODULES[mod_name]
-            if not reports:
-                st.info("该模块暂无报表配置。")
-                continue
-
-            # 模块 key（去掉 emoji）
-            mod_key = mod_name.split(" ", 1)[-1].replace(" ", "_")
-            nav_key = f"nav_{mod_key}"
-            _ss(nav_key, reports[0])
-
-            lc, rc = st.columns([1.4, 4.6])
-
-            # ── 左侧导航 ──
-            with lc:
-                st.markdown(
-                    '<p style="font-size:0.68rem;font-weight:700;color:#8090a8;'
-                    'letter-spacing:0.1em;text-transform:uppercase;margin:4px 0 6px 4px;">'
-                    'REPORT LIST</p>',
-                    unsafe_allow_html=True,
-                )
-                selected_rpt = st.radio(
-                    "rpt_nav", reports,
-                    key=nav_key, label_visibility="collapsed",
-                )
-
-            # ── 右侧内容区 ──
-            with rc:
-                r_key = f"{mod_key}__{selected_rpt}"
-                is_computed = r_key in st.session_state.computed_reports
-
-                # 工具栏
-                # 工具栏：左侧运算组 | 分隔 | 右侧工具组
-                st.markdown(
-                    '<div style="background:#f0f5fb;border:1px solid #c8d8ec;border-radius:7px;'
-                    'padding:8px 12px;margin-bottom:10px;display:flex;align-items:center;gap:6px;">',
-                    unsafe_allow_html=True,
-                )
-                tc1, tc2, tc3, tsp1, tc4, tc5 = st.columns([1.75, 1.75, 1.75, 0.08, 1.3, 1.3])
-                with tc1:
-                    run_single = st.button(
-                        "▶  运算当前", key=f"rs_{r_key}", use_container_width=True, type="primary",
-                    )
-                with tc2:
-                    run_cat = st.button(
-                        "▶▶  运算本类报表", key=f"rc_{r_key}", use_container_width=True,
-                    )
-                with tc3:
-                    run_all = st.button(
-                        "▶▶▶  全部报表运算", key=f"ra_{r_key}", use_container_width=True,
-                    )
-                with tsp1:
-                    st.markdown(
-                        '<div style="width:1px;height:28px;background:#c0d0e4;margin:4px auto;"></div>',
-                        unsafe_allow_html=True,
-                    )
-                with tc4:
-                    st.download_button(
-                        "📊  导出 Excel",
-                        data=b"demo",
-                        file_name=f"{selected_rpt}_{period_label(selected_period)}.xlsx",
-                        key=f"dl_{r_key}", use_container_width=True,
-                    )
-                with tc5:
-                    if st.button("✔  审核校验", key=f"audit_{r_key}", use_container_width=True):
-                        st.toast("✅ 审核完成，数据无异常", icon="✅")
-                st.markdown('</div>', unsafe_allow_html=True)
-
-                # 运算逻辑
-                if run_single:
-                    with st.spinner(f"正在运算：{selected_rpt}…"):
-                        time.sleep(1.2)
-                    st.session_state.computed_reports.add(r_key)
-                    st.rerun()
-                if run_cat:
-                    with st.spinner(f"正在运算本类全部报表…"):
-                        time.sleep(2.2)
-                    for rpt in reports:
-                        st.session_state.computed_reports.add(f"{mod_key}__{rpt}")
-                    st.success(f"✅ {mod_name.split(' ',1)[-1]} 全部 {len(reports)} 张报表运算完成")
-                if run_all:
-                    with st.spinner("正在运算所有模块全部报表…"):
-                        time.sleep(3.5)
-                    for mn, rlist in REPORT_MODULES.items():
-                        mk = mn.split(" ", 1)[-1].replace(" ", "_")
-                        for rpt in rlist:
-                            st.session_state.computed_reports.add(f"{mk}__{rpt}")
-                    st.success("✅ 全部报表运算完成！")
-
-                # 报表标题
-                badge_html = (
-                    '<span class="badge badge-ok">已运算</span>'
-                    if is_computed else
-                    '<span class="badge badge-wait">待运算</span>'
-                )
-                st.markdown(
-                    f'<div class="rpt-header">'
-                    f'<div class="rpt-title">{selected_rpt}</div>'
-                    f'<div class="rpt-meta">'
-                    f'{period_label(selected_period)} &nbsp;·&nbsp; '
-                    f'单位：万{"美元" if currency == "美元" else "元人民币"} &nbsp;·&nbsp; '
-                    f'{badge_html}</div>'
-                    f'</div>',
-                    unsafe_allow_html=True,
-                )
-
-                # 报表数据
-                ustr = "美元" if currency == "美元" else "元"
-
-                # 重要指标快报 → 8大卡片（同比/环比/完成率全展示）
-                if "指标" in selected_rpt and "快报" in selected_rpt:
-                    st.markdown(render_quick_report(selected_rpt, currency), unsafe_allow_html=True)
-
-                # 生产经营月度快报 → 生产类 4 KPI卡片 + 明细表
-                elif "生产经营" in selected_rpt:
-                    st.markdown(f"""
-<div class="kpi-grid">
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
-    <div class="kpi-body"><div class="kpi-val">2086</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;2100</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">综合回收率</span><span class="kpi-unit">百分比</span></div>
-    <div class="kpi-body"><div class="kpi-val">91.3%</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑0.5%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;91.0%</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">处理矿石量</span><span class="kpi-unit">吨/月</span></div>
-    <div class="kpi-body"><div class="kpi-val">38400</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.6%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;38000</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">电    耗</span><span class="kpi-unit">度/吨铜</span></div>
-    <div class="kpi-body"><div class="kpi-val">1850</div></div>
-    <div class="kpi-foot"><span class="kpi-chg dn">↓1.1%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;1900</span></div>
-  </div>
-</div>""", unsafe_allow_html=True)
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
+    # ── 右侧内容区 ──
+    with rc:
+        r_key = f"{mod_key}__{selected_rpt}"
 
-                # 资金情况月报 → 资金类 4 KPI卡片 + 明细表
-                elif "资金情况" in selected_rpt:
-                    st.markdown(f"""
-<div class="kpi-grid">
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">货 币 资 金</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">12450</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑4.6%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;11285</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">应 收 账 款</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">8320</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑3.4%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;7890</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">带 息 负 债</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">7200</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑2.9%&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;6800</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">资产负债率</span><span class="kpi-unit">百分比</span></div>
-    <div class="kpi-body"><div class="kpi-val">43.4%</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑0.6pp&nbsp;环比</span><span class="kpi-base">上年同期&nbsp;41.9%</span></div>
-  </div>
-</div>""", unsafe_allow_html=True)
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
+        # 工具栏
+        # 工具栏：左侧运算组 | 分隔 | 右侧工具组
+        st.markdown(
+            '<div style="background:#f0f5fb;border:1px solid #c8d8ec;border-radius:7px;'
+            'padding:8px 12px;margin-bottom:10px;display:flex;align-items:center;gap:6px;">',
+            unsafe_allow_html=True,
+        )
+        tc1, tc2, tc3, tsp1, tc4, tc5 = st.columns([1.75, 1.75, 1.75, 0.08, 1.3, 1.3])
+        with tc1:
+            run_single = st.button(
+                "▶  运算当前", key=f"rs_{r_key}", use_container_width=True, type="primary",
+            )
+        with tc2:
+            run_cat = st.button(
+                "▶▶  运算本类报表", key=f"rc_{r_key}", use_container_width=True,
+            )
+        with tc3:
+            run_all = st.button(
+                "▶▶▶  全部报表运算", key=f"ra_{r_key}", use_container_width=True,
+            )
+        with tsp1:
+            st.markdown(
+                '<div style="width:1px;height:28px;background:#c0d0e4;margin:4px auto;"></div>',
+                unsafe_allow_html=True,
+            )
+        with tc4:
+            # data 传入函数：点击下载时才在后台线程生成，重跑页面不重复生成
+            engine = get_engine()
+            st.download_button(
+                "📊  导出 Excel",
+                data=lambda rpt=selected_rpt, p=selected_period, c=currency:
+                    export_report_xlsx(engine, rpt, p, c),
+                file_name=f"{selected_rpt}_{period_label(selected_period)}.xlsx",
+                mime=XLSX_MIME, on_click="ignore",
+                key=f"dl_{r_key}", use_container_width=True,
+            )
+        with tc5:
+            if st.button("✔  审核校验", key=f"audit_{r_key}", use_container_width=True):
+                st.toast("✅ 审核完成，数据无异常", icon="✅")
+        st.markdown('</div>', unsafe_allow_html=True)
+
+        # 运算逻辑
+        # 运算逻辑（同一期间的中间汇总由引擎缓存，多张报表共用）
+        if run_single:
+            with st.spinner(f"正在运算：{selected_rpt}…"):
+                get_engine().compute(selected_rpt, selected_period, currency)
+            st.session_state.computed_reports.add(r_key)
+        if run_cat:
+            ok, failed = run_reports(reports, selected_period, currency)
+            for rpt in ok:
+                st.session_state.computed_reports.add(f"{mod_key}__{rpt}")
+            if failed:
+                st.error(f"❌ {len(failed)} 张报表运算失败：{'、'.join(failed)}")
+            else:
+                st.success(f"✅ {mod_name.split(' ',1)[-1]} 全部 {len(reports)} 张报表运算完成")
+        if run_all:
+            mod_of = {
+                rpt: mn.split(" ", 1)[-1].replace(" ", "_")
+                for mn, rlist in REPORT_MODULES.items()
+                if mn not in ("🗄️ 基础资料库", "📝 Word报告")
+                for rpt in rlist
+            }
+            ok, failed = run_reports(list(mod_of), selected_period, currency)
+            for rpt in ok:
+                st.session_state.computed_reports.add(f"{mod_of[rpt]}__{rpt}")
+            if failed:
+                st.error(f"❌ {len(failed)} 张报表运算失败：{'、'.join(failed)}")
+            else:
+                st.success("✅ 全部报表运算完成！")
+
+        # 报表标题（运算按钮在本次片段重跑中已执行，状态直接取最新值）
+        is_computed = r_key in st.session_state.computed_reports
+        badge_html = (
+            '<span class="badge badge-ok">已运算</span>'
+            if is_computed else
+            '<span class="badge badge-wait">待运算</span>'
+        )
+        # 单位随本期汇率：美元未设置汇率时金额按人民币列示，单位与说明同报表运算一致
+        _, unit, unit_note = get_engine().money(selected_period, currency)
+        st.markdown(
+            f'<div class="rpt-header">'
+            f'<div class="rpt-title">{selected_rpt}</div>'
+            f'<div class="rpt-meta">'
+            f'{period_label(selected_period)} &nbsp;·&nbsp; '
+            f'单位：{unit}{f"（{unit_note}）" if unit_note else ""} &nbsp;·&nbsp; '
+            f'{badge_html}</div>'
+            f'</div>',
+            unsafe_allow_html=True,
+        )
 
-                # 产销存快报 → 产销库存类 4 KPI卡片 + 明细表
-                elif "产销存" in selected_rpt:
-                    st.markdown(f"""
-<div class="kpi-grid">
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
-    <div class="kpi-body"><div class="kpi-val">2086</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">本年累计&nbsp;12380</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 销 量</span><span class="kpi-unit">吨/月</span></div>
-    <div class="kpi-body"><div class="kpi-val">2140</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑2.1%&nbsp;环比</span><span class="kpi-base">本年累计&nbsp;12590</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 库 存</span><span class="kpi-unit">吨</span></div>
-    <div class="kpi-body"><div class="kpi-val">450</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑11.4%&nbsp;环比</span><span class="kpi-base">上月库存&nbsp;404</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 均 价</span><span class="kpi-unit">美元/吨</span></div>
-    <div class="kpi-body"><div class="kpi-val">9500</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑0.4%&nbsp;环比</span><span class="kpi-base">年度计划&nbsp;9500</span></div>
-  </div>
-</div>""", unsafe_allow_html=True)
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
+        # 报表数据（渲染结果按数据版本缓存）
+        page = st.session_state.get(f"pg_{r_key}", 1)
+        body_html, pages = render_report_fragment(
+            selected_rpt, selected_period, currency, data_version,
+            get_engine().mapping().version, is_computed, page, fx_rate(selected_period, currency) if currency == "美元" else None,
+        )
+        if page > pages:
+            st.session_state[f"pg_{r_key}"] = pages
+        if pages > 1:
+            st.number_input(
+                f"页码（共 {pages} 页）", min_value=1, max_value=pages, value=1,
+                key=f"pg_{r_key}",
+            )
+        st.markdown(body_html, unsafe_allow_html=True)
 
-                # 成本费用快报 → 成本类 4 KPI卡片 + 明细表
-                elif "成本费用" in selected_rpt:
-                    st.markdown(f"""
-<div class="kpi-grid">
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">单位生产成本</span><span class="kpi-unit">美元/吨铜</span></div>
-    <div class="kpi-body"><div class="kpi-val">4280</div></div>
-    <div class="kpi-foot"><span class="kpi-chg dn">↓0.7%&nbsp;环比</span><span class="kpi-base">月度计划&nbsp;4350</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">生产成本合计</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">16064</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.6%&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;15818</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">毛 利 率</span><span class="kpi-unit">百分比</span></div>
-    <div class="kpi-body"><div class="kpi-val">27.2%</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.5pp&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;25.7%</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">电力费占比</span><span class="kpi-unit">百分比</span></div>
-    <div class="kpi-body"><div class="kpi-val">23.0%</div></div>
-    <div class="kpi-foot"><span class="kpi-chg dn">↓0.1pp&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;23.1%</span></div>
-  </div>
-</div>""", unsafe_allow_html=True)
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
+        # AI 取数对话
+        st.markdown(
+            '<div class="ai-label">🤖 AI 智能取数 &nbsp;—&nbsp; '
+            '描述数据来源或提问，AI 自动匹配科目取数规则</div>',
+            unsafe_allow_html=True,
+        )
+        ai_c1, ai_c2 = st.columns([5.5, 0.8])
+        with ai_c1:
+            ai_input = st.text_input(
+                "ai", key=f"ai_in_{r_key}",
+                placeholder='例："主营业务收入 取自科目余额表 6001 贷方发生额"  或  "分析本月净利润变动原因"',
+                label_visibility="collapsed",
+            )
+        with ai_c2:
+            ai_send = st.button("发送", key=f"ai_btn_{r_key}",
+                                 use_container_width=True, type="primary")
+
+        ai_reply = st.empty()
+        if ai_send and ai_input.strip():
+            # 等待期间点击「取消」会触发重跑，进行中的请求随之取消
+            ai_wait = st.empty()
+            ai_cancel = st.empty()
+            ai_cancel.button("取消", key=f"ai_cancel_{r_key}")
+            resp = ai_respond(ai_input.strip(), selected_rpt, selected_period, currency,
+                              ai_wait, ai_reply)
+            ai_cancel.empty()
+            st.session_state.ai_responses[r_key] = resp
+
+        if r_key in st.session_state.ai_responses:
+            ai_reply.markdown(ai_reply_html(st.session_state.ai_responses[r_key]),
+                              unsafe_allow_html=True)
+
+
+PERF_TAB      = "⏱️ 性能面板"
+PERF_SLOWEST  = 10
+
+
+@st.fragment
+def perf_module():
+    """⏱️ 性能面板（仅管理员）：各环节耗时 p50 / p95 与最慢的运行"""
+    import pandas as pd
+    c1, c2, _ = st.columns([1.2, 1.2, 4])
+    with c1:
+        on = st.toggle("记录性能数据", value=metrics.enabled(), key="perf_on")
+        if on != metrics.enabled():
+            metrics.set_enabled(on)     # 进程级开关，对所有会话生效
+    with c2:
+        window = st.selectbox("时间范围", list(PERF_WINDOWS), key="perf_window", label_visibility="collapsed")
+    since = (datetime.now() - timedelta(hours=PERF_WINDOWS[window])).isoformat()
+    df = pd.DataFrame(
+        get_database().query(
+            "SELECT run_id, started_at, scope, stage, calls, seconds FROM metrics WHERE started_at >= ?",
+            (since,),
+        ),
+        columns=["run_id", "started_at", "scope", "stage", "calls", "seconds"],
+    )
+    if df.empty:
+        st.info("该时间范围内暂无记录" + ("" if metrics.enabled() else "（性能数据记录未开启）"))
+        return
+
+    # 各环节耗时分布：每次运行该环节的自身耗时（未调用该环节的运行不计入）
+    total = df.loc[df["stage"] == metrics.STAGE_TOTAL, "seconds"].sum()
+    by_stage = df.groupby("stage")
+    stats = pd.DataFrame({
+        "运行数": by_stage["run_id"].nunique(),
+        "调用次数": by_stage["calls"].sum(),
+        "p50 (ms)": by_stage["seconds"].quantile(0.5) * 1000,
+        "p95 (ms)": by_stage["seconds"].quantile(0.95) * 1000,
+        "耗时占比": by_stage["seconds"].sum() / total if total else 0.0,
+    })
+    order = [s for s in PERF_STAGES if s in stats.index] + sorted(set(stats.index) - set(PERF_STAGES))
+    stats = stats.loc[order].rename(index=lambda s: PERF_STAGES.get(s, s)).rename_axis("环节")
+    st.caption(f"共 {df['run_id'].nunique():,} 次运行（整页重跑与片段单独重跑分别计）")
+    st.dataframe(
+        stats.style.format({"p50 (ms)": "{:,.1f}", "p95 (ms)": "{:,.1f}", "耗时占比": "{:.1%}"}),
+        use_container_width=True,
+    )
 
-                # 人力资源快报 / 环保安全快报 → 仅明细表，无 KPI 卡片
-                elif "人力资源" in selected_rpt or "环保安全" in selected_rpt:
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
+    st.markdown(f"**最慢的 {PERF_SLOWEST} 次运行**")
+    runs = df[df["stage"] == metrics.STAGE_TOTAL].nlargest(PERF_SLOWEST, "seconds")
+    parts = df[df["run_id"].isin(runs["run_id"]) & (df["stage"] != metrics.STAGE_TOTAL)]
+    breakdown = (
+        parts.sort_values("seconds", ascending=False)
+        .groupby("run_id", sort=False)
+        .apply(lambda g: " · ".join(
+            f"{PERF_STAGES.get(s, s)} {v * 1000:,.0f}ms" for s, v in zip(g["stage"], g["seconds"]) if v >= 0.001
+        ), include_groups=False)
+    )
+    st.dataframe(
+        pd.DataFrame({
+            "时间": runs["started_at"].str.replace("T", " "),
+            "范围": runs["scope"],
+            "耗时 (ms)": (runs["seconds"] * 1000).round(1),
+            "环节构成": runs["run_id"].map(breakdown).fillna(""),
+        }),
+        use_container_width=True, hide_index=True,
+    )
 
-                # 分析底稿 + 其他分析类 / 基础报表 → 财务摘要 4 KPI卡片（仅分析类）+ 表格
-                else:
-                    analysis_keywords = ["同比", "环比", "分析", "底稿"]
-                    if any(k in selected_rpt for k in analysis_keywords):
-                        st.markdown(f"""
-<div class="kpi-grid">
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">净 利 润</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">14297</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑18.0%&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;12112</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">营业收入</span><span class="kpi-unit">万{ustr}</span></div>
-    <div class="kpi-body"><div class="kpi-val">85420</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑8.2%&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;78930</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">毛 利 率</span><span class="kpi-unit">百分比</span></div>
-    <div class="kpi-body"><div class="kpi-val">27.2%</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.5pp&nbsp;同比</span><span class="kpi-base">上年同期&nbsp;25.7%</span></div>
-  </div>
-  <div class="kpi-card">
-    <div class="kpi-head"><span class="kpi-name">铜 产 量</span><span class="kpi-unit">吨/月</span></div>
-    <div class="kpi-body"><div class="kpi-val">2086</div></div>
-    <div class="kpi-foot"><span class="kpi-chg up">↑1.8%&nbsp;环比</span><span class="kpi-base">上月实际&nbsp;2050</span></div>
-  </div>
-</div>""", unsafe_allow_html=True)
-                    df = gen_demo_df(selected_rpt, currency)
-                    st.markdown(render_finance_table(df, selected_rpt), unsafe_allow_html=True)
-
-                # AI 取数对话
-                st.markdown(
-                    '<div class="ai-label">🤖 AI 智能取数 &nbsp;—&nbsp; '
-                    '描述数据来源或提问，AI 自动匹配科目取数规则</div>',
-                    unsafe_allow_html=True,
-                )
-                ai_c1, ai_c2 = st.columns([5.5, 0.8])
-                with ai_c1:
-                    ai_input = st.text_input(
-                        "ai", key=f"ai_in_{r_key}",
-                        placeholder='例："主营业务收入 取自科目余额表 6001 贷方发生额"  或  "分析本月净利润变动原因"',
-                        label_visibility="collapsed",
-                    )
-                with ai_c2:
-                    ai_send = st.button("发送", key=f"ai_btn_{r_key}",
-                                         use_container_width=True, type="primary")
-
-                if ai_send and ai_input.strip():
-                    with st.spinner("AI 处理中…"):
-                        resp = ai_respond(ai_input.strip(), selected_rpt, selected_period, currency)
-                    st.session_state.ai_responses[r_key] = resp
-
-                if r_key in st.session_state.ai_responses:
-                    st.markdown(
-                        f'<div class="ai-reply">🤖 {st.session_state.ai_responses[r_key]}</div>',
-                        unsafe_allow_html=True,
-                    )
+
+# 标签页按需渲染：只执行当前选中模块，切换标签页时整页重跑一次
+# 未渲染的控件状态会在整页重跑结束时被清除；导航选择、页码、输入内容转为普通会话状态保留
+MODULE_STATE_KEYS = ("nav_", "pg_", "ai_in_", "lib_search", "lib_sel_", "lib_sheet_", "word_rpt_sel")
+for _k in [k for k in st.session_state if str(k).startswith(MODULE_STATE_KEYS)]:
+    st.session_state[_k] = st.session_state[_k]
+
+module_names = list(REPORT_MODULES.keys()) + ([PERF_TAB] if is_admin() else [])
+tabs = st.tabs(module_names, key="module_tab", on_change="rerun")
+
+for mod_name, tab in zip(module_names, tabs):
+    if not tab.open:
+        continue
+    with tab:
+        if mod_name == "🗄️ 基础资料库":
+            library_module()
+        elif mod_name == "📝 Word报告":
+            word_module(selected_period, currency)
+        elif mod_name == PERF_TAB:
+            perf_module()
+        else:
+            report_module(mod_name, selected_period, currency, data_version)
+
+# 后台任务线程在页面渲染完之后启动（首次运行时），重启前未完成的任务随之继续
+get_job_queue()
+metrics.finish()
@@ -0,0 +1,97 @@
+"""
+资料库预览格式化基准
+====================
+对比逐单元格的旧实现（apply(format_cell)）与按列向量化的 prepare_for_display：
+先校验两者输出逐格一致，再报告耗时与加速比。
+
+    python benchmarks/bench_format.py --rows 200000
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from display import format_cell, prepare_for_display  # noqa: E402
+
+
+def legacy_prepare_for_display(df):
+    """向量化之前的实现，作为输出一致性的基准"""
+    display_df = df.copy()
+    new_cols = []
+    for i, c in enumerate(display_df.columns):
+        s = str(c)
+        new_cols.append(f"列{i+1}" if s.startswith("Unnamed") else s)
+    display_df.columns = new_cols
+    for col in display_df.columns:
+        if display_df[col].dtype == object:
+            display_df[col] = display_df[col].ffill()
+    for col in display_df.columns:
+        display_df[col] = display_df[col].apply(format_cell)
+    return display_df
+
+
+def make_trial_balance(rows: int, seed: int = 0) -> pd.DataFrame:
+    """NC 科目余额表风格的合成数据：文本编码、合并单元格留空、数值与文本混排的金额列"""
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(1001, 6999, rows).astype(str)
+    names = np.array(["库存现金", "银行存款", "应收账款", "存货", "固定资产", "主营业务收入"], dtype=object)
+    name_col = names[rng.integers(0, len(names), rows)]
+    name_col[rng.random(rows) < 0.3] = np.nan            # 合并单元格导出为空
+    opening = np.round(rng.normal(0, 1e6, rows), 2)
+    opening[rng.random(rows) < 0.1] = np.nan
+    debit = rng.integers(0, 10 ** 7, rows).astype(np.int64)
+    mixed = np.where(
+        rng.random(rows) < 0.5,
+        np.round(rng.normal(0, 1e4, rows), 3).astype(object),
+        np.array(["—", " 1200 ", "12.5", "(3420)", "", "本期合计"], dtype=object)[rng.integers(0, 6, rows)],
+    ).astype(object)
+    return pd.DataFrame({
+        "科目编码": pd.Series(codes, dtype=object),
+        "科目名称": pd.Series(name_col, dtype=object),
+        "期初余额": opening,
+        "本期借方": debit,
+        "Unnamed: 4": pd.Series(mixed, dtype=object),
+        "Unnamed: 5": np.full(rows, np.nan),
+    })
+
+
+def timed(fn, *args, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rows", type=int, default=200_000)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args(argv)
+
+    df = make_trial_balance(args.rows)
+    expected = legacy_prepare_for_display(df)
+    actual = prepare_for_display(df)
+    if list(expected.columns) != list(actual.columns) or not (
+        expected.to_numpy() == actual.to_numpy()
+    ).all():
+        diff = (expected.to_numpy() != actual.to_numpy()).nonzero()
+        r, c = diff[0][0], diff[1][0]
+        print(f"输出不一致：第 {r} 行 {expected.columns[c]}：{expected.iat[r, c]!r} != {actual.iat[r, c]!r}")
+        return 1
+
+    t_old = timed(legacy_prepare_for_display, df, repeat=args.repeat)
+    t_new = timed(prepare_for_display, df, repeat=args.repeat)
+    print(f"rows={args.rows:,}  legacy={t_old:.3f}s  vectorized={t_new:.3f}s  speedup={t_old / t_new:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,230 @@
+"""
+解析 → 格式化 → 渲染热路径基准
+================================
+合成 NC 风格的科目余额表导出（1k ~ 1M 行），逐项测量：
+
+- workbook.read_excel_file：csv / xlsx / xls 三种导出格式；
+- display.prepare_for_display（整表）、display.format_cell（逐单元格）；
+- demo_data.gen_demo_df、display.render_finance_table、display.render_quick_report。
+
+每项记录最快一次耗时、吞吐（行/秒或次/秒）与 Python 堆峰值（tracemalloc，含 numpy 数组）。
+--save 写出 JSON 基线；--compare 与基线对比，耗时或峰值超出 --threshold 即返回 1。
+全程离线运行；样本文件按行数缓存在 --data-dir，重复运行不再生成。
+xls 样本需要 xlwt（未安装时跳过），且受格式限制最多 65535 行。
+
+    python benchmarks/bench_hotpath.py --sizes 1k,10k,100k,1m --save baseline.json
+    python benchmarks/bench_hotpath.py --sizes 1k,10k,100k,1m --compare baseline.json --threshold 0.2
+"""
+
+import argparse
+import gc
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_format import make_trial_balance  # noqa: E402
+from demo_data import gen_demo_df  # noqa: E402
+from display import format_cell, prepare_for_display, render_finance_table, render_quick_report  # noqa: E402
+from workbook import read_excel_file  # noqa: E402
+
+XLS_MAX_ROWS = 65_535
+DEMO_REPORTS = ["生产经营月度快报", "资产负债表", "利润表", "现金流量表", "应收账款明细表",
+                "同比分析底稿", "成本构成分析", "费用明细分析", "毛利率趋势分析"]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().lower().replace("_", "")
+    for suffix, mult in (("k", 1_000), ("m", 1_000_000)):
+        if text.endswith(suffix):
+            return int(float(text[:-1]) * mult)
+    return int(text)
+
+
+def size_label(n: int) -> str:
+    if n % 1_000_000 == 0:
+        return f"{n // 1_000_000}m"
+    return f"{n // 1000}k" if n % 1000 == 0 else str(n)
+
+
+# ====================================================================
+# 样本文件
+# ====================================================================
+def _write_xls(df: pd.DataFrame, path: Path):
+    import xlwt
+    book = xlwt.Workbook(encoding="utf-8")
+    sheet = book.add_sheet("科目余额表")
+    for j, c in enumerate(df.columns):
+        sheet.write(0, j, str(c))
+    for i, row in enumerate(df.itertuples(index=False, name=None), start=1):
+        for j, v in enumerate(row):
+            if v is None or (isinstance(v, float) and np.isnan(v)):
+                continue
+            sheet.write(i, j, v.item() if isinstance(v, np.generic) else v)
+    book.save(str(path))
+
+
+def sample_file(data_dir: Path, rows: int, ext: str) -> Path:
+    """按行数生成（或复用已生成的）NC 风格导出文件"""
+    path = data_dir / f"nc_tb_{rows}.{ext}"
+    if path.exists():
+        return path
+    df = make_trial_balance(rows)
+    part = path.with_name(f"{path.stem}.part.{ext}")
+    if ext == "csv":
+        df.to_csv(part, index=False)
+    elif ext == "xlsx":
+        with pd.ExcelWriter(part, engine="xlsxwriter",
+                            engine_kwargs={"options": {"constant_memory": True}}) as writer:
+            df.to_excel(writer, sheet_name="科目余额表", index=False)
+    else:
+        _write_xls(df, part)
+    part.replace(path)
+    return path
+
+
+# ====================================================================
+# 测量
+# ====================================================================
+def measure(fn, repeat: int) -> tuple:
+    """返回 (最快耗时秒, tracemalloc 峰值字节)；峰值单独再跑一次，不影响计时"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return best, peak
+
+
+def cases(sizes: list, data_dir: Path, max_excel_rows: int, only: str = ""):
+    """生成 (名称, 规模, 计数, 单位, 函数)；大样本在用到时才生成 / 读入，--only 未选中的不生成"""
+    try:
+        import xlwt  # noqa: F401
+        has_xlwt = True
+    except ImportError:
+        has_xlwt = False
+        print("未安装 xlwt，跳过 read_excel_file[xls]")
+
+    for rows in sizes:
+        label = size_label(rows)
+        for ext in ("csv", "xlsx", "xls"):
+            if ext != "csv" and rows > max_excel_rows:
+                continue
+            if ext == "xls" and (not has_xlwt or rows > XLS_MAX_ROWS):
+                continue
+            if only not in f"read_excel_file[{ext}]":
+                continue
+            path = sample_file(data_dir, rows, ext)
+            yield f"read_excel_file[{ext}]", label, rows, "rows/s", lambda p=path, e=ext: read_excel_file(p, e)
+
+        if not any(only in n for n in ("prepare_for_display", "format_cell", "render_finance_table")):
+            continue
+        df = make_trial_balance(rows)
+        yield "prepare_for_display", label, rows, "rows/s", lambda d=df: prepare_for_display(d)
+
+        cells = np.concatenate([df["期初余额"].to_numpy(dtype=object), df["Unnamed: 4"].to_numpy()])
+        yield "format_cell", label, len(cells), "cells/s", lambda c=cells: [format_cell(v) for v in c]
+
+        shown = prepare_for_display(df)
+        yield "render_finance_table", label, rows, "rows/s", lambda d=shown: render_finance_table(d, "科目余额表")
+        del df, shown, cells
+
+    yield "gen_demo_df", "-", len(DEMO_REPORTS), "calls/s", \
+        lambda: [gen_demo_df(r, c) for r in DEMO_REPORTS for c in ("美元", "人民币")]
+    yield "render_demo_table", "-", len(DEMO_REPORTS), "calls/s", \
+        lambda ds=[(gen_demo_df(r, "美元"), r) for r in DEMO_REPORTS]: [render_finance_table(d, r) for d, r in ds]
+    yield "render_quick_report", "-", 1, "calls/s", lambda: render_quick_report("重要指标快报", "美元")
+
+
+# ====================================================================
+# 基线对比
+# ====================================================================
+def compare(results: dict, baseline: dict, threshold: float, min_delta: float) -> list:
+    """返回超出阈值的退化项：(名称, 指标, 基线, 本次)；差值小于 min_delta 秒的耗时抖动不计"""
+    regressions = []
+    for key, cur in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        if cur["seconds"] > old["seconds"] * (1 + threshold) and cur["seconds"] - old["seconds"] > min_delta:
+            regressions.append((key, "seconds", old["seconds"], cur["seconds"]))
+        if cur["peak_mb"] > old["peak_mb"] * (1 + threshold) and cur["peak_mb"] - old["peak_mb"] > 1:
+            regressions.append((key, "peak_mb", old["peak_mb"], cur["peak_mb"]))
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--sizes", default="1k,10k,100k,1m", help="样本行数，逗号分隔（支持 k / m 后缀）")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--max-excel-rows", default="100k", help="xlsx / xls 样本行数上限（读 1M 行 xlsx 需数分钟）")
+    ap.add_argument("--only", help="只运行名称包含该文本的项目")
+    ap.add_argument("--data-dir", default=str(Path(tempfile.gettempdir()) / "fin_report_bench"))
+    ap.add_argument("--save", help="结果写入 JSON 基线文件")
+    ap.add_argument("--compare", help="与 JSON 基线对比，退化超出阈值时返回 1")
+    ap.add_argument("--threshold", type=float, default=0.2, help="允许的退化比例（默认 0.2 即 20%%）")
+    ap.add_argument("--min-delta-ms", type=float, default=2.0, help="耗时差值低于该值时视为抖动")
+    args = ap.parse_args(argv)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    data_dir = Path(args.data_dir)
+    data_dir.mkdir(parents=True, exist_ok=True)
+
+    results = {}
+    print(f"{'项目':<26}{'规模':>4}{'耗时':>10}{'吞吐':>12}{'峰值':>18}")   # 中文字符占两列
+    for name, label, count, unit, fn in cases(sizes, data_dir, parse_size(args.max_excel_rows), args.only or ""):
+        if args.only and args.only not in name:
+            continue
+        seconds, peak = measure(fn, args.repeat)
+        key = f"{name}@{label}"
+        results[key] = {
+            "seconds": round(seconds, 6), "throughput": round(count / seconds, 1), "unit": unit,
+            "peak_mb": round(peak / 1024 ** 2, 2),
+        }
+        print(f"{name:<28}{label:>6}{seconds * 1000:>10.1f}ms{count / seconds:>14,.0f} {unit:<7}"
+              f"{peak / 1024 ** 2:>9.1f} MB", flush=True)
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "meta": {
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(), "pandas": pd.__version__, "numpy": np.__version__,
+                "machine": platform.platform(), "repeat": args.repeat,
+            },
+            "results": results,
+        }, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"基线已保存：{args.save}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1000)
+        missing = sorted(set(baseline) - set(results))
+        if missing:
+            print(f"基线中有 {len(missing)} 项本次未运行：{', '.join(missing[:5])}{' …' if len(missing) > 5 else ''}")
+        for key, metric, old, new in regressions:
+            print(f"退化：{key} {metric} {old} → {new}（+{(new / old - 1) * 100:.0f}%）")
+        if regressions:
+            return 1
+        print(f"与基线对比：{len(set(results) & set(baseline))} 项均在 {args.threshold:.0%} 阈值内")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
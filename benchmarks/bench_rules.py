@@ -0,0 +1,111 @@
+"""
+取数对话规则匹配基准
+====================
+合成数百条关键词 / 科目编码 / 正则规则，对比逐条规则扫描提问的朴素实现与
+rule_engine.RuleSet（Aho-Corasick 自动机 + 合并正则）：先校验两者选出的规则一致，
+再报告单次匹配耗时。
+
+    python benchmarks/bench_rules.py --rules 500
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from rule_engine import RuleSet, normalize_text  # noqa: E402
+
+WORDS = ["收入", "成本", "毛利", "费用", "利润", "资金", "应收", "应付", "存货", "借款", "税金", "折旧"]
+
+
+def make_rules(n: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    rules = []
+    for i in range(n):
+        patterns = [f"{WORDS[i % len(WORDS)]}{i}", f"{rng.choice(WORDS)}{rng.choice(WORDS)}{i % 97}"]
+        if i % 3 == 0:
+            patterns.append(f"{1001 + i}*")
+        if i % 25 == 0:
+            patterns.append(f"re:第{i}[期月]")
+        rules.append((int(rng.integers(0, 10)), f"规则{i}", patterns, "{query}"))
+    rules.append((0, "默认", [], "{query}"))
+    return rules
+
+
+def make_queries(n: int, n_rules: int, seed: int = 1) -> list:
+    rng = np.random.default_rng(seed)
+    out = []
+    for _ in range(n):
+        i = int(rng.integers(0, n_rules))
+        parts = [f"请问{WORDS[i % len(WORDS)]}{i}的情况", f"科目{1001 + int(rng.integers(0, n_rules))}余额",
+                 f"第{int(rng.integers(0, n_rules))}期", "同比变动原因"]
+        rng.shuffle(parts)
+        out.append("，".join(parts[: int(rng.integers(1, 5))]))
+    return out
+
+
+def naive_match(rules: list, query: str) -> str:
+    """逐条规则、逐个模式在提问中查找，规则选择口径与 RuleSet.match 相同"""
+    text = normalize_text(query)
+    best, default = None, None
+    for order, (priority, name, patterns, _) in enumerate(rules):
+        if not patterns:
+            default = name
+            continue
+        hit = set()
+        for j, p in enumerate(patterns):
+            if p.startswith("re:"):
+                if re.search(p[3:], text):
+                    hit.add("re")
+            elif re.fullmatch(r"[0-9x]+\*?", p):
+                body = p.rstrip("*").replace("x", r"\d")
+                tail = r"\d*" if p.endswith("*") else ""
+                if re.search(rf"(?<!\d){body}{tail}(?!\d)", text):
+                    hit.add(j)
+            elif normalize_text(p) in text:
+                hit.add(j)
+        if hit:
+            key = (priority, len(hit), -order)
+            if best is None or key > best[0]:
+                best = (key, name)
+    return best[1] if best else default
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--rules", type=int, default=500)
+    ap.add_argument("--queries", type=int, default=2000)
+    args = ap.parse_args(argv)
+
+    rules = make_rules(args.rules)
+    queries = make_queries(args.queries, args.rules)
+    t0 = time.perf_counter()
+    ruleset = RuleSet(rules)
+    t_build = time.perf_counter() - t0
+
+    for q in queries:
+        expected, actual = naive_match(rules, q), ruleset.match(q)[0].name
+        if expected != actual:
+            print(f"结果不一致：{q!r}：{expected} != {actual}")
+            return 1
+
+    t0 = time.perf_counter()
+    for q in queries:
+        naive_match(rules, q)
+    t_old = (time.perf_counter() - t0) / len(queries)
+    t0 = time.perf_counter()
+    for q in queries:
+        ruleset.match(q)
+    t_new = (time.perf_counter() - t0) / len(queries)
+    print(f"rules={args.rules}  build={t_build * 1000:.1f}ms  naive={t_old * 1e6:.0f}us/query  "
+          f"compiled={t_new * 1e6:.0f}us/query  speedup={t_old / t_new:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+冷启动 / 首屏基准
+=================
+每轮在新的解释器进程中用 streamlit.testing 运行 app.py（冷启动），记录：
+
+- 首屏：脚本开始到第一个页面元素发出（CSS、页头）的耗时；
+- 骨架：pandas 载入之前已发出的页面元素个数（页头、期间选择、侧边栏等不依赖报表库的部分）；
+- 冷启动整页：首次运行脚本的总耗时；
+- 重跑：同一进程内第二次运行的耗时（模块已导入、进程级资源已创建）。
+
+取多轮中位数输出；--json 写出结果供前后对比。
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("pandas", "numpy", "xlsxwriter", "openpyxl", "pyarrow")
+
+
+def child() -> dict:
+    """在当前（全新）进程内冷启动一次并返回各项耗时"""
+    from streamlit.runtime.scriptrunner_utils.script_run_context import ScriptRunContext
+    from streamlit.testing.v1 import AppTest
+
+    marks = []
+    enqueue = ScriptRunContext.enqueue
+
+    def traced(self, msg):
+        if msg.WhichOneof("type") == "delta":
+            marks.append((time.perf_counter(), "pandas" in sys.modules))
+        return enqueue(self, msg)
+
+    ScriptRunContext.enqueue = traced
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=300)
+    preloaded = [m for m in HEAVY if m in sys.modules]
+    t0 = time.perf_counter()
+    at.run()
+    t_cold = time.perf_counter() - t0
+    if at.exception:
+        raise SystemExit(f"app.py 运行出错：{at.exception[0].message}")
+    t1 = time.perf_counter()
+    at.run()
+    t_warm = time.perf_counter() - t1
+    return {
+        "first_paint_ms": (marks[0][0] - t0) * 1000 if marks else None,
+        "skeleton_elements": sum(1 for _, heavy in marks if not heavy) if not preloaded else 0,
+        "cold_run_ms": t_cold * 1000,
+        "rerun_ms": t_warm * 1000,
+        "preloaded": preloaded,
+    }
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--json", help="结果写入 JSON 文件")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = ap.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(child()))
+        return 0
+
+    samples = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child"], cwd=ROOT, capture_output=True, text=True,
+        )
+        if out.returncode:
+            print(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "子进程失败")
+            return 1
+        samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    if samples[0]["preloaded"]:
+        print(f"注意：streamlit 导入时已载入 {', '.join(samples[0]['preloaded'])}，骨架计数不可用")
+
+    result = {k: statistics.median(s[k] for s in samples)
+              for k in ("first_paint_ms", "skeleton_elements", "cold_run_ms", "rerun_ms")}
+    print(f"runs={args.runs}  首屏={result['first_paint_ms']:.0f}ms  "
+          f"骨架元素={result['skeleton_elements']:.0f}  冷启动整页={result['cold_run_ms']:.0f}ms  "
+          f"重跑={result['rerun_ms']:.0f}ms")
+    if args.json:
+        Path(args.json).write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,278 @@
+"""
+数据库访问层
+============
+platform.db 的进程级连接池：
+
+- WAL 日志 + busy_timeout，读写互不阻塞，偶发锁等待在库内排队而不是报 "database is locked"；
+- 读连接池复用连接，每个连接自带语句缓存（同一 SQL 文本只编译一次）；
+- 全部写操作经同一把锁、同一条写连接串行执行，一个写事务内的语句一起提交或回滚；
+- 表结构迁移按 PRAGMA user_version 逐版本执行，每个进程只在创建 Database 时运行一次。
+"""
+
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from metrics import span
+
+BUSY_TIMEOUT_MS   = 10_000
+STATEMENT_CACHE   = 256
+
+
+def _add_column(conn, table: str, column: str, decl: str):
+    cols = [r[1] for r in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in cols:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# ====================================================================
+# 表结构迁移（只追加，不修改已发布的版本）
+# ====================================================================
+def _v1_base(conn):
+    conn.execute("""CREATE TABLE IF NOT EXISTS uploads (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period TEXT NOT NULL DEFAULT '',
+        filename TEXT NOT NULL,
+        file_type TEXT,
+        sheet_count INTEGER DEFAULT 0,
+        row_count INTEGER DEFAULT 0,
+        upload_time TEXT NOT NULL,
+        file_path TEXT,
+        status TEXT DEFAULT '已上传'
+    )""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS generations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        period TEXT NOT NULL DEFAULT '',
+        source_upload_id INTEGER,
+        ai_model TEXT,
+        output_filename TEXT,
+        output_path TEXT,
+        status TEXT DEFAULT '生成中',
+        created_at TEXT NOT NULL,
+        duration_seconds REAL
+    )""")
+    for tbl in ("uploads", "generations"):
+        _add_column(conn, tbl, "period", "TEXT NOT NULL DEFAULT ''")
+
+
+def _v2_ledger(conn):
+    # 标准化科目余额：每次上传的每个核算单位一组，报表与取数直接按期间 / 科目查询
+    conn.execute("""CREATE TABLE IF NOT EXISTS ledger (
+        upload_id INTEGER NOT NULL,
+        period TEXT NOT NULL,
+        entity TEXT NOT NULL DEFAULT '',
+        account_code TEXT NOT NULL,
+        account_name TEXT,
+        opening REAL DEFAULT 0,
+        debit REAL DEFAULT 0,
+        credit REAL DEFAULT 0,
+        closing REAL DEFAULT 0
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_period_code ON ledger (period, account_code)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_period_entity ON ledger (period, entity, upload_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_upload ON ledger (upload_id)")
+    # ledger_rows：入账的科目余额行数；NULL 表示尚未识别（入账功能上线前的上传）
+    _add_column(conn, "uploads", "ledger_rows", "INTEGER")
+
+
+def _v3_history_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_period_time ON uploads (period, upload_time, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_generations_period_time ON generations (period, created_at)")
+    # 行数计数器由触发器维护，页面统计不再全表 COUNT(*)；
+    # generations 中 ai_model = 'engine' 的行是报表运算耗时记录，不计入「已生成报表」
+    conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0)")
+    for tbl, cond in (("uploads", "1"), ("generations", "{row}ai_model IS NOT 'engine'")):
+        conn.execute(
+            f"INSERT OR REPLACE INTO counters (name, value) "
+            f"SELECT '{tbl}', COUNT(*) FROM {tbl} WHERE {cond.format(row='')}"
+        )
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{tbl}_count_ins AFTER INSERT ON {tbl}
+            WHEN {cond.format(row='NEW.')}
+            BEGIN UPDATE counters SET value = value + 1 WHERE name = '{tbl}'; END""")
+        conn.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_{tbl}_count_del AFTER DELETE ON {tbl}
+            WHEN {cond.format(row='OLD.')}
+            BEGIN UPDATE counters SET value = value - 1 WHERE name = '{tbl}'; END""")
+
+
+def _v4_period_lines(conn):
+    # 期间汇总快照：映射后的报表项目金额，version = 映射规则版本:期间数据版本
+    conn.execute("""CREATE TABLE IF NOT EXISTS period_lines (
+        period TEXT NOT NULL,
+        version TEXT NOT NULL,
+        line_key TEXT NOT NULL,
+        opening REAL DEFAULT 0,
+        debit REAL DEFAULT 0,
+        credit REAL DEFAULT 0,
+        closing REAL DEFAULT 0,
+        PRIMARY KEY (period, version, line_key)
+    ) WITHOUT ROWID""")
+
+
+def _v5_ai_cache(conn):
+    # AI 应答缓存：key = sha256(规范化问题, 报表, 期间, 币种, 模型)
+    conn.execute("""CREATE TABLE IF NOT EXISTS ai_cache (
+        key TEXT PRIMARY KEY,
+        query TEXT,
+        report TEXT,
+        period TEXT,
+        currency TEXT,
+        model TEXT,
+        response TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0
+    )""")
+
+
+def _v6_jobs(conn):
+    # 后台任务（jobs.JobQueue）：kind 任务类型，job_key 去重键，params 任务参数（JSON），
+    # worker 执行进程（主机名:进程号）
+    for column, decl in (("kind", "TEXT"), ("job_key", "TEXT"), ("params", "TEXT"), ("worker", "TEXT"),
+                         ("started_at", "TEXT"), ("progress_done", "INTEGER"),
+                         ("progress_total", "INTEGER"), ("message", "TEXT"), ("error", "TEXT")):
+        _add_column(conn, "generations", column, decl)
+    # 同一 key 同时只能有一个排队 / 生成中的任务；已结束的任务不受限制
+    conn.execute("""CREATE UNIQUE INDEX IF NOT EXISTS idx_generations_active_job ON generations (job_key)
+        WHERE job_key IS NOT NULL AND status IN ('排队中', '生成中')""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_generations_job_key ON generations (job_key, id)
+        WHERE job_key IS NOT NULL""")
+    conn.execute("""CREATE INDEX IF NOT EXISTS idx_generations_job_status ON generations (status, id)
+        WHERE job_key IS NOT NULL""")
+
+
+def _v7_metrics(conn):
+    # 性能埋点（metrics.py）：每次页面运行每个环节一行；stage = total 为整次运行耗时
+    conn.execute("""CREATE TABLE IF NOT EXISTS metrics (
+        run_id TEXT NOT NULL,
+        started_at TEXT NOT NULL,
+        scope TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        calls INTEGER NOT NULL DEFAULT 0,
+        seconds REAL NOT NULL DEFAULT 0
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_metrics_time ON metrics (started_at)")
+
+
+def _v8_upload_hash(conn):
+    # 上传文件内容 SHA-256（文件存于 objects/ 内容寻址目录）；重复上传据此复用已保存的记录
+    _add_column(conn, "uploads", "sha256", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_uploads_sha256 ON uploads (sha256, period) WHERE sha256 IS NOT NULL")
+
+
+def _v9_fx_rates(conn):
+    # 外币汇率：1 单位 currency 折合人民币元；期间未设置时沿用此前最近一期
+    conn.execute("""CREATE TABLE IF NOT EXISTS fx_rates (
+        period TEXT NOT NULL,
+        currency TEXT NOT NULL,
+        rate REAL NOT NULL,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (currency, period)
+    ) WITHOUT ROWID""")
+
+
+def _v10_period_accounts(conn):
+    # 期间科目快照：跨期报表从往期按科目取数的范围（engine.PRIOR_ACCOUNTS 及其下级），
+    # version = 科目范围版本:期间数据版本
+    conn.execute("""CREATE TABLE IF NOT EXISTS period_accounts (
+        period TEXT NOT NULL,
+        version TEXT NOT NULL,
+        account_code TEXT NOT NULL,
+        account_name TEXT,
+        opening REAL DEFAULT 0,
+        debit REAL DEFAULT 0,
+        credit REAL DEFAULT 0,
+        closing REAL DEFAULT 0,
+        PRIMARY KEY (period, version, account_code)
+    ) WITHOUT ROWID""")
+
+
+MIGRATIONS = [_v1_base, _v2_ledger, _v3_history_indexes, _v4_period_lines, _v5_ai_cache, _v6_jobs,
+              _v7_metrics, _v8_upload_hash, _v9_fx_rates, _v10_period_accounts]
+
+
+def migrate(conn) -> int:
+    """执行未应用的迁移，返回当前版本"""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for i, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {i}")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return len(MIGRATIONS)
+
+
+# ====================================================================
+# 连接池
+# ====================================================================
+class Database:
+    """进程内共享的 platform.db 访问入口（线程安全）"""
+
+    def __init__(self, path, pool_size: int = 8):
+        self.path = str(path)
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._pool: queue.LifoQueue = queue.LifoQueue(maxsize=pool_size)
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        with self._write_lock:
+            migrate(self._writer)
+
+    def _connect(self) -> sqlite3.Connection:
+        # isolation_level=None：事务由 write() 显式控制
+        conn = sqlite3.connect(
+            self.path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None,
+            check_same_thread=False, cached_statements=STATEMENT_CACHE,
+        )
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def read(self):
+        """借出一条只读连接，用完归还连接池（块内耗时计入 sqlite 环节）"""
+        with span("sqlite"):
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                try:
+                    self._pool.put_nowait(conn)
+                except queue.Full:
+                    conn.close()
+
+    @contextmanager
+    def write(self):
+        """串行写事务：块内语句全部成功后一次提交，异常时回滚（含等锁时间，计入 sqlite 环节）"""
+        with span("sqlite"), self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            self._writer.execute("COMMIT")
+
+    def query(self, sql: str, params=()) -> list:
+        with self.read() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql: str, params=()):
+        with self.read() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def counter(self, name: str) -> int:
+        row = self.query_one("SELECT value FROM counters WHERE name=?", (name,))
+        return row[0] if row else 0
+
+    def execute(self, sql: str, params=()) -> int:
+        """单条写语句，返回 lastrowid"""
+        with self.write() as conn:
+            return conn.execute(sql, params).lastrowid
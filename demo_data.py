@@ -0,0 +1,341 @@
+"""
+演示数据
+========
+未上传科目余额表，或报表本身不来自财务账（产量、人力、环保等）时使用的演示数据。
+"""
+
+import pandas as pd
+
+
+def gen_demo_df(report_name: str, currency: str) -> pd.DataFrame:
+    """根据报表名称生成演示数据"""
+    unit = "万美元" if currency == "美元" else "万元"
+
+    if "资产负债" in report_name:
+        return pd.DataFrame({
+            "项  目": [
+                "一、流动资产", "  货币资金", "  应收账款", "  预付账款", "  存货", "  其他流动资产",
+                "  流动资产合计", "",
+                "二、非流动资产", "  固定资产", "  累计折旧", "  固定资产净值", "  无形资产",
+                "  非流动资产合计", "",
+                "资  产  总  计", "",
+                "一、流动负债", "  短期借款", "  应付账款", "  预收账款", "  其他流动负债",
+                "  流动负债合计", "",
+                "二、非流动负债", "  长期借款",
+                "  非流动负债合计", "",
+                "负  债  合  计", "",
+                "实收资本", "未分配利润", "所有者权益合计", "",
+                "负债和所有者权益合计",
+            ],
+            f"期末余额（{unit}）": [
+                "", "12450", "8320", "1800", "15680", "510",
+                "38760", "",
+                "", "95430", "(3420)", "92010", "2140",
+                "94150", "",
+                "132910", "",
+                "", "5200", "3840", "680", "2930",
+                "12650", "",
+                "", "45000",
+                "45000", "",
+                "57650", "",
+                "30000", "45260", "75260", "",
+                "132910",
+            ],
+            f"期初余额（{unit}）": [
+                "", "10230", "7890", "1450", "14320", "1290",
+                "35180", "",
+                "", "92100", "(2640)", "89460", "2380",
+                "91840", "",
+                "127020", "",
+                "", "4800", "3560", "540", "2300",
+                "11200", "",
+                "", "42000",
+                "42000", "",
+                "53200", "",
+                "30000", "43820", "73820", "",
+                "127020",
+            ],
+            "增减幅度": [
+                "", "↑21.7%", "↑5.5%", "↑24.1%", "↑9.5%", "↓60.5%",
+                "↑10.2%", "",
+                "", "↑3.6%", "", "↑2.9%", "↓10.1%",
+                "↑2.5%", "",
+                "↑4.6%", "",
+                "", "↑8.3%", "↑7.9%", "↑25.9%", "↑27.4%",
+                "↑12.9%", "",
+                "", "↑7.1%",
+                "↑7.1%", "",
+                "↑8.4%", "",
+                "—", "↑3.3%", "↑2.0%", "",
+                "↑4.6%",
+            ],
+        })
+
+    elif "利润" in report_name:
+        return pd.DataFrame({
+            "项  目": [
+                "一、营业收入",
+                "减：营业成本", "    营业税金及附加", "    销售费用",
+                "    管理费用", "    财务费用", "    资产减值损失",
+                "加：公允价值变动收益", "    投资收益",
+                "二、营业利润",
+                "加：营业外收入", "减：营业外支出",
+                "三、利润总额", "减：所得税费用",
+                "四、净  利  润",
+            ],
+            f"本期金额（{unit}）": [
+                "85420",
+                "62180", "850", "1240",
+                "3680", "1120", "—",
+                "—", "230",
+                "16580",
+                "420", "180",
+                "16820", "2523",
+                "14297",
+            ],
+            f"上年同期（{unit}）": [
+                "78930",
+                "58640", "790", "1180",
+                "3420", "980", "—",
+                "—", "180",
+                "14100",
+                "360", "210",
+                "14250", "2138",
+                "12112",
+            ],
+            "同比增减": [
+                "↑8.2%",
+                "↑6.0%", "↑7.6%", "↑5.1%",
+                "↑7.6%", "↑14.3%", "—",
+                "—", "↑27.8%",
+                "↑17.6%",
+                "↑16.7%", "↓14.3%",
+                "↑18.0%", "↑18.0%",
+                "↑18.0%",
+            ],
+        })
+
+    elif "生产经营" in report_name:
+        return pd.DataFrame({
+            "指  标": [
+                "一、产量", "  铜产量（吨）", "  硫酸联产量（吨）",
+                "二、质量", "  综合回收率（%）", "  铜品位（%）",
+                "三、能耗", "  电耗（度/吨铜）", "  水耗（吨/吨铜）", "  蒸汽耗（吨/吨铜）",
+                "四、投入", "  处理矿石量（吨）",
+            ],
+            "本月完成": ["", "2086", "8240", "", "91.3%", "99.8%", "", "1850", "42.5", "3.2", "", "38400"],
+            "月度计划": ["", "2100", "8200", "", "91.0%", "99.5%", "", "1900", "45.0", "3.5", "", "38000"],
+            "完  成  率": ["", "99.3%", "100.5%", "", "✅达标", "✅达标", "", "✅达标", "✅达标", "✅达标", "", "101.1%"],
+            "上月实际": ["", "2050", "8120", "", "90.8%", "99.6%", "", "1870", "43.0", "3.3", "", "37800"],
+            "环  比": ["", "↑1.8%", "↑1.5%", "", "↑0.5%", "↑0.2%", "", "↓1.1%", "↓1.2%", "↓3.0%", "", "↑1.6%"],
+            "本年累计": ["", "12380", "48960", "", "—", "—", "", "—", "—", "—", "", "229800"],
+            "年度计划": ["", "25200", "98000", "", "—", "—", "", "—", "—", "—", "", "456000"],
+            "进  度": ["", "49.1%", "50.0%", "", "—", "—", "", "—", "—", "—", "", "50.4%"],
+        })
+
+    elif "资金情况" in report_name:
+        return pd.DataFrame({
+            "项  目": [
+                "一、货币资金", "  库存现金", "  银行存款（境内）", "  银行存款（境外）",
+                "  货币资金合计", "",
+                "二、应收款项", "  应收账款", "  预付账款", "  其他应收款",
+                "  应收合计", "",
+                "三、应付款项", "  应付账款", "  预收账款", "  其他应付款",
+                "  应付合计", "",
+                "四、负债情况", "  短期借款", "  长期借款（当年到期）", "  带息负债合计",
+                "资产负债率（%）",
+            ],
+            f"本月末（{unit}）": [
+                "", "70", "8320", "4060",
+                "12450", "",
+                "", "8320", "1800", "980",
+                "11100", "",
+                "", "3840", "680", "1120",
+                "5640", "",
+                "", "5200", "2000", "7200",
+                "43.4%",
+            ],
+            f"上月末（{unit}）": [
+                "", "65", "7950", "3890",
+                "11905", "",
+                "", "8050", "1650", "940",
+                "10640", "",
+                "", "3650", "620", "1080",
+                "5350", "",
+                "", "5000", "2000", "7000",
+                "42.8%",
+            ],
+            "环比变动": [
+                "", "↑7.7%", "↑4.7%", "↑4.4%",
+                "↑4.6%", "",
+                "", "↑3.4%", "↑9.1%", "↑4.3%",
+                "↑4.3%", "",
+                "", "↑5.2%", "↑9.7%", "↑3.7%",
+                "↑5.4%", "",
+                "", "↑4.0%", "—", "↑2.9%",
+                "↑0.6pp",
+            ],
+            f"上年同期（{unit}）": [
+                "", "55", "7420", "3810",
+                "11285", "",
+                "", "7890", "1450", "860",
+                "10200", "",
+                "", "3560", "540", "980",
+                "5080", "",
+                "", "4800", "2000", "6800",
+                "41.9%",
+            ],
+            "同比变动": [
+                "", "↑27.3%", "↑12.1%", "↑6.5%",
+                "↑10.3%", "",
+                "", "↑5.5%", "↑24.1%", "↑14.0%",
+                "↑8.8%", "",
+                "", "↑7.9%", "↑25.9%", "↑14.3%",
+                "↑11.0%", "",
+                "", "↑8.3%", "—", "↑5.9%",
+                "↑1.5pp",
+            ],
+        })
+
+    elif "人力资源" in report_name:
+        return pd.DataFrame({
+            "指  标": [
+                "一、人员总量", "  在岗职工（人）", "  其中：境外员工", "  劳务派遣人员",
+                "  合同制员工", "",
+                "二、本期变动", "  本期新入职（人）", "  本期离职（人）",
+                "  净增减（人）", "",
+                "三、人工成本", f"  工资总额（{unit}）", f"  福利费（{unit}）", f"  人均薪酬（{unit}）",
+            ],
+            "本  月": ["", "486", "42", "38", "406", "", "", "3", "2", "↑1", "", "", "420", "84", "0.87"],
+            "上  月": ["", "485", "41", "38", "406", "", "", "2", "3", "↓1", "", "", "415", "83", "0.86"],
+            "环  比": ["", "↑0.2%", "↑2.4%", "—", "—", "", "", "—", "—", "—", "", "", "↑1.2%", "↑1.2%", "↑1.2%"],
+            "本年累计": ["", "—", "—", "—", "—", "", "", "12", "8", "↑4", "", "", "2480", "496", "—"],
+            "年度计划": ["", "490", "—", "—", "—", "", "", "—", "—", "—", "", "", "—", "—", "—"],
+        })
+
+    elif "环保安全" in report_name:
+        return pd.DataFrame({
+            "指  标": [
+                "一、安全生产", "  本月安全生产天数（天）", "  累计安全生产天数（天）",
+                "  安全培训人次", "  安全检查次数", "  隐患整改完成率（%）", "",
+                "二、环保指标", "  外排废水达标率（%）", "  废气排放达标率（%）",
+                "  固废综合利用率（%）", "  污水处理量（吨）",
+                "  硫酸雾排放浓度（mg/m³）", "",
+                "三、应急管理", "  应急演练（次）", "  消防检查（次）",
+            ],
+            "本  月": ["", "31", "365", "286", "12", "100%", "", "", "100%", "100%", "96.5%", "18600", "0.42", "", "", "2", "4"],
+            "达标要求": ["", "31", "—", "—", "≥8", "≥95%", "", "", "≥95%", "≥95%", "≥90%", "—", "≤5.0", "", "", "≥1", "≥2"],
+            "达标状态": ["", "✅达标", "—", "—", "✅达标", "✅达标", "", "", "✅达标", "✅达标", "✅达标", "—", "✅达标", "", "", "✅达标", "✅达标"],
+            "上  月": ["", "28", "334", "312", "14", "97.8%", "", "", "100%", "100%", "95.8%", "17200", "0.38", "", "", "1", "3"],
+            "本年累计": ["", "55", "—", "—", "26", "—", "", "", "—", "—", "—", "35800", "—", "", "", "3", "7"],
+        })
+
+    elif "快报" in report_name or "指标" in report_name:
+        return pd.DataFrame({
+            "指  标": [
+                "铜产量（吨）", "铜销量（吨）", "综合回收率（%）",
+                "电耗（度/吨铜）", "生产成本（美元/吨）",
+                "销售收入（万美元）", "净利润（万美元）",
+                "员工人数（人）",
+            ],
+            "本月完成": ["2086", "2140", "91.3%", "1850", "4280", "20330", "1430", "486"],
+            "月度计划": ["2100", "2100", "91.0%", "1900", "4350", "20000", "1400", "490"],
+            "完  成  率": ["99.3%", "101.9%", "✅达标", "✅达标", "✅达标", "✅达标", "✅达标", "99.2%"],
+            "上月实际": ["2050", "2095", "90.8%", "1870", "4310", "19820", "1380", "485"],
+            "环  比": ["↑1.8%", "↑2.1%", "↑0.5%", "↓1.1%", "↓0.7%", "↑2.6%", "↑3.6%", "↑0.2%"],
+            "本年累计": ["12380", "12590", "—", "—", "—", "119450", "8640", "—"],
+        })
+
+    elif "产销存" in report_name:
+        return pd.DataFrame({
+            "项  目": [
+                "一、生产", "  铜产量（吨）", "  硫酸联产量（吨）", "  综合回收率（%）", "",
+                "二、销售", "  铜销量（吨）", "  铜销售收入（万美元）", "  铜均价（美元/吨）", "",
+                "三、库存", "  铜库存（吨）", "  原料库存（吨）", "  硫酸库存（吨）",
+            ],
+            "本  月": ["", "2086", "8240", "91.3%", "", "", "2140", "20330", "9500", "", "", "450", "12300", "3200"],
+            "上  月": ["", "2050", "8120", "90.8%", "", "", "2095", "19820", "9460", "", "", "404", "11800", "3050"],
+            "环  比": ["", "↑1.8%", "↑1.5%", "↑0.5%", "", "", "↑2.1%", "↑2.6%", "↑0.4%", "", "", "↑11.4%", "↑4.2%", "↑4.9%"],
+            "本年累计": ["", "12380", "48960", "—", "", "", "12590", "119450", "9488", "", "", "—", "—", "—"],
+            "年度计划": ["", "25200", "98000", "—", "", "", "25200", "245000", "9500", "", "", "—", "—", "—"],
+            "计划进度": ["", "49.1%", "50.0%", "—", "", "", "50.0%", "48.8%", "—", "", "", "—", "—", "—"],
+        })
+
+    elif "同比" in report_name or "环比" in report_name or "分析" in report_name or "底稿" in report_name:
+        return pd.DataFrame({
+            "分  析  项  目": [
+                "营业收入", "营业成本", "毛利润", "毛利率",
+                "管理费用", "财务费用", "净利润", "净利率",
+                "资产总额", "负债合计", "资产负债率",
+            ],
+            f"本期（{unit}）": [
+                "85420", "62180", "23240", "27.2%",
+                "3680", "1120", "14297", "16.7%",
+                "132910", "57650", "43.4%",
+            ],
+            f"对比期（{unit}）": [
+                "78930", "58640", "20290", "25.7%",
+                "3420", "980", "12112", "15.3%",
+                "127020", "53200", "41.9%",
+            ],
+            "变  动  幅  度": [
+                "↑8.2%", "↑6.0%", "↑14.5%", "↑1.5pp",
+                "↑7.6%", "↑14.3%", "↑18.0%", "↑1.4pp",
+                "↑4.6%", "↑8.4%", "↑1.5pp",
+            ],
+            "综合评价": [
+                "✅ 良好", "✅ 正常", "✅ 优秀", "✅ 改善",
+                "✅ 正常", "⚠️ 关注", "✅ 优秀", "✅ 改善",
+                "✅ 正常", "⚠️ 关注", "⚠️ 关注",
+            ],
+        })
+
+    elif "成本" in report_name:
+        return pd.DataFrame({
+            "成本项目": [
+                "一、直接材料", "  矿石原料", "  硫酸", "  电解液", "  其他辅料",
+                "二、直接人工", "  工资", "  福利费",
+                "三、制造费用", "  折旧", "  维修费", "  电力费", "  其他",
+                "四、生产成本合计",
+                "五、单位成本（美元/吨铜）",
+            ],
+            f"本月金额（{unit}）": [
+                "", "5820", "1240", "340", "680",
+                "", "420", "84",
+                "", "2860", "380", "3700", "540",
+                "16064",
+                "4280（美元/吨）",
+            ],
+            "本月占比": [
+                "", "36.2%", "7.7%", "2.1%", "4.2%",
+                "", "2.6%", "0.5%",
+                "", "17.8%", "2.4%", "23.0%", "3.4%",
+                "100%",
+                "—",
+            ],
+            f"上月金额（{unit}）": [
+                "", "5690", "1210", "330", "660",
+                "", "415", "83",
+                "", "2820", "370", "3720", "520",
+                "15818",
+                "4310（美元/吨）",
+            ],
+            "环比变化": [
+                "", "↑2.3%", "↑2.5%", "↑3.0%", "↑3.0%",
+                "", "↑1.2%", "↑1.2%",
+                "", "↑1.4%", "↑2.7%", "↓0.5%", "↑3.8%",
+                "↑1.6%",
+                "↓0.7%",
+            ],
+        })
+
+    else:
+        # 通用 / 科目余额表
+        return pd.DataFrame({
+            "科目编码": ["1001", "1002", "1012", "1122", "1221", "1231", "1401", "1501", "1502", "6001"],
+            "科目名称": ["库存现金", "银行存款", "其他货币资金", "应收票据", "应收账款", "预付账款", "存货", "固定资产", "累计折旧", "主营业务收入"],
+            f"期初余额（{unit}）": ["50", "10180", "2220", "—", "8320", "1450", "14230", "92100", "(2640)", "—"],
+            f"本期借方（{unit}）": ["2400", "58230", "—", "—", "12450", "3200", "8900", "3330", "780", "—"],
+            f"本期贷方（{unit}）": ["2380", "56480", "—", "—", "12050", "2850", "7570", "—", "—", "85420"],
+            f"期末余额（{unit}）": ["70", "11930", "2220", "—", "8720", "1800", "15560", "95430", "(3420)", "85420"],
+        })
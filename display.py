@@ -0,0 +1,320 @@
+"""
+表格展示
+========
+资料库预览用的 DataFrame 格式化（整数不带小数、其余保留两位、空值显示为空、
+Unnamed 表头改为「列N」），以及国企风格财务表格、重要指标快报卡片的 HTML 渲染。
+预览格式化与财务表格渲染都按列向量化处理，不逐单元格 / 逐行调用 Python 函数。
+"""
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+
+
+def format_cell(x):
+    if x is None or (isinstance(x, float) and pd.isna(x)):
+        return ""
+    if isinstance(x, (int, float)):
+        if float(x) == int(x):
+            return f"{int(x)}"
+        return f"{x:.2f}"
+    if isinstance(x, str):
+        s = x.strip()
+        if not s:
+            return ""
+        try:
+            num = float(s)
+            if num == int(num):
+                return f"{int(num)}"
+            return f"{num:.2f}"
+        except (ValueError, OverflowError):
+            pass
+    return str(x)
+
+
+_INT64_LIMIT = 2.0 ** 63
+
+
+def _format_numbers(x: np.ndarray) -> np.ndarray:
+    """float64 数组 → 文本数组，规则同 format_cell；NaN 为空"""
+    out = np.full(x.shape, "", dtype=object)
+    finite = np.isfinite(x)
+    integral = finite & (np.floor(np.where(finite, x, 0.0)) == x)
+    small = integral & (np.abs(np.where(finite, x, 0.0)) < _INT64_LIMIT)
+    # numpy 的数值转字符串比 Python 内置格式化更慢，这里按掩码分组后批量 map
+    if small.any():
+        out[small] = list(map(str, x[small].astype(np.int64).tolist()))
+    big = integral & ~small
+    if big.any():
+        out[big] = list(map("%.0f".__mod__, x[big].tolist()))
+    frac = finite & ~integral
+    if frac.any():
+        out[frac] = list(map("%.2f".__mod__, x[frac].tolist()))
+    inf = np.isinf(x)
+    if inf.any():
+        out[inf] = list(map(str, x[inf].tolist()))
+    return out
+
+
+def _is_text(dtype) -> bool:
+    return dtype == object or isinstance(dtype, pd.StringDtype)
+
+
+def format_column(col: pd.Series) -> pd.Series:
+    """整列格式化：数值列直接按数组格式化；文本列先做数值转换，能转的按数值规则输出"""
+    dtype = col.dtype
+    if pd.api.types.is_bool_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return pd.Series(list(map(str, col.to_numpy().astype(np.int64).tolist())), index=col.index, dtype=object)
+    if pd.api.types.is_integer_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return pd.Series(list(map(str, col.to_numpy().tolist())), index=col.index, dtype=object)
+    if pd.api.types.is_float_dtype(dtype) and not isinstance(dtype, pd.api.extensions.ExtensionDtype):
+        return pd.Series(_format_numbers(col.to_numpy()), index=col.index, dtype=object)
+    if not _is_text(dtype):
+        return col.map(format_cell)
+
+    if pd.api.types.infer_dtype(col, skipna=True) != "string":
+        # 混排列不去重：factorize 会把 True / 1 / Decimal("1") 这类相等但格式化结果不同的值合并
+        formatted = _format_text_values(col.to_numpy(dtype=object))
+        formatted[col.isna().to_numpy()] = ""
+        return pd.Series(formatted, index=col.index, dtype=object)
+
+    # 文本列重复值多（科目名称、编码），只对去重后的取值做格式化，再按编码展开
+    codes, uniques = pd.factorize(col)
+    if len(uniques) == 0:
+        return pd.Series("", index=col.index, dtype=object)
+    formatted = _format_text_values(np.asarray(uniques, dtype=object)).take(codes)
+    formatted[codes < 0] = ""
+    return pd.Series(formatted, index=col.index, dtype=object)
+
+
+_NUM_START = frozenset("+-.0123456789")
+_EXACT_INT = 2 ** 53
+
+
+def _format_text_values(values: np.ndarray) -> np.ndarray:
+    """文本列取值（纯文本列为去重后的取值）：能转为有限数值的按数值规则输出，空白为空，其余原样保留。
+
+    批量转换只覆盖 str、float 与 ±2^53 以内的 int；bool、Decimal、numpy 整数等其他对象，
+    以及 float() 能解析而 pd.to_numeric 不能解析的文本（「1_000」、全角数字「０１２」等）
+    逐个交给 format_cell，输出与逐单元格格式化一致。
+    """
+    out = np.empty(len(values), dtype=object)
+    num = np.full(len(values), np.nan)
+    is_num = np.zeros(len(values), dtype=bool)
+    cand, cand_text = [], []
+    for i, v in enumerate(values):
+        t = type(v)
+        if t is str:
+            s = v.strip()
+            out[i] = v if s else ""
+            # 先按首字符筛出可能的数值，避免对大量纯文本做数值转换
+            if s[:1] in _NUM_START and s.isascii() and "_" not in s:
+                cand.append(i)
+                cand_text.append(s)
+            elif s[:1] in _NUM_START or s[:1].isdecimal():
+                out[i] = format_cell(v)
+        elif t is float or t is np.float64 or (t is int and -_EXACT_INT < v < _EXACT_INT):
+            num[i] = v
+            is_num[i] = True
+        else:
+            out[i] = format_cell(v)
+    if cand:
+        parsed = np.asarray(pd.to_numeric(np.array(cand_text, dtype=object), errors="coerce"), dtype=np.float64)
+        ok = np.isfinite(parsed)
+        idx = np.asarray(cand)[ok]
+        num[idx] = parsed[ok]
+        is_num[idx] = True
+    if is_num.any():
+        out[is_num] = _format_numbers(num[is_num])
+    return out
+
+
+def prepare_for_display(df):
+    new_cols = []
+    for i, c in enumerate(df.columns):
+        s = str(c)
+        new_cols.append(f"列{i+1}" if s.startswith("Unnamed") else s)
+    data = {}
+    for i in range(len(new_cols)):
+        col = df.iloc[:, i]
+        if _is_text(col.dtype):
+            col = col.ffill()
+        data[i] = format_column(col).to_numpy()
+    display_df = pd.DataFrame(data, index=df.index, dtype=object)
+    display_df.columns = new_cols
+    return display_df
+
+
+# ====================================================================
+# 国企风格财务表格渲染
+# ====================================================================
+SECTION_PREFIXES = ("一、", "二、", "三、", "四、", "五、", "六、", "七、", "八、", "九、", "十、")
+TOTAL_KEYWORDS   = ("合计", "总计", "净利润", "负债和所有者")
+
+_COLOR_RULES = (
+    ("↑", "color:#16a34a;font-weight:600"),
+    ("↓", "color:#dc2626;font-weight:600"),
+    ("✅", "color:#16a34a"),
+    ("⚠️", "color:#d97706"),
+)
+
+
+def _as_text(values) -> np.ndarray:
+    return np.array(list(map(str, values)), dtype=object)
+
+
+def classify_rows(first_col) -> tuple:
+    """按首列文本整列判定行类型与缩进层级，返回 (rtype, level) 两个数组。
+
+    rtype 取值 sep / grandtotal / section / subtotal / normal，规则：
+    空行为分隔；无缩进且含合计类关键词为总计；以「一、」等开头为分类标题；
+    有缩进且含「合计」为小计；其余为普通行。层级 = 缩进空格数 // 2。
+    """
+    s = pd.Series(_as_text(first_col), dtype=object)
+    stripped = s.str.strip()
+    indent = (s.str.len() - stripped.str.len()).to_numpy(dtype=np.int64)
+    level = indent // 2
+    sep = (stripped == "").to_numpy()
+    has_total = stripped.str.contains("|".join(TOTAL_KEYWORDS), regex=True).to_numpy(dtype=bool)
+    is_section = stripped.str.startswith(SECTION_PREFIXES).to_numpy(dtype=bool)
+    has_sub = stripped.str.contains("合计", regex=False).to_numpy(dtype=bool)
+
+    rtype = np.full(len(s), "normal", dtype=object)
+    rtype[(indent > 0) & has_sub] = "subtotal"
+    rtype[is_section] = "section"
+    rtype[(indent == 0) & has_total] = "grandtotal"
+    rtype[sep] = "sep"
+    level = np.where(np.isin(rtype, ("grandtotal", "section", "sep")), 0, level)
+    return rtype, level
+
+
+def _value_cells(values) -> np.ndarray:
+    """整列生成右对齐 <td>：↑/↓/✅/⚠️ 开头的值按规则着色"""
+    text = pd.Series(_as_text(values), dtype=object)
+    cells = '<td style="text-align:right">' + text + "</td>"
+    for prefix, style in _COLOR_RULES:
+        mask = text.str.startswith(prefix).to_numpy(dtype=bool)
+        if mask.any():
+            cells[mask] = (
+                f'<td style="text-align:right"><span style="{style}">' + text[mask] + "</span></td>"
+            )
+    return cells.to_numpy()
+
+
+@timed("render")
+def render_finance_table(df: pd.DataFrame, report_name: str = "",
+                         start: int = 0, stop: int = None) -> str:
+    """将 DataFrame 渲染为国企风格 HTML 财务表格。
+
+    行类型、缩进与奇偶底纹按全表一次性计算，start/stop 只截取需要输出的行窗口，
+    因此分页显示时底纹、小计与分类样式与整表渲染完全一致；窗口起点落在某个分类
+    中间时，在窗口顶部补出该分类标题行。
+    """
+    cols = list(df.columns)
+    n = len(df)
+    stop = n if stop is None else min(stop, n)
+    start = max(0, min(start, stop))
+
+    ths = "".join(
+        f'<th style="text-align:{"left" if i == 0 else "right"}">{c}</th>'
+        for i, c in enumerate(cols)
+    )
+    thead = f"<thead><tr>{ths}</tr></thead>"
+    if not cols or n == 0:
+        return f'<div class="ft-wrap"><table class="ft">{thead}<tbody></tbody></table></div>'
+
+    first = df.iloc[:, 0].to_numpy()
+    rtype, level = classify_rows(first)
+    normal = rtype == "normal"
+    odd = (np.cumsum(normal) % 2) == 1          # 普通行全表交替底纹
+
+    # 窗口顶部补出所在分类标题
+    rows = np.arange(start, stop)
+    if start > 0:
+        prev_sections = np.flatnonzero(rtype[:start] == "section")
+        if len(prev_sections):
+            rows = np.concatenate(([prev_sections[-1]], rows))
+
+    w_type = rtype[rows]
+    cls = np.where(
+        w_type == "normal",
+        np.where(odd[rows], "ft-normal ft-odd", "ft-normal ft-even"),
+        "ft-" + w_type,
+    ).astype(object)
+    first_text = pd.Series(_as_text(first[rows]), dtype=object).str.strip()
+    indent_px = pd.Series(level[rows] * 16 + 10).astype(str).to_numpy(dtype=object)
+    html = (
+        '<tr class="' + cls + '"><td style="text-align:left;padding-left:' + indent_px + 'px">'
+        + first_text.to_numpy() + "</td>"
+    )
+    for j in range(1, len(cols)):
+        html = html + _value_cells(df.iloc[rows, j].to_numpy())
+    html = html + "</tr>"
+    html[w_type == "sep"] = f'<tr class="ft-sep"><td colspan="{len(cols)}"></td></tr>'
+
+    tbody = f"<tbody>{''.join(html.tolist())}</tbody>"
+    return f'<div class="ft-wrap"><table class="ft">{thead}{tbody}</table></div>'
+
+
+# ====================================================================
+# 重要指标快报 — 大卡片可视化
+# ====================================================================
+@timed("render")
+def render_quick_report(report_name: str, currency: str) -> str:
+    """将重要指标快报渲染为 4 列大卡片网格，同比/环比突出显示"""
+    u = "美元" if currency == "美元" else "元人民币"
+
+    kpis = [
+        {"name": "铜产量",    "val": "2086",  "unit": "吨",
+         "yoy": "+3.8%", "yoy_up": True,  "mom": "+1.8%", "mom_up": True,
+         "plan": "2100",  "rate": 99.3,  "yoy_base": "2010"},
+        {"name": "铜销量",    "val": "2140",  "unit": "吨",
+         "yoy": "+2.4%", "yoy_up": True,  "mom": "+2.1%", "mom_up": True,
+         "plan": "2100",  "rate": 101.9, "yoy_base": "2090"},
+        {"name": "综合回收率", "val": "91.3",  "unit": "%",
+         "yoy": "+0.8%", "yoy_up": True,  "mom": "+0.5%", "mom_up": True,
+         "plan": "91.0",   "rate": 100.3, "yoy_base": "90.6"},
+        {"name": "生产成本",  "val": "4280",  "unit": f"{u}/吨",
+         "yoy": "−1.2%", "yoy_up": False, "mom": "−0.7%", "mom_up": False,
+         "plan": "4350",  "rate": 101.6, "yoy_base": "4332"},
+        {"name": "销售收入",  "val": "20330", "unit": f"万{u}",
+         "yoy": "+8.2%", "yoy_up": True,  "mom": "+2.6%", "mom_up": True,
+         "plan": "20000", "rate": 101.7, "yoy_base": "18790"},
+        {"name": "净利润",    "val": "1430",  "unit": f"万{u}",
+         "yoy": "+18.0%","yoy_up": True,  "mom": "+3.6%", "mom_up": True,
+         "plan": "1400",  "rate": 102.1, "yoy_base": "1212"},
+        {"name": "电耗",      "val": "1850",  "unit": "度/吨铜",
+         "yoy": "−2.1%", "yoy_up": False, "mom": "−1.1%", "mom_up": False,
+         "plan": "1900",  "rate": 102.6, "yoy_base": "1890"},
+        {"name": "员工人数",  "val": "486",    "unit": "人",
+         "yoy": "+1.5%", "yoy_up": True,  "mom": "+0.2%", "mom_up": True,
+         "plan": "490",    "rate": 99.2,  "yoy_base": "479"},
+    ]
+
+    cards = []
+    for k in kpis:
+        yoy_c = "#16a34a" if k["yoy_up"] else "#dc2626"
+        mom_c = "#16a34a" if k["mom_up"] else "#dc2626"
+        ya    = "▲" if k["yoy_up"] else "▼"
+        ma    = "▲" if k["mom_up"] else "▼"
+        bar_w = min(k["rate"], 100)
+        bar_c = "#22c55e" if k["rate"] >= 100 else "#f59e0b" if k["rate"] >= 95 else "#ef4444"
+
+        cards.append(f"""<div class="kd-card">
+  <div class="kd-name">{k["name"]}</div>
+  <div class="kd-val">{k["val"]}<span class="kd-unit"> {k["unit"]}</span></div>
+  <div class="kd-yoy" style="color:{yoy_c}">{ya} {k["yoy"]} <span class="kd-yoy-label">同比</span></div>
+  <div class="kd-divider"></div>
+  <div class="kd-row2">
+    <span style="color:{mom_c};font-weight:600">{ma} {k["mom"]} 环比</span>
+    <span class="kd-plan-val">计划 {k["plan"]}</span>
+  </div>
+  <div class="kd-prog-wrap"><div class="kd-prog-bar" style="width:{bar_w}%;background:{bar_c}"></div></div>
+  <div class="kd-rate-row">
+    <span style="color:{bar_c};font-weight:600">完成率 {k["rate"]}%</span>
+    <span class="kd-yoy-base">上年同期 {k["yoy_base"]}</span>
+  </div>
+</div>""")
+
+    return f'<div class="kd-grid">{"".join(cards)}</div>'
@@ -0,0 +1,1181 @@
+"""
+报表运算引擎
+============
+以期间科目余额表为数据源（余额按科目余额方向列示，贷方科目余额为正数），按依赖图计算 REPORT_MODULES 中的各张报表。
+
+节点分两类：
+- 中间汇总（lines / accounts / bs / pl ……）：同一期间只计算一次，被所有依赖它的报表复用；
+  lines（映射结果）与 accounts（往期取数科目）另存为期间快照，跨期取数不载入往期科目余额表；
+- 报表节点：依赖中间汇总或其他报表，例如 资产负债表 → 资产负债分析、
+  利润表 → 同比分析底稿 / 毛利率趋势分析。
+图的输入 tb（期间科目余额表）与 mapping（科目映射规则）不是计算节点，由 PeriodContext 直接提供。
+
+依赖写作 "pl@-12" 表示取 12 个月前同一节点的结果（该期间无数据时为 None）。
+报表节点输出数值型 DataFrame（金额单位：元，记账本位币人民币），展示前统一换算为万元并格式化；
+选择美元时按该期间设置的汇率折算为万美元，未设置汇率时仍按人民币列示并注明。
+非财务类报表（产量、人力、环保、预算）及未上传科目余额表的期间使用演示数据。
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import as_completed
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from demo_data import gen_demo_df
+from mapping import MappedLines, load_mappings
+from metrics import timed
+
+AMOUNT_SCALE = 10_000      # 科目余额表金额为元，报表以万元列示
+LEDGER_CURRENCY = "人民币"  # 科目余额表的记账本位币
+CURRENCY_UNITS = {"人民币": "万元", "美元": "万美元"}
+DEFAULT_MAPPING_DIR = Path(__file__).parent / "mappings"
+
+
+class NoLedgerData(Exception):
+    """期间未上传可识别的科目余额表"""
+
+
+@dataclass
+class ReportResult:
+    df: pd.DataFrame
+    source: str            # "ledger" 来自科目余额表；"demo" 演示数据
+    note: str = ""
+
+
+# ====================================================================
+# 期间
+# ====================================================================
+def shift_period(period: str, months: int) -> str:
+    y, m = (int(x) for x in period.split("-"))
+    idx = y * 12 + (m - 1) + months
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+
+# ====================================================================
+# 科目余额表识别与标准化
+# ====================================================================
+TB_COLUMNS = ["entity", "account_code", "account_name", "opening", "debit", "credit", "closing"]
+
+# 字段 → (表头关键词, 排除词)；按顺序匹配第一列
+_TB_HEADER_RULES = {
+    "account_code": (("科目编码", "科目代码", "编码", "代码"), ()),
+    "account_name": (("科目名称", "名称"), ("公司", "单位")),
+    "entity":       (("核算单位", "公司名称", "单位名称", "公司", "主体"), ("编码", "代码")),
+    "opening":      (("期初余额", "年初余额", "期初"), ("方向",)),
+    "debit":        (("本期借方", "借方发生", "借方"), ("期初", "期末", "年初", "累计", "方向")),
+    "credit":       (("本期贷方", "贷方发生", "贷方"), ("期初", "期末", "年初", "累计", "方向")),
+    "closing":      (("期末余额", "期末"), ("方向",)),
+}
+
+
+def _norm_header(h) -> str:
+    return "".join(str(h).split())
+
+
+def _match_columns(headers) -> dict:
+    norm = [_norm_header(h) for h in headers]
+    found = {}
+    for field, (keywords, excludes) in _TB_HEADER_RULES.items():
+        for kw in keywords:
+            hit = next(
+                (i for i, h in enumerate(norm)
+                 if kw in h and i not in found.values() and not any(x in h for x in excludes)),
+                None,
+            )
+            if hit is not None:
+                found[field] = hit
+                break
+    return found
+
+
+def to_amount(col: pd.Series) -> np.ndarray:
+    """金额列转数值：去千分位，(123) 记为负数，「—」/空白记为 0"""
+    if pd.api.types.is_numeric_dtype(col.dtype):
+        return col.fillna(0).to_numpy(dtype=np.float64)
+    s = col.astype(object).where(col.notna(), "").map(str).str.strip().str.replace(",", "", regex=False)
+    neg = s.str.match(r"^[(（].*[)）]$").to_numpy(dtype=bool)
+    s = s.str.replace(r"[()（）]", "", regex=True)
+    num = pd.to_numeric(s, errors="coerce").fillna(0.0).to_numpy(dtype=np.float64)
+    return np.where(neg, -num, num)
+
+
+def _norm_code(v) -> str:
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return ""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)
+    return "".join(ch for ch in str(v) if ch.isdigit())
+
+
+_ENTITY_LABELS = ("编制单位", "核算单位", "单位名称", "公司名称")
+
+
+def _title_entity(cells) -> str:
+    """标题行中的「编制单位：XX公司」"""
+    for c in cells:
+        text = _norm_header(c) if isinstance(c, str) else ""
+        for label in _ENTITY_LABELS:
+            if label in text:
+                rest = text.split(label, 1)[1].lstrip(":：")
+                return rest.split("期间")[0].split("日期")[0].strip()
+    return ""
+
+
+def parse_trial_balance(df: pd.DataFrame, entity: str = ""):
+    """识别 NC 科目余额表并标准化为 TB_COLUMNS；不是科目余额表时返回 None。
+
+    表头可以在第一行，也可以在前 10 行内（NC 导出常带标题行）。
+    核算单位取自「公司 / 核算单位」列，其次是标题行的「编制单位：」，再次为 entity 参数。
+    """
+    found = _match_columns(df.columns)
+    body = df
+    if "account_code" not in found:
+        for i in range(min(10, len(df))):
+            found = _match_columns(df.iloc[i].tolist())
+            if "account_code" in found:
+                body = df.iloc[i + 1:]
+                title_cells = list(df.columns) + df.iloc[:i].to_numpy().ravel().tolist()
+                entity = _title_entity(title_cells) or entity
+                break
+        else:
+            return None
+    if not {"account_code", "closing"} <= found.keys():
+        return None
+
+    out = pd.DataFrame({"account_code": [_norm_code(v) for v in body.iloc[:, found["account_code"]]]})
+    if "entity" in found:
+        names = body.iloc[:, found["entity"]].astype(object).ffill()
+        out["entity"] = names.where(names.notna(), entity).map(str).str.strip().to_numpy()
+    else:
+        out["entity"] = entity
+    out["account_name"] = (
+        body.iloc[:, found["account_name"]].astype(object).where(lambda s: s.notna(), "").map(str).str.strip().to_numpy()
+        if "account_name" in found else ""
+    )
+    for field in ("opening", "debit", "credit", "closing"):
+        out[field] = to_amount(body.iloc[:, found[field]]) if field in found else 0.0
+    out = out[out["account_code"] != ""]
+    if out.empty:
+        return None
+    return out.groupby(["entity", "account_code"], as_index=False, sort=True).agg({
+        "account_name": "first", "opening": "sum", "debit": "sum", "credit": "sum", "closing": "sum",
+    })[TB_COLUMNS]
+
+
+def consolidate(df: pd.DataFrame) -> pd.DataFrame:
+    """多个核算单位的科目余额表按科目编码汇总"""
+    if "entity" not in df.columns:
+        return df
+    return df.groupby("account_code", as_index=False, sort=True).agg({
+        "account_name": "first", "opening": "sum", "debit": "sum", "credit": "sum", "closing": "sum",
+    })
+
+
+class TrialBalance:
+    """标准化科目余额表，支持按科目编码前缀取数。
+
+    NC 导出同时包含一级科目及其明细科目，按前缀取数时只取覆盖该前缀的最上层科目，
+    避免上下级重复相加。
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self.df = df.sort_values("account_code").reset_index(drop=True)
+        self.codes = self.df["account_code"].tolist()
+        self._values = {f: self.df[f].to_numpy() for f in ("opening", "debit", "credit", "closing")}
+
+    def _cover(self, prefix: str) -> list:
+        lo = bisect.bisect_left(self.codes, prefix)
+        hi = bisect.bisect_left(self.codes, prefix + "￿")
+        rows, last = [], None
+        for i in range(lo, hi):
+            if last is not None and self.codes[i].startswith(last):
+                continue
+            rows.append(i)
+            last = self.codes[i]
+        return rows
+
+    def amount(self, prefixes, field: str = "closing") -> float:
+        """prefixes 中以「-」开头的前缀按负数计入（备抵科目）"""
+        total = 0.0
+        vals = self._values[field]
+        for p in prefixes:
+            sign = -1.0 if p.startswith("-") else 1.0
+            rows = self._cover(p.lstrip("-"))
+            if rows:
+                total += sign * float(vals[rows].sum())
+        return total
+
+    def children(self, prefix: str) -> pd.DataFrame:
+        """prefix 的直接下级明细科目；没有明细时返回科目本身"""
+        lo = bisect.bisect_left(self.codes, prefix)
+        hi = bisect.bisect_left(self.codes, prefix + "￿")
+        sub = [i for i in range(lo, hi) if self.codes[i] != prefix]
+        keep, last = [], None
+        for i in sub:
+            if last is not None and self.codes[i].startswith(last):
+                continue
+            keep.append(i)
+            last = self.codes[i]
+        rows = keep or self._cover(prefix)
+        return self.df.iloc[rows]
+
+    def subset(self, prefixes) -> "TrialBalance":
+        """只保留 prefixes 各科目及其全部下级；对这些科目（含下级）取数结果不变"""
+        codes = self.df["account_code"]
+        return TrialBalance(self.df[codes.str.startswith(tuple(prefixes))])
+
+    def rows(self) -> list:
+        """[(科目编码, 科目名称, 期初, 借方, 贷方, 期末)]，用于落库快照"""
+        return list(self.df[TB_COLUMNS[1:]].itertuples(index=False, name=None))
+
+    @classmethod
+    def from_rows(cls, rows) -> "TrialBalance":
+        return cls(pd.DataFrame(rows, columns=TB_COLUMNS[1:]))
+
+
+# ====================================================================
+# 依赖图
+# ====================================================================
+@dataclass
+class Node:
+    name: str
+    deps: tuple
+    fn: object
+    is_report: bool
+    label: str = "项  目"
+
+
+NODES: dict = {}
+
+# 图的输入：不是计算节点，由 PeriodContext 直接提供（tb ← engine.load_tb(期间)，mapping ← 当前映射规则）
+INPUTS = ("tb", "mapping")
+
+# 落库为期间快照的中间汇总：跨期取数只读快照，并行运算时由主进程备好传给子进程
+SNAPSHOT_NODES = ("lines", "accounts")
+
+# 不来自财务账的报表，始终使用演示数据
+DEMO_ONLY = {"生产经营月度快报", "重要指标快报", "产销存快报", "人力资源快报", "环保安全快报", "预算执行分析"}
+
+
+def aggregate(name: str, deps: tuple = ()):
+    def deco(fn):
+        NODES[name] = Node(name, deps, fn, is_report=False)
+        return fn
+    return deco
+
+
+def report(name: str, deps: tuple = ()):
+    def deco(fn):
+        NODES[name] = Node(name, deps, fn, is_report=True)
+        return fn
+    return deco
+
+
+def report_dependencies(name: str, stop=()) -> set:
+    """报表（含跨期）依赖的全部 (节点名, 期间偏移)，偏移相对于报表所在期间；
+    stop 中的节点不再展开其上游"""
+    seen, stack = set(), [(name, 0)]
+    while stack:
+        dep, offset = stack.pop()
+        if "@" in dep:
+            dep, shift = dep.split("@")
+            offset += int(shift)
+        if (dep, offset) in seen or (dep not in NODES and dep not in INPUTS):
+            continue
+        seen.add((dep, offset))
+        if dep in NODES and dep not in stop:
+            stack.extend((d, offset) for d in NODES[dep].deps)
+    return seen
+
+
+class PeriodContext:
+    """单个期间（及数据版本）的节点结果缓存"""
+
+    def __init__(self, engine: "ReportEngine", period: str, mapping):
+        self.engine = engine
+        self.period = period
+        self.mapping = mapping
+        self._memo: dict = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str):
+        if "@" in name:
+            base, offset = name.split("@")
+            other = self.engine.context(shift_period(self.period, int(offset)))
+            try:
+                return other.get(base)
+            except NoLedgerData:
+                return None
+        with self._lock:
+            if name in self._memo:
+                value = self._memo[name]
+                if isinstance(value, NoLedgerData):
+                    raise value
+                return value
+            try:
+                if name == "tb":
+                    value = self.engine.load_tb(self.period)
+                elif name == "mapping":
+                    value = self.mapping
+                elif name in SNAPSHOT_NODES and self.engine.snapshots is not None:
+                    value = self._snapshot(name)
+                else:
+                    node = NODES[name]
+                    value = node.fn(*[self.get(d) for d in node.deps])
+            except NoLedgerData as e:
+                self._memo[name] = e
+                raise
+            self._memo[name] = value
+            return value
+
+    def _snapshot(self, name: str):
+        """映射结果（lines）与往期取用的科目（accounts）优先取期间快照；
+        没有快照（或映射规则 / 科目范围已变）时由科目余额表计算并落库"""
+        snapshots = self.engine.snapshots
+        if name == "lines":
+            version, restore = self.mapping.version, partial(MappedLines.from_rows, self.mapping)
+        else:
+            version, restore = PRIOR_ACCOUNTS_VERSION, TrialBalance.from_rows
+        rows = snapshots.get(self.period, version, name)
+        if rows:
+            return restore(rows)
+        node = NODES[name]
+        value = node.fn(*[self.get(d) for d in node.deps])
+        snapshots.put(self.period, version, value.rows(), name)
+        return value
+
+    def seed(self, name: str, value):
+        """写入其他进程算好的节点结果"""
+        with self._lock:
+            self._memo.setdefault(name, value)
+
+
+class ReportEngine:
+    """报表运算入口：load_tb(period) 返回标准化科目余额表或 None，
+    data_version(period) 返回期间数据版本，mapping() 返回当前科目映射规则；
+    期间数据或映射规则变化时，该期间的缓存结果作废。
+
+    snapshots 为期间快照存储（get(period, version, node) / put(period, version, rows, node)，
+    node 为 lines 或 accounts），跨期报表（同比、环比、趋势，及按科目取上月 / 上年同期数的快报与分析）
+    取往期数据时只读快照，不再载入往期科目余额表。
+
+    fx_rate(period, currency) 返回该期间 1 单位外币折合的人民币元数（未设置时为 None）。"""
+
+    def __init__(self, load_tb, data_version, mapping=None, snapshots=None, max_contexts: int = 48,
+                 fx_rate=None):
+        self._load_tb = load_tb
+        self._data_version = data_version
+        self.mapping = mapping or (lambda: load_mappings(DEFAULT_MAPPING_DIR))
+        self.snapshots = snapshots
+        self.fx_rate = fx_rate or (lambda period, currency: None)
+        self._contexts: OrderedDict = OrderedDict()
+        self._max = max_contexts
+        self._lock = threading.Lock()
+
+    def load_tb(self, period: str) -> TrialBalance:
+        df = self._load_tb(period)
+        if df is None or df.empty:
+            raise NoLedgerData(period)
+        return TrialBalance(consolidate(df))
+
+    def context(self, period: str) -> PeriodContext:
+        mapping = self.mapping()
+        key = (period, self._data_version(period), mapping.version)
+        with self._lock:
+            ctx = self._contexts.get(key)
+            if ctx is None:
+                ctx = self._contexts[key] = PeriodContext(self, period, mapping)
+                while len(self._contexts) > self._max:
+                    self._contexts.popitem(last=False)
+            else:
+                self._contexts.move_to_end(key)
+            return ctx
+
+    def money(self, period: str, currency: str) -> tuple:
+        """金额列示方式 (除数, 单位, 说明)：外币按期间汇率折算；未设置汇率时按人民币万元列示"""
+        if currency == LEDGER_CURRENCY:
+            return AMOUNT_SCALE, CURRENCY_UNITS[LEDGER_CURRENCY], ""
+        rate = self.fx_rate(period, currency)
+        if not rate:
+            return AMOUNT_SCALE, CURRENCY_UNITS[LEDGER_CURRENCY], f"未设置{currency}汇率，金额按人民币列示"
+        return AMOUNT_SCALE * rate, CURRENCY_UNITS.get(currency, f"万{currency}"), ""
+
+    def frame(self, report_name: str, period: str) -> pd.DataFrame:
+        """报表数值结果（元）；无科目余额表时抛出 NoLedgerData"""
+        return self.context(period).get(report_name)
+
+    @timed("compute")
+    def compute(self, report_name: str, period: str, currency: str, numeric: bool = False) -> ReportResult:
+        """numeric=True 时金额保留为数值（万元 / 万美元），供导出 Excel 使用"""
+        node = NODES.get(report_name)
+        if node is None or not node.is_report or report_name in DEMO_ONLY:
+            return ReportResult(gen_demo_df(report_name, currency), "demo", "非财务账数据，显示演示数据")
+        try:
+            frame = self.frame(report_name, period)
+        except NoLedgerData:
+            return ReportResult(gen_demo_df(report_name, currency), "demo", "本期未上传科目余额表，显示演示数据")
+        scale, unit, note = self.money(period, currency)
+        return ReportResult((to_numeric if numeric else to_display)(frame, scale, unit), "ledger", note)
+
+    def compute_many(self, report_names, period: str, currency: str) -> dict:
+        return {name: self.compute(name, period, currency) for name in report_names}
+
+    def compute_parallel(self, report_names, period: str, currency: str,
+                         executor=None, on_done=None) -> dict:
+        """并行运算多张报表，返回 {报表: ReportResult}。
+
+        executor 为进程池（None 时在当前进程内依次计算）。每完成一张调用
+        on_done(name, result, seconds, error)；失败的报表 result 为 None、error 为错误信息。
+        子进程算出的数值结果写回本引擎缓存，之后渲染直接复用。
+        """
+        results = {}
+
+        def done(name, result, seconds, error=None):
+            results[name] = result
+            if on_done:
+                on_done(name, result, seconds, error)
+
+        ledger = []
+        for name in report_names:
+            node = NODES.get(name)
+            if node is None or not node.is_report or name in DEMO_ONLY:
+                t0 = time.perf_counter()
+                result = self.compute(name, period, currency)
+                done(name, result, time.perf_counter() - t0)
+            else:
+                ledger.append(name)
+        if not ledger:
+            return results
+
+        # 子进程拿不到界面层的取数函数，由主进程先备好涉及期间的映射结果与往期科目（多来自快照）
+        # 以及直接用到明细科目的本期科目余额表
+        deps = {(dep, shift_period(period, off)) for name in ledger
+                for dep, off in report_dependencies(name, stop=SNAPSHOT_NODES) if dep in ("tb", *SNAPSHOT_NODES)}
+        seeds = {}
+        for dep, p in sorted(deps):
+            try:
+                value = self.context(p).get(dep)
+                seeds[(dep, p)] = value.df if dep == "tb" else value
+            except NoLedgerData as e:
+                seeds[(dep, p)] = e
+
+        ctx = self.context(period)
+        money = self.money(period, currency)
+        try:
+            ctx.get("lines")
+            has_data = True
+        except NoLedgerData:
+            has_data = False
+        if not has_data or executor is None:
+            groups = [ledger] if not has_data else report_groups(ledger)
+            outcomes = (_compute_group(g, period, seeds, ctx.mapping) for g in groups)
+        else:
+            futures = [executor.submit(_compute_group, g, period, seeds, ctx.mapping)
+                       for g in report_groups(ledger)]
+            outcomes = (f.result() for f in as_completed(futures))
+
+        for outcome in outcomes:
+            for name, frame, seconds, error in outcome:
+                if error:
+                    done(name, None, seconds, error)
+                    continue
+                if frame is None:
+                    result = ReportResult(gen_demo_df(name, currency), "demo", "本期未上传科目余额表，显示演示数据")
+                else:
+                    ctx.seed(name, frame)
+                    result = ReportResult(to_display(frame, *money[:2]), "ledger", money[2])
+                done(name, result, seconds)
+        return results
+
+
+# ====================================================================
+# 并行运算
+# ====================================================================
+def report_groups(report_names) -> list:
+    """按报表间依赖把报表合并为互不相关的分组（如 资产负债表 与 资产负债分析 同组），
+    同组报表在一个进程内计算，上游报表只算一次"""
+    parent = {n: n for n in report_names}
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    for name in report_names:
+        for dep, _ in report_dependencies(name):
+            if dep in parent:
+                parent[find(dep)] = find(name)
+    groups: dict = {}
+    for name in report_names:
+        groups.setdefault(find(name), []).append(name)
+    return list(groups.values())
+
+
+def _compute_group(report_names, period: str, seeds: dict, mapping) -> list:
+    """进程池任务：用主进程传入的 {(节点, 期间): 结果}（科目余额表 / 映射结果）与映射规则
+    计算一组报表，返回 [(报表, 数值结果或 None, 耗时秒, 错误信息或 None)]"""
+    tb_frames = {p: v for (dep, p), v in seeds.items() if dep == "tb" and not isinstance(v, Exception)}
+    engine = ReportEngine(tb_frames.get, lambda p: "", lambda: mapping)
+    for (dep, p), value in seeds.items():
+        if dep in SNAPSHOT_NODES:
+            engine.context(p).seed(dep, value)
+    out = []
+    for name in report_names:
+        t0 = time.perf_counter()
+        try:
+            out.append((name, engine.frame(name, period), time.perf_counter() - t0, None))
+        except NoLedgerData:
+            out.append((name, None, time.perf_counter() - t0, None))
+        except Exception as e:
+            out.append((name, None, time.perf_counter() - t0, f"{type(e).__name__}: {e}"))
+    return out
+
+
+# ====================================================================
+# 展示格式
+# ====================================================================
+def fmt_amount(v, scale: float = AMOUNT_SCALE) -> str:
+    """元 → 万元（scale 为除数，外币时含汇率）：整数不带小数，其余两位小数；负数加括号，零值为「—」"""
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return ""
+    w = v / scale
+    if abs(w) < 0.005:
+        return "—"
+    s = f"{abs(w):.2f}"
+    if s.endswith(".00"):
+        s = s[:-3]
+    return f"({s})" if w < 0 else s
+
+
+def pct_change(cur, base) -> str:
+    if cur is None or base is None or not base or np.isnan(cur) or np.isnan(base):
+        return "—"
+    r = (cur - base) / abs(base) * 100
+    return f"{'↑' if r >= 0 else '↓'}{abs(r):.1f}%"
+
+
+def pp_change(cur, base) -> str:
+    if cur is None or base is None or np.isnan(cur) or np.isnan(base):
+        return "—"
+    d = cur - base
+    return f"{'↑' if d >= 0 else '↓'}{abs(d):.1f}pp"
+
+
+def fmt_ratio(v) -> str:
+    return "—" if v is None or np.isnan(v) else f"{v:.1f}%"
+
+
+def to_display(frame: pd.DataFrame, scale: float, unit: str) -> pd.DataFrame:
+    """数值型报表 → 展示用字符串表；金额除以 scale，列名中的 {unit} 替换为单位（见 ReportEngine.money）"""
+    out = pd.DataFrame(index=range(len(frame)))
+    for col in frame.columns:
+        vals = frame[col].tolist()
+        out[col.format(unit=unit)] = [
+            fmt_amount(v, scale) if isinstance(v, (int, float)) and not isinstance(v, bool) else
+            ("" if v is None else str(v))
+            for v in vals
+        ]
+    return out
+
+
+def to_numeric(frame: pd.DataFrame, scale: float, unit: str) -> pd.DataFrame:
+    """数值型报表 → 导出用：金额除以 scale 但保留数值，文本列与空值原样保留"""
+    out = pd.DataFrame(index=range(len(frame)))
+    for col in frame.columns:
+        out[col.format(unit=unit)] = [
+            v / scale if isinstance(v, (int, float)) and not isinstance(v, bool) else v
+            for v in frame[col].tolist()
+        ]
+    return out
+
+
+def _build(label: str, rows: list, columns: list) -> pd.DataFrame:
+    """rows: [(key, 文本, 各列值...)]；key 作为索引，便于下游报表按行取数"""
+    data = {label: [r[1] for r in rows]}
+    for j, c in enumerate(columns):
+        data[c] = [r[2 + j] for r in rows]
+    return pd.DataFrame(data, index=[r[0] for r in rows])
+
+
+def _val(frame, key, col):
+    if frame is None or key not in frame.index:
+        return np.nan
+    v = frame.at[key, col]
+    return float(v) if isinstance(v, (int, float)) and not isinstance(v, bool) else np.nan
+
+
+BLANK = np.nan
+
+
+# ====================================================================
+# 中间汇总节点
+# ====================================================================
+# 报表行结构（键, 文本）；各键的取数科目见 mappings/account_mapping.csv
+BS_CURRENT_ASSETS = [
+    ("cash", "货币资金"), ("notes_recv", "应收票据"), ("ar", "应收账款"), ("prepay", "预付账款"),
+    ("other_recv", "其他应收款"), ("inventory", "存货"), ("other_current", "其他流动资产"),
+]
+BS_NONCURRENT_ASSETS = [
+    ("lt_invest", "长期股权投资"), ("fa_cost", "固定资产"), ("fa_dep", "累计折旧"), ("cip", "在建工程"),
+    ("intangible", "无形资产"), ("lt_prepaid", "长期待摊费用"), ("dta", "递延所得税资产"),
+]
+BS_CURRENT_LIAB = [
+    ("st_loan", "短期借款"), ("notes_pay", "应付票据"), ("ap", "应付账款"), ("adv_recv", "预收账款"),
+    ("payroll", "应付职工薪酬"), ("tax_pay", "应交税费"), ("other_pay", "其他应付款"),
+]
+BS_NONCURRENT_LIAB = [
+    ("lt_loan", "长期借款"), ("lt_payable", "长期应付款"), ("dtl", "递延所得税负债"),
+]
+BS_EQUITY = [
+    ("paid_in", "实收资本"), ("cap_reserve", "资本公积"), ("surplus", "盈余公积"), ("retained", "未分配利润"),
+]
+
+# 利润表：收入类取贷方、成本费用类取借方，取数方向同样在映射规则中配置
+PL_ITEMS = [
+    ("revenue",    "一、营业收入"),
+    ("cost",       "减：营业成本"),
+    ("tax",        "    营业税金及附加"),
+    ("selling",    "    销售费用"),
+    ("admin",      "    管理费用"),
+    ("finance",    "    财务费用"),
+    ("impair",     "    资产减值损失"),
+    ("fv_gain",    "加：公允价值变动收益"),
+    ("inv_income", "    投资收益"),
+    ("non_op_inc", "加：营业外收入"),
+    ("non_op_exp", "减：营业外支出"),
+    ("income_tax", "减：所得税费用"),
+]
+
+CASH_ACCOUNTS = ["1001", "1002", "1012"]
+
+# 资金情况月报、成本费用快报、成本构成分析、费用明细分析从往期按科目取数的范围（含全部下级）；
+# 往期只需这些科目，存为期间快照（accounts 节点），不必载入往期整张科目余额表。
+# 上述报表新增往期取数科目时须同步加入此处
+PRIOR_ACCOUNTS = ("1001", "1002", "1012", "1122", "1123", "1221", "2001", "2202", "2203", "2241", "2501",
+                  "5001", "6401", "6402", "6403", "6601", "6602", "6603")
+PRIOR_ACCOUNTS_VERSION = "accounts-" + hashlib.sha1(",".join(PRIOR_ACCOUNTS).encode("utf-8")).hexdigest()[:8]
+
+
+@aggregate("lines", deps=("tb", "mapping"))
+def _lines(tb: TrialBalance, mapping):
+    """全部映射规则一次遍历科目余额表得出的项目金额"""
+    return mapping.evaluate(tb.df)
+
+
+@aggregate("accounts", deps=("tb",))
+def _accounts(tb: TrialBalance) -> TrialBalance:
+    """跨期报表从往期按科目取数的范围（PRIOR_ACCOUNTS 及其下级）"""
+    return tb.subset(PRIOR_ACCOUNTS)
+
+
+@aggregate("bs", deps=("lines",))
+def _bs(lines) -> dict:
+    """资产负债表各行 (期末, 期初)"""
+    v = {}
+    for group in (BS_CURRENT_ASSETS, BS_NONCURRENT_ASSETS, BS_CURRENT_LIAB, BS_NONCURRENT_LIAB, BS_EQUITY):
+        for key, _ in group:
+            v[key] = (lines.get(key, "closing"), lines.get(key, "opening"))
+
+    def total(keys):
+        return tuple(sum(v[k][i] for k in keys) for i in (0, 1))
+
+    v["fa_net"] = total(["fa_cost", "fa_dep"])
+    v["current_assets"] = total([k for k, _ in BS_CURRENT_ASSETS])
+    v["noncurrent_assets"] = total(["lt_invest", "fa_net", "cip", "intangible", "lt_prepaid", "dta"])
+    v["total_assets"] = total(["current_assets", "noncurrent_assets"])
+    v["current_liab"] = total([k for k, _ in BS_CURRENT_LIAB])
+    v["noncurrent_liab"] = total([k for k, _ in BS_NONCURRENT_LIAB])
+    v["total_liab"] = total(["current_liab", "noncurrent_liab"])
+    v["equity"] = total([k for k, _ in BS_EQUITY])
+    v["liab_equity"] = total(["total_liab", "equity"])
+    return v
+
+
+@aggregate("pl", deps=("lines",))
+def _pl(lines) -> dict:
+    """利润表各行本期发生额"""
+    v = {key: lines.get(key) for key, _ in PL_ITEMS}
+    v["op_profit"] = (v["revenue"] - v["cost"] - v["tax"] - v["selling"] - v["admin"]
+                      - v["finance"] - v["impair"] + v["fv_gain"] + v["inv_income"])
+    v["total_profit"] = v["op_profit"] + v["non_op_inc"] - v["non_op_exp"]
+    v["net_profit"] = v["total_profit"] - v["income_tax"]
+    v["gross_profit"] = v["revenue"] - v["cost"]
+    return v
+
+
+# ====================================================================
+# 基础报表
+# ====================================================================
+@report("资产负债表", deps=("bs",))
+def _balance_sheet(bs: dict) -> pd.DataFrame:
+    cols = ["期末余额（{unit}）", "期初余额（{unit}）", "增减幅度"]
+
+    def line(key, text):
+        c, o = bs[key]
+        return (key, text, c, o, pct_change(c, o) if key != "fa_dep" else "")
+
+    rows = [("h_ca", "一、流动资产", BLANK, BLANK, "")]
+    rows += [line(k, f"  {t}") for k, t in BS_CURRENT_ASSETS]
+    rows += [line("current_assets", "  流动资产合计"), ("s1", "", BLANK, BLANK, ""),
+             ("h_nca", "二、非流动资产", BLANK, BLANK, "")]
+    for k, t in BS_NONCURRENT_ASSETS:
+        rows.append(line(k, f"  {t}"))
+        if k == "fa_dep":
+            rows.append(line("fa_net", "  固定资产净值"))
+    rows += [line("noncurrent_assets", "  非流动资产合计"), ("s2", "", BLANK, BLANK, ""),
+             line("total_assets", "资  产  总  计"), ("s3", "", BLANK, BLANK, ""),
+             ("h_cl", "一、流动负债", BLANK, BLANK, "")]
+    rows += [line(k, f"  {t}") for k, t in BS_CURRENT_LIAB]
+    rows += [line("current_liab", "  流动负债合计"), ("s4", "", BLANK, BLANK, ""),
+             ("h_ncl", "二、非流动负债", BLANK, BLANK, "")]
+    rows += [line(k, f"  {t}") for k, t in BS_NONCURRENT_LIAB]
+    rows += [line("noncurrent_liab", "  非流动负债合计"), ("s5", "", BLANK, BLANK, ""),
+             line("total_liab", "负  债  合  计"), ("s6", "", BLANK, BLANK, "")]
+    rows += [line(k, t) for k, t in BS_EQUITY]
+    rows += [line("equity", "所有者权益合计"), ("s7", "", BLANK, BLANK, ""),
+             line("liab_equity", "负债和所有者权益合计")]
+    return _build("项  目", rows, cols)
+
+
+@report("利润表", deps=("pl", "pl@-12"))
+def _income_statement(pl: dict, pl_ly) -> pd.DataFrame:
+    cols = ["本期金额（{unit}）", "上年同期（{unit}）", "同比增减"]
+    labels = dict(PL_ITEMS)
+    labels.update({"op_profit": "二、营业利润", "total_profit": "三、利润总额", "net_profit": "四、净  利  润"})
+    order = ["revenue", "cost", "tax", "selling", "admin", "finance", "impair", "fv_gain", "inv_income",
+             "op_profit", "non_op_inc", "non_op_exp", "total_profit", "income_tax", "net_profit"]
+    rows = []
+    for key in order:
+        cur = pl[key]
+        ly = pl_ly[key] if pl_ly else BLANK
+        rows.append((key, labels[key], cur, ly, pct_change(cur, ly)))
+    return _build("项  目", rows, cols)
+
+
+@report("现金流量表", deps=("tb",))
+def _cash_flow(tb: TrialBalance) -> pd.DataFrame:
+    """按货币资金科目发生额简化编制：借方为流入、贷方为流出"""
+    cols = ["本期流入（{unit}）", "本期流出（{unit}）", "净  额（{unit}）"]
+    rows = [("h_flow", "一、货币资金收支", BLANK, BLANK, BLANK)]
+    for prefix in CASH_ACCOUNTS:
+        for _, r in tb.children(prefix).iterrows():
+            rows.append((f"c_{r.account_code}", f"  {r.account_name or r.account_code}",
+                         r.debit, r.credit, r.debit - r.credit))
+    inflow, outflow = tb.amount(CASH_ACCOUNTS, "debit"), tb.amount(CASH_ACCOUNTS, "credit")
+    rows += [
+        ("flow_total", "  收支合计", inflow, outflow, inflow - outflow),
+        ("s1", "", BLANK, BLANK, BLANK),
+        ("h_bal", "二、货币资金余额", BLANK, BLANK, BLANK),
+        ("opening_cash", "  期初货币资金余额", BLANK, BLANK, tb.amount(CASH_ACCOUNTS, "opening")),
+        ("net_increase", "  本期净增加额", BLANK, BLANK, inflow - outflow),
+        ("closing_cash", "  期末货币资金余额", BLANK, BLANK, tb.amount(CASH_ACCOUNTS, "closing")),
+    ]
+    return _build("项  目", rows, cols)
+
+
+@report("所有者权益变动表", deps=("lines",))
+def _equity_changes(lines) -> pd.DataFrame:
+    cols = ["期初余额（{unit}）", "本期增加（{unit}）", "本期减少（{unit}）", "期末余额（{unit}）"]
+    rows = []
+    for key, text in BS_EQUITY:
+        rows.append((key, text, lines.get(key, "opening"), lines.get(key, "credit"),
+                     lines.get(key, "debit"), lines.get(key, "closing")))
+    rows.append(("equity", "所有者权益合计",
+                 *(sum(r[2 + j] for r in rows) for j in range(4))))
+    return _build("项  目", rows, cols)
+
+
+def _detail(tb: TrialBalance, groups: list, grand_total: bool = True) -> pd.DataFrame:
+    """明细表：各一级科目的直接下级科目，期初 / 借方 / 贷方 / 期末"""
+    cols = ["期初余额（{unit}）", "本期借方（{unit}）", "本期贷方（{unit}）", "期末余额（{unit}）"]
+    rows, all_codes = [], []
+    for title, prefix in groups:
+        if len(groups) > 1:
+            rows.append((f"h_{prefix}", title, BLANK, BLANK, BLANK, BLANK))
+        for _, r in tb.children(prefix).iterrows():
+            rows.append((r.account_code, f"  {r.account_code} {r.account_name}".rstrip(),
+                         r.opening, r.debit, r.credit, r.closing))
+        if len(groups) > 1:
+            rows.append((f"t_{prefix}", f"  {title.split('、')[-1]}合计",
+                         *(tb.amount([prefix], f) for f in ("opening", "debit", "credit", "closing"))))
+        all_codes.append(prefix)
+    if grand_total:
+        rows.append(("total", "合  计", *(tb.amount(all_codes, f) for f in ("opening", "debit", "credit", "closing"))))
+    return _build("项  目", rows, cols)
+
+
+@report("应收账款明细表", deps=("tb",))
+def _ar_detail(tb):
+    return _detail(tb, [("应收账款", "1122")])
+
+
+@report("应付账款明细表", deps=("tb",))
+def _ap_detail(tb):
+    return _detail(tb, [("应付账款", "2202")])
+
+
+@report("存货明细表", deps=("tb",))
+def _inventory_detail(tb):
+    groups = [("一、原材料", "1403"), ("二、库存商品", "1405"), ("三、周转材料", "1411"), ("四、生产成本", "5001")]
+    return _detail(tb, [(t, p) for t, p in groups if tb._cover(p)] or [("存货", "1405")])
+
+
+@report("固定资产明细表", deps=("tb",))
+def _fa_detail(tb):
+    return _detail(tb, [("一、固定资产原值", "1601"), ("二、累计折旧", "1602")], grand_total=False)
+
+
+@report("长期投资明细表", deps=("tb",))
+def _lt_invest_detail(tb):
+    return _detail(tb, [("长期股权投资", "1511")])
+
+
+@report("管理费用明细表", deps=("tb",))
+def _admin_detail(tb):
+    return _detail(tb, [("管理费用", "6602")])
+
+
+@report("财务费用明细表", deps=("tb",))
+def _finance_detail(tb):
+    return _detail(tb, [("财务费用", "6603")])
+
+
+@report("铜产销成本表", deps=("tb",))
+def _copper_cost(tb: TrialBalance) -> pd.DataFrame:
+    """生产成本归集 → 产成品收发存 → 主营业务成本"""
+    cols = ["金  额（{unit}）"]
+    rows = [("h_prod", "一、本期生产成本", BLANK)]
+    for _, r in tb.children("5001").iterrows():
+        rows.append((f"p_{r.account_code}", f"  {r.account_name or r.account_code}", r.debit))
+    rows += [
+        ("prod_total", "  生产成本合计", tb.amount(["5001"], "debit")),
+        ("s1", "", BLANK),
+        ("h_fg", "二、产成品（库存商品）", BLANK),
+        ("fg_open", "  期初库存", tb.amount(["1405"], "opening")),
+        ("fg_in", "  本期完工入库", tb.amount(["1405"], "debit")),
+        ("fg_out", "  本期销售结转", tb.amount(["1405"], "credit")),
+        ("fg_close", "  期末库存", tb.amount(["1405"], "closing")),
+        ("s2", "", BLANK),
+        ("cogs", "三、主营业务成本", tb.amount(["6401"], "debit")),
+    ]
+    return _build("项  目", rows, cols)
+
+
+# ====================================================================
+# 月度快报（财务类）
+# ====================================================================
+@report("资金情况月报", deps=("tb", "accounts@-12", "bs", "bs@-12"))
+def _funds(tb: TrialBalance, tb_ly, bs: dict, bs_ly) -> pd.DataFrame:
+    cols = ["本月末（{unit}）", "上月末（{unit}）", "环比变动", "上年同期（{unit}）", "同比变动"]
+    groups = [
+        ("一、货币资金", [("库存现金", ["1001"]), ("银行存款", ["1002"]), ("其他货币资金", ["1012"])], "  货币资金合计"),
+        ("二、应收款项", [("应收账款", ["1122"]), ("预付账款", ["1123"]), ("其他应收款", ["1221"])], "  应收合计"),
+        ("三、应付款项", [("应付账款", ["2202"]), ("预收账款", ["2203"]), ("其他应付款", ["2241"])], "  应付合计"),
+        ("四、负债情况", [("短期借款", ["2001"]), ("长期借款", ["2501"])], "  带息负债合计"),
+    ]
+
+    def line(key, text, codes):
+        cur, prev = tb.amount(codes, "closing"), tb.amount(codes, "opening")
+        ly = tb_ly.amount(codes, "closing") if tb_ly else BLANK
+        return (key, text, cur, prev, pct_change(cur, prev), ly, pct_change(cur, ly))
+
+    rows = []
+    for gi, (title, items, total_text) in enumerate(groups):
+        rows.append((f"h{gi}", title, BLANK, BLANK, "", BLANK, ""))
+        rows += [line(f"{gi}_{codes[0]}", f"  {text}", codes) for text, codes in items]
+        rows.append(line(f"t{gi}", total_text, [c for _, codes in items for c in codes]))
+        if gi < len(groups) - 1:
+            rows.append((f"s{gi}", "", BLANK, BLANK, "", BLANK, ""))
+
+    ta, tl = bs["total_assets"], bs["total_liab"]
+    ratio = tl[0] / ta[0] * 100 if ta[0] else np.nan
+    ratio_prev = tl[1] / ta[1] * 100 if ta[1] else np.nan
+    ratio_ly = np.nan
+    if bs_ly and bs_ly["total_assets"][0]:
+        ratio_ly = bs_ly["total_liab"][0] / bs_ly["total_assets"][0] * 100
+    rows.append(("debt_ratio", "资产负债率（%）", fmt_ratio(ratio), fmt_ratio(ratio_prev),
+                 pp_change(ratio, ratio_prev), fmt_ratio(ratio_ly), pp_change(ratio, ratio_ly)))
+    return _build("项  目", rows, cols)
+
+
+@report("成本费用快报", deps=("tb", "accounts@-1"))
+def _cost_flash(tb: TrialBalance, tb_prev) -> pd.DataFrame:
+    cols = ["本月金额（{unit}）", "本月占比", "上月金额（{unit}）", "环比变化"]
+    groups = [
+        ("一、营业成本", [("主营业务成本", ["6401"]), ("其他业务成本", ["6402"])]),
+        ("二、税金及附加", [("税金及附加", ["6403"])]),
+        ("三、期间费用", [("销售费用", ["6601"]), ("管理费用", ["6602"]), ("财务费用", ["6603"])]),
+    ]
+    all_codes = [c for _, items in groups for _, codes in items for c in codes]
+    grand = tb.amount(all_codes, "debit")
+    rows = []
+    for gi, (title, items) in enumerate(groups):
+        rows.append((f"h{gi}", title, BLANK, "", BLANK, ""))
+        for text, codes in items:
+            cur = tb.amount(codes, "debit")
+            prev = tb_prev.amount(codes, "debit") if tb_prev else BLANK
+            share = fmt_ratio(cur / grand * 100) if grand else "—"
+            rows.append((codes[0], f"  {text}", cur, share, prev, pct_change(cur, prev)))
+    prev_total = tb_prev.amount(all_codes, "debit") if tb_prev else BLANK
+    rows.append(("total", "四、成本费用合计", grand, "100%" if grand else "—", prev_total, pct_change(grand, prev_total)))
+    return _build("成本项目", rows, cols)
+
+
+# ====================================================================
+# 分析底稿
+# ====================================================================
+_ANALYSIS_ITEMS = [
+    ("营业收入", "revenue", "pl"), ("营业成本", "cost", "pl"), ("毛利润", "gross", "pl"),
+    ("毛利率", "gross_margin", "ratio"), ("管理费用", "admin", "pl"), ("财务费用", "finance", "pl"),
+    ("净利润", "net_profit", "pl"), ("净利率", "net_margin", "ratio"),
+    ("资产总额", "total_assets", "bs"), ("负债合计", "total_liab", "bs"), ("资产负债率", "debt_ratio", "ratio"),
+]
+
+# 变动方向对评价的含义：收入/利润增长为好，成本费用/负债增长需关注
+_GOOD_WHEN_UP = {"revenue", "gross", "gross_margin", "net_profit", "net_margin", "total_assets"}
+
+
+def _analysis_values(pl_frame, bs_frame, pl_col: str, bs_col: str) -> dict:
+    v = {}
+    for key in ("revenue", "cost", "admin", "finance", "net_profit"):
+        v[key] = _val(pl_frame, key, pl_col)
+    v["gross"] = v["revenue"] - v["cost"]
+    v["gross_margin"] = v["gross"] / v["revenue"] * 100 if v["revenue"] else np.nan
+    v["net_margin"] = v["net_profit"] / v["revenue"] * 100 if v["revenue"] else np.nan
+    for key in ("total_assets", "total_liab"):
+        v[key] = _val(bs_frame, key, bs_col)
+    v["debt_ratio"] = v["total_liab"] / v["total_assets"] * 100 if v["total_assets"] else np.nan
+    return v
+
+
+def _assess(key: str, cur, base) -> str:
+    if cur is None or base is None or np.isnan(cur) or np.isnan(base):
+        return "—"
+    up = cur >= base
+    return "✅ 良好" if up == (key in _GOOD_WHEN_UP) else "⚠️ 关注"
+
+
+def _comparison(cur: dict, base: dict) -> pd.DataFrame:
+    cols = ["本期（{unit}）", "对比期（{unit}）", "变  动  幅  度", "综合评价"]
+    rows = []
+    for text, key, kind in _ANALYSIS_ITEMS:
+        c, b = cur[key], base[key]
+        if kind == "ratio":
+            rows.append((key, text, fmt_ratio(c), fmt_ratio(b), pp_change(c, b), _assess(key, c, b)))
+        else:
+            rows.append((key, text, c, b, pct_change(c, b), _assess(key, c, b)))
+    return _build("分  析  项  目", rows, cols)
+
+
+@report("同比分析底稿", deps=("利润表", "资产负债表", "资产负债表@-12"))
+def _yoy(pl_frame, bs_frame, bs_ly) -> pd.DataFrame:
+    pl_cur, pl_ly = pl_frame.columns[1], pl_frame.columns[2]
+    cur = _analysis_values(pl_frame, bs_frame, pl_cur, bs_frame.columns[1])
+    base = _analysis_values(pl_frame, bs_ly, pl_ly, bs_frame.columns[1])
+    return _comparison(cur, base)
+
+
+@report("环比分析底稿", deps=("利润表", "利润表@-1", "资产负债表"))
+def _mom(pl_frame, pl_prev, bs_frame) -> pd.DataFrame:
+    pl_cur = pl_frame.columns[1]
+    cur = _analysis_values(pl_frame, bs_frame, pl_cur, bs_frame.columns[1])
+    # 资产负债表期初即上月末
+    base = _analysis_values(pl_prev, bs_frame, pl_cur, bs_frame.columns[2])
+    return _comparison(cur, base)
+
+
+@report("成本构成分析", deps=("tb", "accounts@-1"))
+def _cost_structure(tb: TrialBalance, tb_prev) -> pd.DataFrame:
+    cols = ["本月金额（{unit}）", "本月占比", "上月金额（{unit}）", "环比变化"]
+    total = tb.amount(["5001"], "debit")
+    rows = []
+    for _, r in tb.children("5001").iterrows():
+        prev = tb_prev.amount([r.account_code], "debit") if tb_prev else BLANK
+        share = fmt_ratio(r.debit / total * 100) if total else "—"
+        rows.append((r.account_code, f"  {r.account_name or r.account_code}", r.debit, share, prev,
+                     pct_change(r.debit, prev)))
+    prev_total = tb_prev.amount(["5001"], "debit") if tb_prev else BLANK
+    rows.append(("total", "生产成本合计", total, "100%" if total else "—", prev_total, pct_change(total, prev_total)))
+    return _build("成本项目", rows, cols)
+
+
+@report("费用明细分析", deps=("tb", "accounts@-1"))
+def _expense_analysis(tb: TrialBalance, tb_prev) -> pd.DataFrame:
+    cols = ["本月金额（{unit}）", "占期间费用比", "上月金额（{unit}）", "环比变化"]
+    groups = [("一、销售费用", "6601"), ("二、管理费用", "6602"), ("三、财务费用", "6603")]
+    total = tb.amount([p for _, p in groups], "debit")
+    rows = []
+    for title, prefix in groups:
+        rows.append((f"h_{prefix}", title, BLANK, "", BLANK, ""))
+        for _, r in tb.children(prefix).iterrows():
+            prev = tb_prev.amount([r.account_code], "debit") if tb_prev else BLANK
+            share = fmt_ratio(r.debit / total * 100) if total else "—"
+            rows.append((r.account_code, f"  {r.account_name or r.account_code}", r.debit, share, prev,
+                         pct_change(r.debit, prev)))
+    prev_total = tb_prev.amount([p for _, p in groups], "debit") if tb_prev else BLANK
+    rows.append(("total", "期间费用合计", total, "100%" if total else "—", prev_total, pct_change(total, prev_total)))
+    return _build("费用项目", rows, cols)
+
+
+@report("资产负债分析", deps=("资产负债表",))
+def _bs_analysis(bs_frame: pd.DataFrame) -> pd.DataFrame:
+    c_col, o_col = bs_frame.columns[1], bs_frame.columns[2]
+    cols = ["期末余额（{unit}）", "占总资产比重", "期初余额（{unit}）", "变动额（{unit}）", "变动幅度"]
+    total = _val(bs_frame, "total_assets", c_col)
+    rows = [("h1", "一、资产负债结构", BLANK, "", BLANK, BLANK, "")]
+    for key, text in [("current_assets", "流动资产"), ("noncurrent_assets", "非流动资产"),
+                      ("current_liab", "流动负债"), ("noncurrent_liab", "非流动负债"),
+                      ("equity", "所有者权益")]:
+        c, o = _val(bs_frame, key, c_col), _val(bs_frame, key, o_col)
+        rows.append((key, f"  {text}", c, fmt_ratio(c / total * 100) if total else "—", o, c - o, pct_change(c, o)))
+    rows.append(("s1", "", BLANK, "", BLANK, BLANK, ""))
+    rows.append(("h2", "二、偿债能力指标", BLANK, "", BLANK, BLANK, ""))
+
+    def ratio(num_keys, den_key, col, minus=()):
+        den = _val(bs_frame, den_key, col)
+        num = sum(_val(bs_frame, k, col) for k in num_keys) - sum(_val(bs_frame, k, col) for k in minus)
+        return num / den * 100 if den else np.nan
+
+    for key, text, num, den, minus in [
+        ("debt_ratio", "资产负债率（%）", ["total_liab"], "total_assets", ()),
+        ("current_ratio", "流动比率（%）", ["current_assets"], "current_liab", ()),
+        ("quick_ratio", "速动比率（%）", ["current_assets"], "current_liab", ("inventory",)),
+    ]:
+        c, o = ratio(num, den, c_col, minus), ratio(num, den, o_col, minus)
+        rows.append((key, f"  {text}", fmt_ratio(c), "", fmt_ratio(o), "", pp_change(c, o)))
+    return _build("分  析  项  目", rows, cols)
+
+
+@report("毛利率趋势分析", deps=("利润表",) + tuple(f"利润表@-{i}" for i in range(1, 12)))
+def _gross_margin_trend(*frames) -> pd.DataFrame:
+    """近 12 个月毛利率，缺少科目余额表的月份不列示；frames 依次为本月、上月……"""
+    cols = ["营业收入（{unit}）", "营业成本（{unit}）", "毛利润（{unit}）", "毛利率", "较上月"]
+    points = []
+    for i, f in enumerate(frames):
+        if f is None:
+            continue
+        col = f.columns[1]
+        rev, cost = _val(f, "revenue", col), _val(f, "cost", col)
+        points.append((i, rev, cost))
+    points.sort(key=lambda p: -p[0])     # 由远及近
+    rows, prev_margin = [], np.nan
+    for i, rev, cost in points:
+        margin = (rev - cost) / rev * 100 if rev else np.nan
+        label = "本月" if i == 0 else f"前 {i} 个月"
+        rows.append((f"m{i}", label, rev, cost, rev - cost, fmt_ratio(margin), pp_change(margin, prev_margin)))
+        prev_margin = margin
+    return _build("期  间", rows, cols)
+
+
+@report("现金流量分析", deps=("现金流量表", "利润表"))
+def _cash_analysis(cf: pd.DataFrame, pl_frame: pd.DataFrame) -> pd.DataFrame:
+    cols = ["金  额（{unit}）", "说  明"]
+    inflow = _val(cf, "flow_total", cf.columns[1])
+    outflow = _val(cf, "flow_total", cf.columns[2])
+    net = _val(cf, "net_increase", cf.columns[3])
+    profit = _val(pl_frame, "net_profit", pl_frame.columns[1])
+    revenue = _val(pl_frame, "revenue", pl_frame.columns[1])
+    rows = [
+        ("h1", "一、现金收支", BLANK, ""),
+        ("inflow", "  本期现金流入", inflow, ""),
+        ("outflow", "  本期现金流出", outflow, ""),
+        ("net", "  现金净增加额", net, "↑净流入" if net >= 0 else "↓净流出"),
+        ("s1", "", BLANK, ""),
+        ("h2", "二、现金质量", BLANK, ""),
+        ("cash_to_profit", "  净现比（%）", fmt_ratio(net / profit * 100) if profit else "—", "现金净增加额 / 净利润"),
+        ("cash_to_revenue", "  收现比（%）", fmt_ratio(inflow / revenue * 100) if revenue else "—", "现金流入 / 营业收入"),
+        ("opening", "  期初货币资金", _val(cf, "opening_cash", cf.columns[3]), ""),
+        ("closing", "  期末货币资金", _val(cf, "closing_cash", cf.columns[3]), ""),
+    ]
+    return _build("分  析  项  目", rows, cols)
+
+
+# ====================================================================
+# 取数对话模板变量
+# ====================================================================
+_RATIOS = {
+    "gross_margin": lambda pl, bs: pl["gross_profit"] / pl["revenue"] * 100 if pl["revenue"] else np.nan,
+    "net_margin":   lambda pl, bs: pl["net_profit"] / pl["revenue"] * 100 if pl["revenue"] else np.nan,
+    "debt_ratio":   lambda pl, bs: bs["total_liab"] / bs["total_assets"] * 100 if bs["total_assets"] else np.nan,
+}
+_FACT_FIELDS = ("opening", "debit", "credit", "closing")
+
+
+class LedgerFacts:
+    """规则应答模板的变量取值（按需计算，取过的节点由 PeriodContext 缓存）：
+
+    - 利润表 / 资产负债表项目键（revenue、net_profit、total_assets ……）：本期金额（按 currency 列示，见 unit）；
+      加后缀 _yoy / _mom 为同比 / 环比增幅，资产负债表项目取期末余额；
+    - gross_margin / net_margin / debt_ratio：比率，_yoy / _mom 为百分点变动；
+    - acct_<科目编码>_<opening|debit|credit|closing|name>：科目余额表取数；
+    - unit：金额单位（万元 / 万美元；未设置汇率时为万元）；
+    - extra 中的变量（期间、报表名称等）原样返回，值为函数时取值时才调用。
+    本期无科目余额表时取数变量抛出 NoLedgerData。"""
+
+    def __init__(self, engine: ReportEngine, period: str, extra: dict = None, currency: str = LEDGER_CURRENCY):
+        self.ctx = engine.context(period)
+        self.scale, unit, _ = engine.money(period, currency)
+        self.extra = {"unit": unit, **(extra or {})}
+
+    def _pl(self, offset: int = 0):
+        return self.ctx.get("pl" if not offset else f"pl@-{offset}")
+
+    def _bs(self, offset: int = 0):
+        bs = self.ctx.get("bs" if not offset else f"bs@-{offset}")
+        return None if bs is None else {k: v[0] for k, v in bs.items()}
+
+    def _value(self, key: str, which: str):
+        """which: cur 本期 / yoy 上年同期 / mom 上期"""
+        pl = self._pl()
+        if key in pl:
+            base = {"cur": pl, "yoy": self._pl(12), "mom": self._pl(1)}[which]
+            return np.nan if base is None else base[key]
+        bs = self._bs()
+        if key in bs:
+            if which == "mom":
+                return self.ctx.get("bs")[key][1]   # 期初即上月末
+            base = {"cur": bs, "yoy": self._bs(12)}[which]
+            return np.nan if base is None else base[key]
+        fn = _RATIOS[key]
+        if which == "cur":
+            return fn(pl, bs)
+        pl_b = self._pl(12 if which == "yoy" else 1)
+        bs_b = self._bs(12) if which == "yoy" else {k: v[1] for k, v in self.ctx.get("bs").items()}
+        return np.nan if pl_b is None or bs_b is None else fn(pl_b, bs_b)
+
+    def _account(self, code: str, field: str) -> str:
+        tb: TrialBalance = self.ctx.get("tb")
+        if field == "name":
+            rows = tb._cover(code)
+            return str(tb.df["account_name"].iloc[rows[0]]) if rows else f"科目 {code}"
+        return fmt_amount(tb.amount([code], field), self.scale)
+
+    def __getitem__(self, key: str):
+        if key in self.extra:
+            value = self.extra[key]
+            return value() if callable(value) else value
+        if key.startswith("acct_"):
+            code, _, field = key[5:].partition("_")
+            if field not in _FACT_FIELDS + ("name",):
+                raise KeyError(key)
+            return self._account(code, field)
+        base, _, suffix = key.rpartition("_")
+        if suffix not in ("yoy", "mom"):
+            base, suffix = key, ""
+        known = set(self._pl()) | set(self._bs()) | set(_RATIOS)
+        if base not in known:
+            raise KeyError(key)
+        cur = self._value(base, "cur")
+        if not suffix:
+            return fmt_ratio(cur) if base in _RATIOS else fmt_amount(cur, self.scale)
+        prev = self._value(base, suffix)
+        return pp_change(cur, prev) if base in _RATIOS else pct_change(cur, prev)
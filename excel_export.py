@@ -0,0 +1,169 @@
+"""
+Excel 导出
+==========
+报表导出为 xlsx，版式与页面上的国企风格财务表格（display.render_finance_table）一致：
+深蓝表头、分类标题行、小计 / 总计行、按层级缩进、普通行奇偶底纹、↑↓ 等变动标识着色。
+
+xlsxwriter 以 constant_memory 模式逐行写出，每写完一行即落到临时文件，
+明细表行数再多也不会把整个工作簿留在内存中；因此各行必须按顺序一次写完。
+"""
+
+import re
+import unicodedata
+
+import numpy as np
+import xlsxwriter
+
+from display import classify_rows
+
+AMOUNT_FORMAT = '#,##0.00;(#,##0.00);"—"'
+MAX_COL_WIDTH = 60
+WIDTH_SAMPLE  = 500    # 估算列宽时抽查的行数
+
+HEADER = {"bg_color": "#0c3060", "font_color": "#ddeeff", "bold": True, "border": 1, "border_color": "#34507a"}
+ROW_STYLES = {
+    "section":    {"bg_color": "#d6e9ff", "font_color": "#0c3060", "bold": True,
+                   "top": 1, "bottom": 1, "top_color": "#93c5fd", "bottom_color": "#93c5fd"},
+    "subtotal":   {"bg_color": "#eef5ff", "font_color": "#1e4a8a", "bold": True,
+                   "bottom": 1, "bottom_color": "#c3d9f5"},
+    "grandtotal": {"bg_color": "#1255a8", "font_color": "#ffffff", "bold": True,
+                   "top": 2, "bottom": 2, "top_color": "#0c3060", "bottom_color": "#0c3060"},
+    "odd":        {"bg_color": "#ffffff", "font_color": "#243040", "bottom": 1, "bottom_color": "#e4ecf5"},
+    "even":       {"bg_color": "#f5f8fd", "font_color": "#243040", "bottom": 1, "bottom_color": "#e4ecf5"},
+    "sep":        {"bg_color": "#e4ecf5"},
+}
+MARK_STYLES = (
+    ("↑", {"font_color": "#16a34a", "bold": True}),
+    ("↓", {"font_color": "#dc2626", "bold": True}),
+    ("✅", {"font_color": "#16a34a"}),
+    ("⚠️", {"font_color": "#d97706"}),
+)
+FONT = {"font_name": "Microsoft YaHei", "font_size": 10, "valign": "vcenter"}
+
+# 页面上以文本显示的金额：1234 / 1234.56 / (1234.56)
+_AMOUNT_TEXT = re.compile(r"^\(?-?\d+(?:\.\d+)?\)?$")
+_SHEET_BAD = re.compile(r"[\[\]:*?/\\]")
+
+
+def _text_width(text: str) -> int:
+    return sum(2 if unicodedata.east_asian_width(ch) in "WF" else 1 for ch in text)
+
+
+def _cell_value(v):
+    """单元格取值：数值 → float，页面格式的金额文本 → float，其余为文本；空值返回 None"""
+    if v is None or (isinstance(v, float) and np.isnan(v)):
+        return None
+    if isinstance(v, (int, float, np.integer, np.floating)) and not isinstance(v, bool):
+        return float(v)
+    s = str(v).strip()
+    if _AMOUNT_TEXT.match(s):
+        neg = s.startswith("(")
+        return -float(s.strip("()")) if neg else float(s)
+    return str(v)
+
+
+class _Formats:
+    """按 (行类型, 列类型, 缩进, 着色) 懒创建并复用 xlsxwriter 格式"""
+
+    def __init__(self, workbook):
+        self.wb = workbook
+        self._cache: dict = {}
+
+    def get(self, row_style: str, kind: str, indent: int = 0, mark: str = ""):
+        key = (row_style, kind, indent, mark)
+        fmt = self._cache.get(key)
+        if fmt is None:
+            props = dict(FONT, **ROW_STYLES[row_style])
+            if kind == "label":
+                props.update(align="left", indent=indent)
+            else:
+                props["align"] = "right"
+                if kind == "number":
+                    props["num_format"] = AMOUNT_FORMAT
+            for prefix, style in MARK_STYLES:
+                if mark == prefix:
+                    props.update(style)
+            fmt = self._cache[key] = self.wb.add_format(props)
+        return fmt
+
+
+def sheet_name(name: str, used: set) -> str:
+    """Excel 工作表名：去掉非法字符、截断到 31 字符并去重"""
+    base = _SHEET_BAD.sub("_", name).strip("'") or "Sheet"
+    base = base[:31]
+    out, n = base, 2
+    while out.lower() in used:
+        suffix = f"({n})"
+        out, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(out.lower())
+    return out
+
+
+def write_sheet(workbook, formats: _Formats, name: str, df, title: str = "", subtitle: str = ""):
+    """把一张报表写成一个工作表（constant_memory：按行顺序一次写完）"""
+    ws = workbook.add_worksheet(name)
+    cols = [str(c) for c in df.columns]
+    n_cols = max(1, len(cols))
+
+    # 列宽按表头与前若干行估算，须在写入数据行之前设置
+    sample = df.head(WIDTH_SAMPLE)
+    for j, c in enumerate(cols):
+        texts = [c] + [str(v) for v in sample.iloc[:, j].tolist() if v is not None]
+        width = max(_text_width(t) for t in texts) + 4
+        ws.set_column(j, j, min(max(width, 10), MAX_COL_WIDTH))
+
+    row = 0
+    if title:
+        ws.set_row(row, 26)
+        ws.merge_range(row, 0, row, n_cols - 1, title, workbook.add_format(
+            dict(FONT, bold=True, font_size=14, font_color="#0c3060", align="center")))
+        row += 1
+    if subtitle:
+        ws.merge_range(row, 0, row, n_cols - 1, subtitle, workbook.add_format(
+            dict(FONT, font_color="#5a6b85", align="center")))
+        row += 1
+    header_fmt = workbook.add_format(dict(FONT, **HEADER))
+    for j, c in enumerate(cols):
+        ws.write_string(row, j, c, header_fmt)
+    ws.freeze_panes(row + 1, 1)
+    row += 1
+    if not cols or df.empty:
+        return
+
+    rtype, level = classify_rows(df.iloc[:, 0].to_numpy())
+    odd = (np.cumsum(rtype == "normal") % 2) == 1
+    # 按行取值（itertuples 逐行生成，不额外复制整表）
+    for i, values in enumerate(df.itertuples(index=False, name=None)):
+        kind = rtype[i]
+        if kind == "sep":
+            ws.set_row(row, 5)
+            for j in range(n_cols):
+                ws.write_blank(row, j, None, formats.get("sep", "text"))
+            row += 1
+            continue
+        style = ("odd" if odd[i] else "even") if kind == "normal" else kind
+        label = _cell_value(values[0])
+        ws.write_string(row, 0, "" if label is None else str(label).strip(),
+                        formats.get(style, "label", int(level[i])))
+        for j in range(1, len(values)):
+            v = _cell_value(values[j])
+            if v is None:
+                ws.write_blank(row, j, None, formats.get(style, "text"))
+            elif isinstance(v, float):
+                ws.write_number(row, j, v, formats.get(style, "number"))
+            else:
+                mark = next((p for p, _ in MARK_STYLES if v.startswith(p)), "")
+                ws.write_string(row, j, v, formats.get(style, "text", mark=mark))
+        row += 1
+
+
+def write_reports(target, sheets):
+    """sheets: [(报表名称, DataFrame, 副标题)]；target 为文件路径或可写的二进制文件对象"""
+    workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+    formats = _Formats(workbook)
+    used: set = set()
+    try:
+        for title, df, subtitle in sheets:
+            write_sheet(workbook, formats, sheet_name(title, used), df, title, subtitle)
+    finally:
+        workbook.close()
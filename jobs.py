@@ -0,0 +1,232 @@
+"""
+后台任务队列
+============
+耗时的导出 / 报告生成作为任务写入 generations 表，由进程内的工作线程执行，
+页面只提交任务并轮询状态，生成过程不占用页面脚本：
+
+- 任务按 job_key 去重：同一 key 已在排队或生成中时直接返回该任务，多个会话同时点击只生成一次；
+- 状态、进度、输出文件、耗时、错误都记在 generations 表，页面重跑、换会话、重启应用后仍可查询；
+- 创建队列时，执行进程已退出的「生成中」任务重新排队，重启前未执行的任务照常执行；
+- 工作线程空闲时定期查表，其他进程提交的任务同样会被领取：先只读查询有无排队任务，
+  有才开写事务领取（领取在写事务内完成，不会重复执行）；
+- 任务结束时的状态写入失败会记录日志并重试，仍失败则改记为「失败」。
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+QUEUED  = "排队中"
+RUNNING = "生成中"
+DONE    = "完成"
+FAILED  = "失败"
+ACTIVE  = (QUEUED, RUNNING)
+
+POLL_INTERVAL = 1.0   # 空闲工作线程查表间隔（秒）
+FINISH_RETRIES = 3    # 任务结束状态写入失败时的重试次数（间隔 1s、2s、4s）
+
+log = logging.getLogger(__name__)
+
+
+class JobError(Exception):
+    """任务的预期失败：消息原样展示给用户（其他异常记为「类型: 消息」）"""
+
+
+@dataclass
+class JobStatus:
+    id: int
+    kind: str
+    key: str
+    status: str
+    done: int
+    total: int
+    message: str
+    error: str
+    output_path: str
+    duration: float
+
+    @property
+    def finished(self) -> bool:
+        return self.status not in ACTIVE
+
+    @property
+    def fraction(self) -> float:
+        return min(self.done / self.total, 1.0) if self.total else 0.0
+
+
+_STATUS_SQL = (
+    "SELECT id, kind, job_key, status, progress_done, progress_total, message, error, "
+    "output_path, duration_seconds FROM generations"
+)
+
+
+def _status(row) -> JobStatus:
+    return JobStatus(row[0], row[1] or "", row[2] or "", row[3] or "", row[4] or 0, row[5] or 0,
+                     row[6] or "", row[7] or "", row[8] or "", row[9] or 0.0)
+
+
+def _worker_alive(worker: str) -> bool:
+    """worker = 主机名:进程号；本机进程已退出时返回 False，其他主机的任务视为仍在执行"""
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname():
+        return bool(host)
+    if not pid.isdigit() or int(pid) == os.getpid():
+        return False       # 本进程刚创建队列，表中记录的只能是此前同号的旧进程
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        pass
+    return True
+
+
+class Job:
+    """执行中的任务：供处理函数上报进度"""
+
+    def __init__(self, db, job_id: int, kind: str):
+        self.db = db
+        self.id = job_id
+        self.kind = kind
+
+    def progress(self, done: int, total: int, message: str = ""):
+        self.db.execute(
+            "UPDATE generations SET progress_done=?, progress_total=?, message=? WHERE id=?",
+            (done, total, message, self.id),
+        )
+
+
+class JobQueue:
+    """generations 表驱动的任务队列。handlers：任务类型 → 处理函数 fn(job, **params)，
+    返回输出文件路径（或 None）；抛出 JobError 表示预期失败"""
+
+    def __init__(self, db, handlers: dict, workers: int = 2, poll: float = POLL_INTERVAL):
+        self.db = db
+        self.handlers = handlers
+        self.poll = poll
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._wake = threading.Condition()
+        self.recover()
+        for i in range(workers):
+            threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True).start()
+
+    def recover(self) -> int:
+        """执行进程已退出的「生成中」任务重新排队，返回重排数量"""
+        rows = self.db.query(
+            "SELECT id, worker FROM generations WHERE job_key IS NOT NULL AND status=?", (RUNNING,),
+        )
+        stale = [(QUEUED, r[0]) for r in rows if not _worker_alive(r[1])]
+        if stale:
+            with self.db.write() as conn:
+                conn.executemany(
+                    "UPDATE generations SET status=?, worker=NULL, progress_done=0, message='' "
+                    "WHERE id=?", stale,
+                )
+        return len(stale)
+
+    # ── 提交与查询 ──────────────────────────────────────────────────
+    def submit(self, kind: str, key: str, **params) -> int:
+        """提交任务，返回任务 id；同一 key 已在排队 / 生成中时返回已有任务"""
+        with self.db.write() as conn:
+            row = conn.execute(
+                "SELECT id FROM generations WHERE job_key=? AND status IN (?,?)", (key, *ACTIVE),
+            ).fetchone()
+            if row is not None:
+                return row[0]
+            job_id = conn.execute(
+                "INSERT INTO generations (period,kind,job_key,params,status,created_at) "
+                "VALUES (?,?,?,?,?,?)",
+                (params.get("period", ""), kind, key, json.dumps(params, ensure_ascii=False),
+                 QUEUED, datetime.now().isoformat()),
+            ).lastrowid
+        with self._wake:
+            self._wake.notify()
+        return job_id
+
+    def get(self, job_id: int):
+        row = self.db.query_one(f"{_STATUS_SQL} WHERE id=?", (job_id,))
+        return _status(row) if row else None
+
+    def latest(self, key: str):
+        """该 key 最近一次提交的任务（无则 None）"""
+        row = self.db.query_one(f"{_STATUS_SQL} WHERE job_key=? ORDER BY id DESC LIMIT 1", (key,))
+        return _status(row) if row else None
+
+    # ── 执行 ────────────────────────────────────────────────────────
+    def _claim(self):
+        # 空闲时绝大多数轮询没有任务：先只读查询，避免每次都开写事务占用写锁
+        if self.db.query_one(
+            "SELECT 1 FROM generations WHERE job_key IS NOT NULL AND status=? LIMIT 1", (QUEUED,),
+        ) is None:
+            return None
+        with self.db.write() as conn:
+            row = conn.execute(
+                "SELECT id, kind, params FROM generations "
+                "WHERE job_key IS NOT NULL AND status=? ORDER BY id LIMIT 1", (QUEUED,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE generations SET status=?, worker=?, started_at=? WHERE id=?",
+                (RUNNING, self.worker_id, datetime.now().isoformat(), row[0]),
+            )
+        return row
+
+    def _execute(self, job_id: int, kind: str, params: str):
+        t0 = time.monotonic()
+        output, error = None, ""
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise JobError(f"未知的任务类型：{kind}")
+            output = handler(Job(self.db, job_id, kind), **json.loads(params or "{}"))
+        except JobError as e:
+            error = str(e)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        path = Path(output) if output else None
+        self._finish(job_id, (FAILED if error else DONE, error or None, path.name if path else None,
+                              str(path) if path else None, round(time.monotonic() - t0, 4), job_id))
+
+    def _finish(self, job_id: int, values: tuple):
+        """写入任务结束状态；失败时记录日志并重试，仍失败则只把状态改为「失败」，
+        避免任务一直停在「生成中」、同 key 的任务无法再提交"""
+        for attempt in range(FINISH_RETRIES + 1):
+            try:
+                self.db.execute(
+                    "UPDATE generations SET status=?, error=?, output_filename=?, output_path=?, "
+                    "duration_seconds=? WHERE id=?", values,
+                )
+                return
+            except Exception:
+                log.exception("任务 %s 结束状态写入失败（第 %d 次）", job_id, attempt + 1)
+                if attempt < FINISH_RETRIES:
+                    time.sleep(2 ** attempt)
+        try:
+            self.db.execute(
+                "UPDATE generations SET status=?, error=? WHERE id=?", (FAILED, "任务结果保存失败", job_id),
+            )
+        except Exception:
+            log.exception("任务 %s 无法标记为失败，将在进程重启后重新排队", job_id)
+
+    def _run(self):
+        while True:
+            try:
+                claimed = self._claim()
+            except Exception:
+                log.exception("领取任务失败")
+                claimed = None
+            if claimed is None:
+                with self._wake:
+                    self._wake.wait(self.poll)
+                continue
+            try:
+                self._execute(*claimed)
+            except Exception:
+                log.exception("任务 %s 执行异常", claimed[0])
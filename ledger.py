@@ -0,0 +1,69 @@
+"""
+科目余额入账
+============
+上传文件中的科目余额表识别后写入 platform.db 的 ledger 表：
+
+- 工作簿中优先识别 Sheet 名含「余额」的 Sheet，每个核算单位取第一张；
+- 入账在调用方的写事务内执行，与 uploads 行一起提交；
+- 内容哈希（sha256）相同的文件已保存过时，沿用其 uploads 记录的 Sheet 数、行数，
+  直接复制其入账结果，不再解析。
+"""
+
+import pandas as pd
+
+from engine import TB_COLUMNS, parse_trial_balance
+
+_LEDGER_INSERT = (
+    "INSERT INTO ledger (upload_id,period,entity,account_code,account_name,opening,debit,credit,closing) "
+)
+
+
+def _tb_priority(name: str) -> int:
+    return 0 if "余额" in name else 1
+
+
+def extract_ledger(wb):
+    """从工作簿中识别科目余额表（优先 Sheet 名含「余额」的），每个核算单位取第一张；
+    先用表头几行判断，只有像科目余额表的 Sheet 才整表读取"""
+    frames, seen = [], set()
+    for sheet in sorted(wb.sheet_names, key=_tb_priority):
+        if parse_trial_balance(wb.head(sheet, 12)) is None:
+            continue
+        tb = parse_trial_balance(wb.sheet(sheet))
+        if tb is None:
+            continue
+        tb = tb[~tb["entity"].isin(seen)]
+        seen.update(tb["entity"].unique())
+        frames.append(tb)
+    return pd.concat(frames, ignore_index=True) if frames else None
+
+
+def store_ledger(conn, upload_id: int, period: str, tb) -> int:
+    """extract_ledger 的结果写入 ledger 表（在调用方的写事务内），返回入账行数"""
+    n = 0 if tb is None else len(tb)
+    if n:
+        conn.executemany(
+            _LEDGER_INSERT + "VALUES (?,?,?,?,?,?,?,?,?)",
+            ((upload_id, period, *r) for r in tb[TB_COLUMNS].itertuples(index=False, name=None)),
+        )
+    conn.execute("UPDATE uploads SET ledger_rows=? WHERE id=?", (n, upload_id))
+    return n
+
+
+def copy_ledger(conn, upload_id: int, period: str, source_id: int) -> int:
+    """内容相同的已保存文件：直接复制其入账结果（在调用方的写事务内），返回入账行数"""
+    n = conn.execute(
+        _LEDGER_INSERT + "SELECT ?, ?, entity, account_code, account_name, opening, debit, credit, closing "
+        "FROM ledger WHERE upload_id=?", (upload_id, period, source_id),
+    ).rowcount
+    conn.execute("UPDATE uploads SET ledger_rows=? WHERE id=?", (n, upload_id))
+    return n
+
+
+def find_upload(db, digest: str, period: str):
+    """内容哈希相同的已保存文件（优先本期间），无则 None。
+    返回 (id, period, filename, sheet_count, row_count, ledger_rows, upload_time)"""
+    return db.query_one(
+        "SELECT id, period, filename, sheet_count, row_count, ledger_rows, upload_time FROM uploads "
+        "WHERE sha256=? ORDER BY period=? DESC, id DESC LIMIT 1", (digest, period),
+    )
@@ -0,0 +1,179 @@
+"""
+科目映射规则
+============
+报表项目 ← 科目编码 的取数规则，存放在 mappings/*.csv，格式：
+
+    报表,键,项目,科目,取数
+    资产负债表,ar,应收账款,1122*;-1231*,
+    利润表,revenue,营业收入,6001*;6051*,本期贷方
+
+科目模式：
+- 1122      仅匹配科目 1122；
+- 1122*     匹配 1122 及其全部下级科目；
+- 66xx      x 匹配任意一位数字（6601、6602 ……）；可与 * 组合，如 66xx*；
+- 前缀「-」 按负数计入（备抵科目，如坏账准备、累计折旧）。
+
+同一规则匹配到上下级多行时只取最上层一行，避免重复相加。
+取数为空时保留 期初 / 借方 / 贷方 / 期末 四个值，由报表按需取用。
+
+全部规则编译为一棵按科目编码逐位展开的前缀树，科目余额表只需遍历一遍即可
+得到所有报表项目的金额。
+"""
+
+import numpy as np
+import pandas as pd
+
+from rule_files import csv_records, load_compiled, split_patterns
+
+FIELDS = ("opening", "debit", "credit", "closing")
+
+FIELD_ALIASES = {
+    "": None, "期初": "opening", "期初余额": "opening", "借方": "debit", "本期借方": "debit",
+    "贷方": "credit", "本期贷方": "credit", "期末": "closing", "期末余额": "closing",
+    **{f: f for f in FIELDS},
+}
+
+
+class MappingError(ValueError):
+    """映射规则格式错误"""
+
+
+class _TrieNode:
+    __slots__ = ("children", "exact", "star")
+
+    def __init__(self):
+        self.children: dict = {}   # 数字或 "x" → 子节点
+        self.exact: list = []      # 恰好在此结束的规则：[(目标序号, 符号, 模式序号)]
+        self.star: list = []       # 以 * 结尾、匹配此前缀下全部科目的规则
+
+
+class MappingSet:
+    """编译后的映射规则"""
+
+    def __init__(self, rules: list, version: str = ""):
+        """rules: [(报表, 键, 项目, 科目模式列表, 取数)]"""
+        self.version = version
+        self.targets: list = []
+        self.fields: dict = {}
+        self.labels: dict = {}
+        self.reports: dict = {}
+        self._root = _TrieNode()
+        self._n_rules = 0
+        for report, key, label, patterns, field in rules:
+            if key in self.fields:
+                raise MappingError(f"重复的映射键：{key}")
+            t = len(self.targets)
+            self.targets.append(key)
+            self.fields[key] = field
+            self.labels[key] = label
+            self.reports.setdefault(report, []).append(key)
+            for p in patterns:
+                self._add(p, t)
+
+    def _add(self, pattern: str, target: int):
+        sign = -1.0 if pattern.startswith("-") else 1.0
+        body = pattern.lstrip("-").strip().lower()
+        star = body.endswith("*")
+        body = body.rstrip("*")
+        if not body or any(ch not in "0123456789x" for ch in body):
+            raise MappingError(f"无法识别的科目模式：{pattern}")
+        node = self._root
+        for ch in body:
+            node = node.children.setdefault(ch, _TrieNode())
+        # 每条 (规则, 模式) 单独计覆盖关系，同一规则的不同模式互不影响
+        entry = (target, sign, self._n_rules)
+        self._n_rules += 1
+        (node.star if star else node.exact).append(entry)
+
+    def _match(self, code: str) -> list:
+        """科目编码命中的全部 (目标序号, 符号, 模式序号)"""
+        hits = []
+        frontier = [self._root]
+        for ch in code:
+            nxt = []
+            for node in frontier:
+                hits.extend(node.star)
+                child = node.children.get(ch)
+                if child is not None:
+                    nxt.append(child)
+                child = node.children.get("x")
+                if child is not None:
+                    nxt.append(child)
+            if not nxt:
+                return hits
+            frontier = nxt
+        for node in frontier:
+            hits.extend(node.star)
+            hits.extend(node.exact)
+        return hits
+
+    def evaluate(self, tb_df: pd.DataFrame) -> "MappedLines":
+        """单次遍历科目余额表（按编码排序），返回全部目标的 期初/借方/贷方/期末 合计"""
+        totals = np.zeros((len(self.targets), len(FIELDS)))
+        last_code: dict = {}   # 模式序号 → 上一次命中的科目（上级科目先于下级出现）
+        values = tb_df[list(FIELDS)].to_numpy(dtype=np.float64)
+        for i, code in enumerate(tb_df["account_code"].tolist()):
+            for target, sign, rule in self._match(code):
+                prev = last_code.get(rule)
+                if prev is not None and code.startswith(prev):
+                    continue
+                last_code[rule] = code
+                totals[target] += sign * values[i]
+        return MappedLines(self, totals)
+
+
+class MappedLines:
+    """映射结果：按键取金额"""
+
+    def __init__(self, mapping: MappingSet, totals: np.ndarray):
+        self._index = {k: i for i, k in enumerate(mapping.targets)}
+        self._fields = mapping.fields
+        self._totals = totals
+
+    def __contains__(self, key) -> bool:
+        return key in self._index
+
+    def rows(self) -> list:
+        """[(键, 期初, 借方, 贷方, 期末)]，用于落库快照"""
+        return [(k, *map(float, self._totals[i])) for k, i in self._index.items()]
+
+    @classmethod
+    def from_rows(cls, mapping: MappingSet, rows) -> "MappedLines":
+        """由快照行恢复；快照中没有的键按 0 计"""
+        totals = np.zeros((len(mapping.targets), len(FIELDS)))
+        index = {k: i for i, k in enumerate(mapping.targets)}
+        for key, *vals in rows:
+            if key in index:
+                totals[index[key]] = vals
+        return cls(mapping, totals)
+
+    def get(self, key: str, field: str = None) -> float:
+        """field 为空时取规则上配置的取数，规则也未配置时取期末余额"""
+        i = self._index.get(key)
+        if i is None:
+            return 0.0
+        field = field or self._fields.get(key) or "closing"
+        return float(self._totals[i, FIELDS.index(field)])
+
+
+def parse_rules(lines, source: str = "") -> list:
+    """解析 CSV 文本行为规则列表；# 开头的行为注释"""
+    rules = []
+    for n, rec in csv_records(lines):
+        try:
+            report = (rec.get("报表") or "").strip()
+            key = (rec.get("键") or "").strip()
+            label = (rec.get("项目") or key).strip()
+            patterns = split_patterns(rec.get("科目"))
+            field = FIELD_ALIASES[(rec.get("取数") or "").strip()]
+        except KeyError as e:
+            raise MappingError(f"{source} 第 {n} 行：无法识别的取数 {e}") from None
+        if not key or not patterns:
+            raise MappingError(f"{source} 第 {n} 行：缺少键或科目")
+        rules.append((report, key, label, patterns, field))
+    return rules
+
+
+def load_mappings(mapping_dir) -> MappingSet:
+    """编译目录下全部 *.csv 规则；文件未变化时复用上次的编译结果"""
+    return load_compiled(mapping_dir, parse_rules, MappingSet)
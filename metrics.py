@@ -0,0 +1,147 @@
+"""
+性能埋点
+========
+按「一次页面运行」（整页重跑，或片段单独重跑）汇总各环节耗时，用于定位页面卡顿的来源：
+文件解析、SQLite、报表运算、HTML 渲染、AI 应答……
+
+- span(stage) / @timed(stage)：记录一段耗时。嵌套时外层只计自身耗时（扣除内层环节），
+  因此各环节之和不超过整次运行耗时，差额记为 other（Streamlit 本身与页面逻辑）；
+- begin(scope) / finish()：一次运行的起止；finish 时把汇总交给 configure() 设置的 sink 落库；
+- 记录器按线程保存，只统计页面脚本线程内的调用；后台线程、下载回调中的调用不计入。
+- 未开启时 span / timed 只做一次全局开关判断，开销可以忽略。
+"""
+
+import functools
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+from datetime import datetime
+
+STAGE_TOTAL = "total"
+STAGE_OTHER = "other"
+
+_enabled = False
+_sink = None
+_local = threading.local()
+_NULL = nullcontext()
+
+
+def configure(sink):
+    """sink(record)：一次运行结束时调用；record 为 dict（run_id, started_at, scope, total, stages）"""
+    global _sink
+    _sink = sink
+
+
+def set_enabled(on: bool):
+    global _enabled
+    _enabled = bool(on)
+    if not _enabled:
+        _local.rec = None
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+class _Recorder:
+    __slots__ = ("scope", "started_at", "t0", "stages", "stack", "scoped")
+
+    def __init__(self, scope: str, scoped: bool):
+        self.scope = scope
+        self.started_at = datetime.now().isoformat(timespec="milliseconds")
+        self.t0 = time.perf_counter()
+        self.stages: dict = {}     # 环节 → [调用次数, 自身耗时]
+        self.stack: list = []      # 每层 span 已累计的内层耗时
+        self.scoped = scoped       # 片段单独重跑的记录（其中再调用的片段不另起记录）
+
+
+class _Span:
+    __slots__ = ("rec", "stage", "t0")
+
+    def __init__(self, rec: _Recorder, stage: str):
+        self.rec = rec
+        self.stage = stage
+
+    def __enter__(self):
+        self.rec.stack.append(0.0)
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.t0
+        stack = self.rec.stack
+        inner = stack.pop()
+        agg = self.rec.stages.get(self.stage)
+        if agg is None:
+            agg = self.rec.stages[self.stage] = [0, 0.0]
+        agg[0] += 1
+        agg[1] += elapsed - inner
+        if stack:
+            stack[-1] += elapsed
+        return False
+
+
+def span(stage: str):
+    """记录一段耗时（with 块）；未开启或当前线程没有进行中的运行时为空操作"""
+    if not _enabled:
+        return _NULL
+    rec = getattr(_local, "rec", None)
+    return _NULL if rec is None else _Span(rec, stage)
+
+
+def timed(stage: str):
+    """装饰器：函数每次调用记为 stage 环节的一段耗时"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+
+def begin(scope: str, scoped: bool = False):
+    """开始一次运行。上一次运行若被重跑打断而未 finish，其耗时已不可信，直接丢弃"""
+    _local.rec = _Recorder(scope, scoped) if _enabled else None
+
+
+def finish():
+    """结束当前运行，把各环节汇总交给 sink"""
+    rec = getattr(_local, "rec", None)
+    _local.rec = None
+    if rec is None or _sink is None:
+        return
+    total = time.perf_counter() - rec.t0
+    stages = {k: (v[0], v[1]) for k, v in rec.stages.items()}
+    stages[STAGE_OTHER] = (1, max(0.0, total - sum(v[1] for v in stages.values())))
+    try:
+        _sink({
+            "run_id": uuid.uuid4().hex[:16], "started_at": rec.started_at, "scope": rec.scope,
+            "total": total, "stages": stages,
+        })
+    except Exception:
+        pass
+
+
+def scoped(scope: str, standalone):
+    """装饰片段函数：standalone() 为真（片段单独重跑）时作为一次独立运行记录；
+    随整页运行执行、或已在另一个片段的记录中时，只并入当前记录"""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            rec = getattr(_local, "rec", None)
+            if not _enabled or (rec is not None and rec.scoped) or not standalone():
+                return fn(*args, **kwargs)
+            begin(scope, scoped=True)
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException:
+                _local.rec = None      # 被 st.rerun / 异常打断的运行不记录
+                raise
+            finish()
+            return result
+        return wrapper
+    return deco
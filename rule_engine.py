@@ -0,0 +1,253 @@
+"""
+取数对话规则引擎
+================
+未配置模型或模型调用失败时，AI 取数对话按规则应答。规则存放在 rules/*.csv，格式：
+
+    优先级,名称,匹配,回答
+    50,营业收入,收入;营收;6001*;6051*,"{period}实现营业收入 **{revenue} {unit}**，同比{revenue_yoy}。"
+    0,默认,,"已接收指令：「{query}」……"
+
+匹配模式（以「;」分隔，任一命中即命中该规则）：
+- 关键词    收入、毛利率 ……（全角 / 半角、大小写不敏感）；
+- 科目编码  6001（恰为该科目）、6001*（含下级科目）、66xx（x 匹配任意一位数字），
+            命中时提问中的完整科目编码绑定为模板变量 {code}，{code_closing} 等
+            即 {acct_<该编码>_closing}；
+- 正则      re: 开头，如 re:(?P<code>\\d{4,})余额；命名分组绑定为同名模板变量，不支持反向引用。
+
+匹配为空的规则为默认规则（至多一条），其余规则都未命中时使用。
+同时命中多条规则时取优先级最高者，其次取命中模式最多者，再次取文件中靠前者。
+
+全部关键词与科目编码编译为一个 Aho-Corasick 自动机，全部正则合并为一个正则，
+提问只需各扫描一遍，规则数量增加不影响匹配耗时的量级。
+回答模板中的 {变量} 由调用方提供的映射按需取值（见 engine.LedgerFacts）。
+"""
+
+import re
+import string
+import unicodedata
+from collections import deque
+
+from rule_files import csv_records, load_compiled, split_patterns
+
+MAX_CODE_EXPANSION = 1000   # 单个科目模式中 x 展开后的编码数上限
+
+
+class RuleError(ValueError):
+    """问答规则格式错误"""
+
+
+def normalize_text(text: str) -> str:
+    """全角转半角、英文转小写；不改变字符数，命中位置可直接对应原文"""
+    return "".join(unicodedata.normalize("NFKC", ch)[:1] or ch for ch in text).casefold()
+
+
+class Rule:
+    __slots__ = ("order", "priority", "name", "patterns", "template", "regex")
+
+    def __init__(self, order: int, priority: int, name: str, patterns: list, template: str):
+        self.order = order
+        self.priority = priority
+        self.name = name
+        self.patterns = patterns
+        self.template = template
+        self.regex = None   # 规则自身的正则（保留命名分组，仅对最终选中的规则执行）
+
+
+class _Node:
+    __slots__ = ("goto", "fail", "out")
+
+    def __init__(self):
+        self.goto: dict = {}
+        self.fail = None
+        self.out: list = []   # [(规则序号, 模式序号, 长度, 是否科目模式, 是否含下级)]
+
+
+class RuleSet:
+    """编译后的问答规则"""
+
+    def __init__(self, rules: list, version: str = ""):
+        """rules: [(优先级, 名称, 模式列表, 回答模板)]"""
+        self.version = version
+        self.rules: list = []
+        self.default = None
+        self._root = _Node()
+        self._n_patterns = 0
+        regex_parts = []
+        for priority, name, patterns, template in rules:
+            rule = Rule(len(self.rules), priority, name, patterns, template)
+            self._check_template(rule)
+            self.rules.append(rule)
+            if not patterns:
+                if self.default is not None:
+                    raise RuleError(f"默认规则重复：{self.default.name} / {name}")
+                self.default = rule
+                continue
+            own_regex = []
+            for p in patterns:
+                if p.startswith("re:"):
+                    own_regex.append(p[3:])
+                elif re.fullmatch(r"[0-9x]+\*?", p):
+                    self._add_code(p, rule.order)
+                else:
+                    self._add_literal(normalize_text(p), rule.order, code=False, star=False)
+            if own_regex:
+                body = "|".join(f"(?:{r})" for r in own_regex)
+                try:
+                    rule.regex = re.compile(body)
+                except re.error as e:
+                    raise RuleError(f"规则「{name}」正则无法编译：{e}") from None
+                if re.search(r"\(\?P=|\\[1-9]", body):
+                    raise RuleError(f"规则「{name}」正则不支持反向引用")
+                # 每条规则包成一个可选的零宽前瞻，同一位置上各规则的命中互不遮挡
+                plain = re.sub(r"\(\?P<\w+>", "(?:", body)
+                regex_parts.append(f"(?=(?P<r{rule.order}>{plain}))?")
+        self._regex = re.compile("".join(regex_parts)) if regex_parts else None
+        # [(规则序号, 合并正则中的分组序号)]
+        self._regex_groups = [(int(k[1:]), v) for k, v in self._regex.groupindex.items()] if self._regex else []
+        self._build_fail()
+
+    @staticmethod
+    def _check_template(rule: Rule):
+        try:
+            list(string.Formatter().parse(rule.template))
+        except ValueError as e:
+            raise RuleError(f"规则「{rule.name}」回答模板格式错误：{e}") from None
+
+    # ----------------------------------------------------------------
+    # 编译
+    # ----------------------------------------------------------------
+    def _add_literal(self, text: str, rule: int, code: bool, star: bool, pattern: int = None):
+        node = self._root
+        for ch in text:
+            node = node.goto.setdefault(ch, _Node())
+        if pattern is None:
+            pattern = self._n_patterns
+            self._n_patterns += 1
+        node.out.append((rule, pattern, len(text), code, star))
+
+    def _add_code(self, pattern: str, rule: int):
+        star = pattern.endswith("*")
+        body = pattern.rstrip("*")
+        n_x = body.count("x")
+        if 10 ** n_x > MAX_CODE_EXPANSION:
+            raise RuleError(f"科目模式 {pattern} 通配位过多")
+        codes = [""]
+        for ch in body:
+            codes = [c + d for c in codes for d in ("0123456789" if ch == "x" else ch)]
+        idx = self._n_patterns
+        self._n_patterns += 1
+        for c in codes:
+            self._add_literal(c, rule, code=True, star=star, pattern=idx)
+
+    def _build_fail(self):
+        """广度优先计算失配指针，并把失配链上的输出并入当前节点"""
+        root = self._root
+        queue = deque()
+        for child in root.goto.values():
+            child.fail = root
+            queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for ch, child in node.goto.items():
+                f = node.fail
+                while f is not root and ch not in f.goto:
+                    f = f.fail
+                child.fail = f.goto.get(ch, root)
+                child.out = child.out + child.fail.out
+                queue.append(child)
+
+    # ----------------------------------------------------------------
+    # 匹配
+    # ----------------------------------------------------------------
+    def scan(self, query: str) -> dict:
+        """提问命中的规则：{规则序号: (命中模式集合, 绑定变量)}"""
+        text = normalize_text(query)
+        hits: dict = {}
+        node = root = self._root
+        for i, ch in enumerate(text):
+            while node is not root and ch not in node.goto:
+                node = node.fail
+            node = node.goto.get(ch, root)
+            for rule, pattern, length, code, star in node.out:
+                start = i - length + 1
+                binds = {}
+                if code:
+                    # 科目编码须是完整数字串的开头；不含下级时还须是整个数字串
+                    if start > 0 and text[start - 1].isdigit():
+                        continue
+                    end = i + 1
+                    while end < len(text) and text[end].isdigit():
+                        end += 1
+                    if end > i + 1 and not star:
+                        continue
+                    binds = {"code": text[start:end]}
+                entry = hits.setdefault(rule, (set(), {}))
+                entry[0].add(pattern)
+                for k, v in binds.items():
+                    entry[1].setdefault(k, v)
+        if self._regex is not None:
+            for m in self._regex.finditer(text):
+                if m.lastindex is None:     # 此位置没有任何正则命中
+                    continue
+                for rule, index in self._regex_groups:
+                    if m.group(index) is not None:
+                        hits.setdefault(rule, (set(), {}))[0].add(-1)
+        return hits
+
+    def match(self, query: str):
+        """选出应答规则，返回 (规则, 绑定变量)；没有命中且无默认规则时返回 (None, {})"""
+        hits = self.scan(query)
+        if not hits:
+            return self.default, {}
+        best = max(hits, key=lambda r: (self.rules[r].priority, len(hits[r][0]), -r))
+        rule = self.rules[best]
+        binds = dict(hits[best][1])
+        if rule.regex is not None:
+            m = rule.regex.search(normalize_text(query))
+            if m is not None:
+                binds.update({k: v for k, v in m.groupdict().items() if v is not None})
+        return rule, binds
+
+    def respond(self, query: str, values) -> str:
+        """按命中规则的模板生成回答；values 为模板变量映射，提问绑定的变量优先"""
+        rule, binds = self.match(query)
+        if rule is None:
+            return ""
+        return string.Formatter().vformat(rule.template, (), _Chain(binds, values))
+
+
+class _Chain:
+    """format_map 用的两级映射：先取提问绑定的变量，再按需向 values 取值"""
+
+    def __init__(self, binds: dict, values):
+        self.binds = binds
+        self.values = values
+
+    def __getitem__(self, key):
+        if key in self.binds:
+            return self.binds[key]
+        if key.startswith("code_") and "code" in self.binds:
+            return self.values[f"acct_{self.binds['code']}_{key[5:]}"]
+        return self.values[key]
+
+
+def parse_rules(lines, source: str = "") -> list:
+    """解析 CSV 文本行为规则列表；# 开头的行为注释"""
+    rules = []
+    for n, rec in csv_records(lines):
+        name = (rec.get("名称") or "").strip()
+        template = (rec.get("回答") or "").strip()
+        try:
+            priority = int((rec.get("优先级") or "0").strip())
+        except ValueError:
+            raise RuleError(f"{source} 第 {n} 行：优先级须为整数") from None
+        patterns = split_patterns(rec.get("匹配"))
+        if not name or not template:
+            raise RuleError(f"{source} 第 {n} 行：缺少名称或回答")
+        rules.append((priority, name, patterns, template))
+    return rules
+
+
+def load_rules(rules_dir) -> RuleSet:
+    """编译目录下全部 *.csv 规则；文件未变化时复用上次的编译结果"""
+    return load_compiled(rules_dir, parse_rules, RuleSet)
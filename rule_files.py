@@ -0,0 +1,46 @@
+"""
+CSV 规则文件
+============
+科目映射规则（mapping.py，mappings/*.csv）与取数对话规则（rule_engine.py，rules/*.csv）
+共用的读取方式：
+
+- 逐行读入，空行与 # 开头的注释行跳过，其余按带表头的 CSV 解析；
+- 模式列以「;」（或全角「；」）分隔；
+- 目录下全部 *.csv 按文件名顺序合并后编译，文件名 / 修改时间 / 大小不变时复用上次的编译结果；
+  这三项的摘要即规则版本，供下游缓存失效使用。
+"""
+
+import csv
+import hashlib
+from pathlib import Path
+
+
+def csv_records(lines):
+    """[(行号, 记录 dict)]；行号从 2 起算（第 1 行为表头）"""
+    rows = [ln for ln in lines if ln.strip() and not ln.lstrip().startswith("#")]
+    return enumerate(csv.DictReader(rows), start=2)
+
+
+def split_patterns(text) -> list:
+    return [p.strip() for p in (text or "").replace("；", ";").split(";") if p.strip()]
+
+
+_loaded: dict = {}
+
+
+def load_compiled(rules_dir, parse, build):
+    """编译目录下全部 *.csv 规则：parse(文本行, 文件名) → 规则列表，build(规则列表, version=...) → 编译结果。
+    文件未变化时复用上次的编译结果"""
+    files = sorted(Path(rules_dir).glob("*.csv"))
+    stamp = tuple((f.name, f.stat().st_mtime_ns, f.stat().st_size) for f in files)
+    key = (str(rules_dir), build)
+    cached = _loaded.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    rules = []
+    for f in files:
+        with open(f, encoding="utf-8-sig") as fh:
+            rules.extend(parse(fh.read().splitlines(), f.name))
+    compiled = build(rules, version=hashlib.sha1(repr(stamp).encode("utf-8")).hexdigest()[:12])
+    _loaded[key] = (stamp, compiled)
+    return compiled
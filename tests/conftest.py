@@ -0,0 +1,28 @@
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "tools"))
+
+from stub_model_server import serve  # noqa: E402
+
+
+@pytest.fixture
+def stub_server():
+    """启动本地模型桩服务（临时端口），返回 start(**serve 参数) → base_url；用例结束时关闭"""
+    servers = []
+
+    def start(**kwargs) -> str:
+        server = serve(port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,79 @@
+"""ai_client 对本地桩服务的调用：缓存命中 / 未命中、上游错误、超时与取消"""
+
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from ai_client import AIError, GeminiClient, ResponseCache, cache_key
+from db import Database
+
+PROMPT = "用户指令：本期毛利率是多少"
+ASK = ("本期毛利率是多少", "利润表", "2026-09", "人民币")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(Database(tmp_path / "platform.db"))
+
+
+def test_generate_and_cache_hit(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(), timeout=5, cache=cache)
+    first = client.submit(PROMPT, cache_on=ASK)
+    text = first.result(timeout=5)
+    assert "本期毛利率是多少" in text
+
+    key = cache_key(*ASK, client.model)
+    assert cache.get(key) == text
+
+    # 命中缓存时不发请求，提交即完成；问题按全角 / 空白 / 大小写规范化后匹配
+    again = client.submit(PROMPT, cache_on=("  本期毛利率是多少 ", *ASK[1:]))
+    assert again.done()
+    assert again.result() == text
+    hits = cache.db.query_one("SELECT hits FROM ai_cache WHERE key=?", (key,))[0]
+    assert hits >= 2
+
+
+def test_cache_miss_for_other_period(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(delay=0.2), timeout=5, cache=cache)
+    client.submit(PROMPT, cache_on=ASK).result(timeout=5)
+    other = client.submit(PROMPT, cache_on=(*ASK[:2], "2026-08", ASK[3]))
+    assert not other.done()
+    other.result(timeout=5)
+    assert cache.db.query_one("SELECT COUNT(*) FROM ai_cache")[0] == 2
+
+
+def test_cache_served_without_upstream(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(), timeout=5, cache=cache)
+    text = client.submit(PROMPT, cache_on=ASK).result(timeout=5)
+    offline = GeminiClient("stub", base_url="http://127.0.0.1:9", timeout=1, cache=cache)
+    assert offline.submit(PROMPT, cache_on=ASK).result(timeout=1) == text
+
+
+def test_upstream_error(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(fail=True), timeout=5, cache=cache)
+    with pytest.raises(AIError, match="HTTP 500"):
+        client.submit(PROMPT, cache_on=ASK).result(timeout=5)
+    assert cache.db.query_one("SELECT COUNT(*) FROM ai_cache")[0] == 0
+
+
+def test_timeout(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(delay=2), timeout=0.3, cache=cache)
+    t0 = time.monotonic()
+    with pytest.raises(AIError, match="timed out"):
+        client.submit(PROMPT, cache_on=ASK).result(timeout=5)
+    assert time.monotonic() - t0 < 1.5
+    assert cache.db.query_one("SELECT COUNT(*) FROM ai_cache")[0] == 0
+
+
+def test_cancel(stub_server, cache):
+    client = GeminiClient("stub", base_url=stub_server(delay=2), timeout=5, cache=cache)
+    req = client.submit(PROMPT, cache_on=ASK)
+    time.sleep(0.2)
+    t0 = time.monotonic()
+    req.cancel()
+    with pytest.raises(CancelledError):
+        req.result(timeout=5)
+    assert time.monotonic() - t0 < 1.0
+    assert req.cancelled
+    assert cache.db.query_one("SELECT COUNT(*) FROM ai_cache")[0] == 0
@@ -0,0 +1,49 @@
+"""ai_client 流式接口（SSE）：对桩服务逐段接收与中途取消"""
+
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from ai_client import GeminiClient
+from stub_model_server import ANSWER
+
+PROMPT = "用户指令：本期毛利率是多少"
+FULL = ANSWER.format(query="本期毛利率是多少")
+
+
+def _wait(cond, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.005)
+
+
+def test_stream_arrives_incrementally(stub_server):
+    client = GeminiClient("stub", base_url=stub_server(chunk_delay=0.03), timeout=5)
+    req = client.submit(PROMPT, stream=True)
+    seen = []
+    while not req.done():
+        text = req.partial()
+        if text and (not seen or text != seen[-1]):
+            seen.append(text)
+        time.sleep(0.005)
+    assert req.result() == FULL.strip()
+    # 完成前已观察到多段递增的部分结果，每段都是最终文本的前缀
+    assert len(seen) >= 3
+    assert all(b.startswith(a) and len(b) > len(a) for a, b in zip(seen, seen[1:]))
+    assert all(FULL.startswith(s) for s in seen)
+
+
+def test_stream_cancel_mid_way(stub_server):
+    client = GeminiClient("stub", base_url=stub_server(chunk_delay=0.2), timeout=5)
+    req = client.submit(PROMPT, stream=True)
+    _wait(lambda: req.partial())
+    t0 = time.monotonic()
+    req.cancel()
+    with pytest.raises(CancelledError):
+        req.result(timeout=5)
+    assert time.monotonic() - t0 < 1.0
+    received = req.partial()
+    assert received and FULL.startswith(received)
+    assert len(received) < len(FULL)
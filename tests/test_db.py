@@ -0,0 +1,24 @@
+"""platform.db：迁移后的行数计数器"""
+
+from db import Database
+
+
+def test_generation_counter_skips_engine_runs(tmp_path):
+    db = Database(tmp_path / "platform.db")
+    with db.write() as conn:
+        conn.executemany(
+            "INSERT INTO generations (period,ai_model,output_filename,status,created_at,duration_seconds) "
+            "VALUES (?,?,?,?,?,?)",
+            [("2026-09", "engine", "资产负债表", "完成", "2026-10-01T09:00:00", 0.12),
+             ("2026-09", "engine", "利润表", "失败", "2026-10-01T09:00:00", 0.03),
+             ("2026-09", "gemini-2.5-flash", "月度财务分析报告.docx", "完成", "2026-10-01T09:05:00", 8.4)],
+        )
+    assert db.counter("generations") == 1
+    # 运算耗时记录保留在 generations 中
+    assert db.query("SELECT output_filename, duration_seconds FROM generations WHERE ai_model='engine'") == [
+        ("资产负债表", 0.12), ("利润表", 0.03),
+    ]
+    db.execute("DELETE FROM generations WHERE ai_model='engine'")
+    assert db.counter("generations") == 1
+    db.execute("DELETE FROM generations")
+    assert db.counter("generations") == 0
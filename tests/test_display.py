@@ -0,0 +1,30 @@
+"""资料库预览格式化：按列向量化的 format_column 与逐单元格 format_cell 输出一致"""
+
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from display import format_cell, format_column
+
+TEXT_VALUES = [
+    "1001", " 1200 ", "12.5", "-3.456", "+.5", "1e3", "1.", "007", "(3420)", "—", "本期合计",
+    "1_000", "０１２", "－５", "１.５", "12号仓库", "inf", "+inf", "-nan", "nan", "1e400", "",
+    "   ", "True", "123456789012345678901234",
+]
+OBJECT_VALUES = [
+    True, False, Decimal("1.5"), Decimal("2"), np.int64(7), np.float32(1.5), np.bool_(True),
+    3, 2.0, -0.125, 2 ** 60, 12345.678, pd.Timestamp("2026-09-30"),
+]
+
+
+@pytest.mark.parametrize("values", [TEXT_VALUES, OBJECT_VALUES, TEXT_VALUES + OBJECT_VALUES])
+def test_text_column_matches_format_cell(values):
+    col = pd.Series(values + [None, np.nan] + values[::-1], dtype=object)
+    assert format_column(col).tolist() == [format_cell(v) for v in col]
+
+
+def test_str_dtype_column_matches_format_cell():
+    col = pd.Series(TEXT_VALUES + [None], dtype="str")
+    assert format_column(col).tolist() == [format_cell(v) for v in col.astype(object)]
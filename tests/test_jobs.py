@@ -0,0 +1,71 @@
+"""后台任务队列：任务类型入 kind 列、空闲轮询不开写事务、结束状态写入失败时重试 / 改记失败"""
+
+import sqlite3
+import time
+
+import pytest
+
+import jobs
+from db import Database
+from jobs import DONE, FAILED, JobQueue
+
+
+@pytest.fixture
+def db(tmp_path):
+    return Database(tmp_path / "platform.db")
+
+
+def _wait(queue, job_id, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not (status := queue.get(job_id)).finished:
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+    return status
+
+
+def test_kind_column(db, tmp_path):
+    out = tmp_path / "out.xlsx"
+    queue = JobQueue(db, {"bundle": lambda job, period: out}, workers=1, poll=0.05)
+    job_id = queue.submit("bundle", "bundle:2026-09", period="2026-09")
+    status = _wait(queue, job_id)
+    assert (status.kind, status.status, status.output_path) == ("bundle", DONE, str(out))
+    assert db.query_one("SELECT kind, ai_model FROM generations WHERE id=?", (job_id,)) == ("bundle", None)
+
+
+def test_idle_poll_is_read_only(db, monkeypatch):
+    writes = []
+    real = Database.write
+    monkeypatch.setattr(Database, "write", lambda self: writes.append(1) or real(self))
+    JobQueue(db, {}, workers=1, poll=0.01)
+    time.sleep(0.2)
+    assert not writes
+
+
+def test_finish_retried(db, monkeypatch):
+    monkeypatch.setattr(jobs.time, "sleep", lambda s: None)
+    real = Database.execute
+    failures = iter([True, True])
+
+    def flaky(self, sql, params=()):
+        if sql.startswith("UPDATE generations SET status=?, error=?, output_filename") and next(failures, False):
+            raise sqlite3.OperationalError("database is locked")
+        return real(self, sql, params)
+
+    monkeypatch.setattr(Database, "execute", flaky)
+    queue = JobQueue(db, {"word": lambda job: None}, workers=1, poll=0.05)
+    assert _wait(queue, queue.submit("word", "word:2026-09")).status == DONE
+
+
+def test_finish_marks_failed_when_result_cannot_be_saved(db, monkeypatch):
+    monkeypatch.setattr(jobs.time, "sleep", lambda s: None)
+    real = Database.execute
+
+    def broken(self, sql, params=()):
+        if sql.startswith("UPDATE generations SET status=?, error=?, output_filename"):
+            raise sqlite3.OperationalError("disk I/O error")
+        return real(self, sql, params)
+
+    monkeypatch.setattr(Database, "execute", broken)
+    queue = JobQueue(db, {"word": lambda job: None}, workers=1, poll=0.05)
+    status = _wait(queue, queue.submit("word", "word:2026-09"))
+    assert (status.status, status.error) == (FAILED, "任务结果保存失败")
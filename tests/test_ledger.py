@@ -0,0 +1,134 @@
+"""科目余额入账：表头识别与标准化、按核算单位取表，以及内容相同的文件沿用已保存的入账结果"""
+
+import pandas as pd
+import pytest
+
+from db import Database
+from engine import TB_COLUMNS, parse_trial_balance
+from ledger import copy_ledger, extract_ledger, find_upload, store_ledger
+from workbook import LazyWorkbook
+
+openpyxl = pytest.importorskip("openpyxl")
+
+HEADER = ["科目 编码", "科目名称", "期初余额", "本期借方", "本期贷方", "期末余额", "余额方向"]
+
+
+def _rows(df: pd.DataFrame) -> list:
+    return [tuple(r) for r in df[TB_COLUMNS].itertuples(index=False, name=None)]
+
+
+# ====================================================================
+# 表头识别与标准化
+# ====================================================================
+def test_header_below_title_rows():
+    # NC 导出：标题行、编制单位行之后才是表头；read_excel 把标题行读成列名
+    raw = pd.DataFrame([
+        ["编制单位：甲公司  期间：2026年9月", None, None, None, None, None, None],
+        HEADER,
+        [1001.0, "库存现金", "1,200.50", "300", None, "1,500.50", "借"],
+        ["1002.01", " 工行 ", "(200.00)", "—", "50", "(250)", "贷"],
+        ["1002.01", "工行", 10, 0, 0, 10, "借"],
+        [None, "合计", 1010.5, 300, 50, 1260.5, None],
+    ], columns=["科目余额表", *[f"Unnamed: {i}" for i in range(1, 7)]])
+    tb = parse_trial_balance(raw)
+    assert list(tb.columns) == TB_COLUMNS
+    # 编码只留数字；金额去千分位、括号记负、「—」与空白记 0；同一科目多行相加；合计行（无编码）丢弃
+    assert _rows(tb) == [
+        ("甲公司", "1001", "库存现金", 1200.5, 300.0, 0.0, 1500.5),
+        ("甲公司", "100201", "工行", -190.0, 0.0, 50.0, -240.0),
+    ]
+
+
+def test_header_on_first_row_with_entity_column():
+    raw = pd.DataFrame(
+        [["甲公司", "1001", "库存现金", 1, 2, 3, 0], [None, "1002", "银行存款", 4, 5, 6, 3],
+         ["乙公司", "1001", "库存现金", 7, 8, 9, 6]],
+        columns=["核算单位", "科目代码", "名称", "年初余额", "借方发生", "贷方发生", "期末"],
+    )
+    tb = parse_trial_balance(raw, entity="本部")
+    # 核算单位列向下填充，优先于 entity 参数
+    assert [(e, c) for e, c, *_ in _rows(tb)] == [("乙公司", "1001"), ("甲公司", "1001"), ("甲公司", "1002")]
+    assert _rows(tb)[2][3:] == (4.0, 5.0, 6.0, 3.0)
+
+
+@pytest.mark.parametrize("columns", [
+    ["项目", "本月数", "本年累计"],                    # 报表而非余额表
+    ["科目编码", "科目名称", "本期借方", "本期贷方"],   # 缺期末余额
+])
+def test_not_a_trial_balance(columns):
+    assert parse_trial_balance(pd.DataFrame([["1001"] + [1] * (len(columns) - 1)], columns=columns)) is None
+
+
+@pytest.fixture
+def xlsx(tmp_path):
+    """说明页、甲公司的两张余额表（「余额」Sheet 排在后面）、乙公司一张"""
+    path = tmp_path / "nc.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "说明"
+    ws.append(["本文件由 NC 导出"])
+    for title, entity, closing in (("导出备份", "甲公司", 999.0), ("科目余额表", "甲公司", 100.0),
+                                   ("乙公司", "乙公司", 50.0)):
+        ws = wb.create_sheet(title)
+        ws.append(["科目余额表"])
+        ws.append([f"编制单位：{entity}"])
+        ws.append(HEADER)
+        ws.append(["1001", "库存现金", 0, 0, 0, closing, "借"])
+    wb.save(path)
+    return path
+
+
+def test_extract_ledger_first_sheet_per_entity(xlsx):
+    tb = extract_ledger(LazyWorkbook(xlsx, "xlsx"))
+    # Sheet 名含「余额」的优先：甲公司取「科目余额表」，「导出备份」不再重复入账
+    assert [(e, c, v) for e, c, *_, v in _rows(tb)] == [("甲公司", "1001", 100.0), ("乙公司", "1001", 50.0)]
+
+
+def test_extract_ledger_none_without_trial_balance(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("项目,本月数\n营业收入,100\n", encoding="utf-8")
+    assert extract_ledger(LazyWorkbook(path, "csv")) is None
+
+
+# ====================================================================
+# 入账与内容相同文件的复用
+# ====================================================================
+def _upload(conn, period: str, filename: str, digest: str) -> int:
+    return conn.execute(
+        "INSERT INTO uploads (period,filename,file_type,sheet_count,row_count,upload_time,file_path,sha256) "
+        "VALUES (?,?,?,?,?,?,?,?)", (period, filename, "xlsx", 4, 12, "2026-10-01T09:00:00", "", digest),
+    ).lastrowid
+
+
+def test_store_ledger_and_reuse_duplicate(tmp_path, xlsx):
+    db = Database(tmp_path / "platform.db")
+    tb = extract_ledger(LazyWorkbook(xlsx, "xlsx"))
+    with db.write() as conn:
+        first = _upload(conn, "2026-09", "nc.xlsx", "abc")
+        assert store_ledger(conn, first, "2026-09", tb) == 2
+
+    assert find_upload(db, "def", "2026-09") is None
+    known = find_upload(db, "abc", "2026-10")
+    assert known[:6] == (first, "2026-09", "nc.xlsx", 4, 12, 2)
+
+    # 另一期间上传内容相同的文件：新增 uploads 行，入账结果直接复制
+    with db.write() as conn:
+        second = _upload(conn, "2026-10", "nc (1).xlsx", "abc")
+        assert copy_ledger(conn, second, "2026-10", known[0]) == 2
+    rows = db.query(
+        "SELECT period, entity, account_code, closing FROM ledger WHERE upload_id=? ORDER BY closing DESC", (second,),
+    )
+    assert rows == [("2026-10", "甲公司", "1001", 100.0), ("2026-10", "乙公司", "1001", 50.0)]
+    assert db.query_one("SELECT ledger_rows FROM uploads WHERE id=?", (second,)) == (2,)
+    # 同一哈希优先返回本期间的记录
+    assert find_upload(db, "abc", "2026-10")[0] == second
+    assert find_upload(db, "abc", "2026-09")[0] == first
+
+
+def test_store_ledger_records_unrecognized(tmp_path):
+    db = Database(tmp_path / "platform.db")
+    with db.write() as conn:
+        upload_id = _upload(conn, "2026-09", "notes.xlsx", "abc")
+        assert store_ledger(conn, upload_id, "2026-09", None) == 0
+    # 0 行表示已识别但不是科目余额表（NULL 才会在打开报表时补录）
+    assert db.query_one("SELECT ledger_rows FROM uploads WHERE id=?", (upload_id,)) == (0,)
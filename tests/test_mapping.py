@@ -0,0 +1,183 @@
+"""科目映射规则：前缀树匹配、上下级覆盖、通配与备抵科目，以及与原硬编码取数的一致性"""
+
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from engine import TrialBalance
+from mapping import MappingError, MappingSet, load_mappings, parse_rules
+
+MAPPING_DIR = Path(__file__).resolve().parent.parent / "mappings"
+FIELDS = ["opening", "debit", "credit", "closing"]
+
+
+def _tb(rows) -> pd.DataFrame:
+    """[(科目编码, 期末)] 或 [(科目编码, 期初, 借方, 贷方, 期末)] → 按编码排序的科目余额表"""
+    rows = [(r[0], 0.0, 0.0, 0.0, r[1]) if len(r) == 2 else r for r in rows]
+    return TrialBalance(pd.DataFrame(rows, columns=["account_code", *FIELDS])).df
+
+
+def _mapping(text: str) -> MappingSet:
+    return MappingSet(parse_rules(["报表,键,项目,科目,取数", *text.strip().splitlines()], "test.csv"))
+
+
+def _closing(mapping: MappingSet, tb) -> dict:
+    lines = mapping.evaluate(tb)
+    return {key: lines.get(key, "closing") for key in mapping.targets}
+
+
+# ====================================================================
+# 匹配规则
+# ====================================================================
+def test_exact_vs_star():
+    mapping = _mapping("""
+        资产负债表,exact,应收账款,1122,
+        资产负债表,star,应收账款,1122*,
+    """)
+    tb = _tb([("1122", 100.0), ("112201", 60.0), ("112202", 40.0), ("11220", 7.0), ("1123", 9.0)])
+    # 1122 只匹配科目本身；1122* 匹配其全部下级，但只取最上层一行，上下级不重复相加
+    assert _closing(mapping, tb) == {"exact": 100.0, "star": 100.0}
+
+
+def test_star_sums_top_level_subaccounts_when_parent_missing():
+    mapping = _mapping("资产负债表,ar,应收账款,1122*,")
+    tb = _tb([("112201", 60.0), ("11220101", 25.0), ("11220102", 35.0), ("112202", 40.0)])
+    assert _closing(mapping, tb) == {"ar": 100.0}
+
+
+def test_most_specific_prefix_per_rule():
+    # 不同规则各自计算覆盖关系：上级科目被一条规则取走，不影响另一条规则取其下级
+    mapping = _mapping("""
+        资产负债表,cash,货币资金,1002*,
+        资产负债表,icbc,工行存款,100201*,
+    """)
+    tb = _tb([("1002", 500.0), ("100201", 300.0), ("10020101", 120.0), ("100202", 200.0)])
+    assert _closing(mapping, tb) == {"cash": 500.0, "icbc": 300.0}
+
+
+def test_patterns_within_rule_cover_independently():
+    # 与 TrialBalance.amount([...]) 一致：同一规则的各个模式分别取数后相加
+    mapping = _mapping("资产负债表,k,项目,1001*;100101,")
+    tb = _tb([("1001", 50.0), ("100101", 20.0)])
+    assert _closing(mapping, tb) == {"k": 70.0}
+    assert TrialBalance(tb).amount(["1001", "100101"]) == 70.0
+
+
+def test_x_wildcard():
+    mapping = _mapping("""
+        利润表,fees,期间费用,66xx,本期借方
+        利润表,fees_all,期间费用（含明细）,66xx*,本期借方
+    """)
+    tb = _tb([("6601", 0, 10.0, 0, 0), ("660101", 0, 4.0, 0, 0), ("6602", 0, 20.0, 0, 0),
+              ("660301", 0, 5.0, 0, 0), ("6701", 0, 99.0, 0, 0), ("66010", 0, 1.0, 0, 0)])
+    lines = mapping.evaluate(tb)
+    assert lines.get("fees") == 30.0            # 恰为四位：6601、6602
+    assert lines.get("fees_all") == 35.0        # 含下级：6601、6602、660301（无 6603 上级时取明细）
+
+
+def test_contra_accounts_and_fields():
+    mapping = _mapping("""
+        资产负债表,ar,应收账款,1122*;-1231*,
+        利润表,revenue,营业收入,6001*,本期贷方
+    """)
+    tb = _tb([("1122", 10.0, 0.0, 0.0, 1000.0), ("1231", 1.0, 0.0, 0.0, 80.0),
+              ("6001", 0.0, 5.0, 700.0, 0.0)])
+    lines = mapping.evaluate(tb)
+    assert lines.get("ar") == 920.0
+    assert lines.get("ar", "opening") == 9.0
+    assert lines.get("revenue") == 700.0        # 规则配置的取数
+    assert lines.get("revenue", "debit") == 5.0
+    assert lines.get("missing") == 0.0
+
+
+def test_snapshot_round_trip():
+    mapping = _mapping("资产负债表,cash,货币资金,1001*;1002*,")
+    lines = mapping.evaluate(_tb([("1001", 1.0, 2.0, 3.0, 4.0), ("1002", 10.0, 20.0, 30.0, 40.0)]))
+    restored = type(lines).from_rows(mapping, lines.rows())
+    assert [restored.get("cash", f) for f in FIELDS] == [11.0, 22.0, 33.0, 44.0]
+
+
+@pytest.mark.parametrize("line, message", [
+    ("资产负债表,,应收账款,1122*,", "缺少键或科目"),
+    ("资产负债表,ar,应收账款,,", "缺少键或科目"),
+    ("利润表,revenue,营业收入,6001*,本期发生", "无法识别的取数"),
+    ("资产负债表,ar,应收账款,11a2*,", "无法识别的科目模式"),
+])
+def test_invalid_rules(line, message):
+    with pytest.raises(MappingError, match=message):
+        _mapping(line)
+
+
+def test_duplicate_key():
+    with pytest.raises(MappingError, match="重复的映射键"):
+        _mapping("资产负债表,ar,应收账款,1122*,\n利润表,ar,其他,6001*,")
+
+
+def test_load_mappings_reuses_until_file_changes(tmp_path):
+    path = tmp_path / "rules.csv"
+    path.write_text("报表,键,项目,科目,取数\n资产负债表,cash,货币资金,1001*,\n", encoding="utf-8")
+    first = load_mappings(tmp_path)
+    assert load_mappings(tmp_path) is first
+    path.write_text("报表,键,项目,科目,取数\n资产负债表,cash,货币资金,1001*;1002*,\n", encoding="utf-8")
+    os.utime(path, ns=(path.stat().st_mtime_ns + 10**9,) * 2)
+    second = load_mappings(tmp_path)
+    assert second is not first and second.version != first.version
+
+
+# ====================================================================
+# 与原硬编码取数一致（mappings/account_mapping.csv）
+# ====================================================================
+# 规则迁入 CSV 之前 engine.py 中的取数：资产负债表 (键, 科目)，利润表 (键, 科目, 取数方向)
+LEGACY_BS = [
+    ("cash", ["1001", "1002", "1012"]), ("notes_recv", ["1121"]), ("ar", ["1122", "-1231"]),
+    ("prepay", ["1123"]), ("other_recv", ["1221", "1131", "1132"]),
+    ("inventory", ["1401", "1402", "1403", "1404", "1405", "1406", "1407", "1408", "1411", "5001", "5101",
+                   "-1471"]),
+    ("other_current", ["1101"]), ("lt_invest", ["1511", "-1512"]), ("fa_cost", ["1601"]),
+    ("fa_dep", ["-1602"]), ("cip", ["1604"]), ("intangible", ["1701", "-1702"]), ("lt_prepaid", ["1801"]),
+    ("dta", ["1811"]), ("st_loan", ["2001"]), ("notes_pay", ["2201"]), ("ap", ["2202"]),
+    ("adv_recv", ["2203"]), ("payroll", ["2211"]), ("tax_pay", ["2221"]),
+    ("other_pay", ["2241", "2231", "2232"]), ("lt_loan", ["2501"]), ("lt_payable", ["2701"]),
+    ("dtl", ["2901"]), ("paid_in", ["4001"]), ("cap_reserve", ["4002"]), ("surplus", ["4101"]),
+    ("retained", ["4103", "4104"]),
+]
+LEGACY_PL = [
+    ("revenue", ["6001", "6051"], "credit"), ("cost", ["6401", "6402"], "debit"), ("tax", ["6403"], "debit"),
+    ("selling", ["6601"], "debit"), ("admin", ["6602"], "debit"), ("finance", ["6603"], "debit"),
+    ("impair", ["6701"], "debit"), ("fv_gain", ["6101"], "credit"), ("inv_income", ["6111"], "credit"),
+    ("non_op_inc", ["6301"], "credit"), ("non_op_exp", ["6711"], "debit"), ("income_tax", ["6801"], "debit"),
+]
+
+
+def _random_tb(seed: int) -> TrialBalance:
+    """全部映射科目的多级明细（部分期间缺上级科目、部分明细缺失），另加映射之外的科目"""
+    rng = np.random.default_rng(seed)
+    tops = sorted({c.lstrip("-") for _, codes in LEGACY_BS for c in codes}
+                  | {c for _, codes, _ in LEGACY_PL for c in codes} | {"1002", "2101", "6602", "6999"})
+    codes = []
+    for top in tops:
+        if rng.random() < 0.8:
+            codes.append(top)
+        for i in range(1, rng.integers(0, 4) + 1):
+            sub = f"{top}{i:02d}"
+            codes.append(sub)
+            codes += [f"{sub}{j:02d}" for j in range(1, rng.integers(0, 3) + 1)]
+    codes.append(tops[0] + "9")         # 前缀相同但不是两位一级的编码
+    values = np.round(rng.normal(0, 1e6, (len(codes), 4)), 2)
+    return TrialBalance(pd.DataFrame({"account_code": codes, **dict(zip(FIELDS, values.T))}))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_shipped_mapping_matches_legacy(seed):
+    mapping = load_mappings(MAPPING_DIR)
+    tb = _random_tb(seed)
+    lines = mapping.evaluate(tb.df)
+    assert set(mapping.targets) == {k for k, _ in LEGACY_BS} | {k for k, _, _ in LEGACY_PL}
+    for key, codes in LEGACY_BS:
+        for field in FIELDS:
+            assert lines.get(key, field) == pytest.approx(tb.amount(codes, field), abs=1e-6), (key, field)
+    for key, codes, side in LEGACY_PL:
+        assert lines.get(key) == pytest.approx(tb.amount(codes, side), abs=1e-6), key
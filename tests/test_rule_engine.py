@@ -0,0 +1,127 @@
+"""取数对话规则引擎：规则选择顺序、科目编码边界、通配展开、正则绑定、模板取值与规则校验"""
+
+from pathlib import Path
+
+import pytest
+
+from rule_engine import RuleError, RuleSet, load_rules, parse_rules
+
+RULES_DIR = Path(__file__).resolve().parent.parent / "rules"
+
+
+def _rules(*rows: str) -> RuleSet:
+    return RuleSet(parse_rules(["优先级,名称,匹配,回答", *rows], "test.csv"))
+
+
+def _name(rules: RuleSet, query: str):
+    rule, _ = rules.match(query)
+    return rule.name if rule else None
+
+
+# ====================================================================
+# 规则选择
+# ====================================================================
+def test_priority_wins():
+    rules = _rules("10,收入,收入,a", "50,毛利,毛利,b", "0,默认,,c")
+    assert _name(rules, "本月收入和毛利") == "毛利"
+    assert _name(rules, "本月收入") == "收入"
+    assert _name(rules, "天气如何") == "默认"
+
+
+def test_tie_broken_by_pattern_count_then_order():
+    rules = _rules("50,单项,收入,a", "50,多项,收入;营收;6001,b", "50,同分在后,收入;营收;6001,c")
+    assert _name(rules, "收入") == "单项"               # 同优先级、同命中数：取文件中靠前者
+    assert _name(rules, "营收收入") == "多项"           # 命中模式多者优先
+    assert _name(rules, "6001 收入 营收") == "多项"
+
+
+def test_keywords_ignore_width_and_case():
+    rules = _rules("10,毛利率,Gross Margin;毛利率,a")
+    assert _name(rules, "ＧＲＯＳＳ margin 是多少") == "毛利率"
+
+
+def test_no_match_without_default():
+    rules = _rules("10,收入,收入,{revenue}")
+    assert rules.match("天气") == (None, {})
+    assert rules.respond("天气", {}) == ""
+
+
+# ====================================================================
+# 科目编码
+# ====================================================================
+def test_exact_code_boundaries():
+    rules = _rules("10,科目,6001,{code}")
+    assert rules.match("6001余额") == (rules.rules[0], {"code": "6001"})
+    assert _name(rules, "60011余额") is None             # 不含下级时须是整个数字串
+    assert _name(rules, "16001余额") is None             # 须从数字串开头匹配
+
+
+def test_star_code_binds_full_subaccount():
+    rules = _rules("10,科目,6001*,{code}")
+    assert rules.match("60011余额")[1] == {"code": "60011"}
+    assert rules.match("查 6001")[1] == {"code": "6001"}
+    assert _name(rules, "16001") is None
+
+
+def test_x_expansion():
+    rules = _rules("10,费用,66xx,{code}", "5,费用明细,66xx*,{code}")
+    assert rules.match("6602 多少") == (rules.rules[0], {"code": "6602"})
+    assert rules.match("660201 多少") == (rules.rules[1], {"code": "660201"})
+    assert _name(rules, "6702") is None
+
+
+def test_x_expansion_limit():
+    with pytest.raises(RuleError, match="通配位过多"):
+        _rules("10,全部,6xxxx,a")
+
+
+# ====================================================================
+# 正则与模板
+# ====================================================================
+def test_named_regex_group_binding():
+    rules = _rules(r'10,余额,"re:(?P<code>\d{4,})科目余额;re:(?P<who>[甲乙])公司",{code}', "0,默认,,x")
+    rule, binds = rules.match("查询100201科目余额")
+    assert rule.name == "余额" and binds == {"code": "100201"}
+    assert rules.match("乙公司情况")[1] == {"who": "乙"}
+
+
+def test_code_variables_resolve_through_chain():
+    rules = _rules("10,科目余额,1002*,{code} 期末 {code_closing}，期初 {code_opening}，{period}")
+    values = {"acct_100201_closing": "12.5", "acct_100201_opening": "10", "period": "2026年9月"}
+    assert rules.respond("100201余额", values) == "100201 期末 12.5，期初 10，2026年9月"
+
+
+def test_bound_variables_take_precedence():
+    rules = _rules(r'10,期间,"re:(?P<period>\d{4}年\d{1,2}月)",{period}')
+    assert rules.respond("2025年12月的情况", {"period": "2026年9月"}) == "2025年12月"
+
+
+# ====================================================================
+# 规则校验
+# ====================================================================
+def test_duplicate_default():
+    with pytest.raises(RuleError, match="默认规则重复"):
+        _rules("0,默认,,a", "0,兜底,,b")
+
+
+@pytest.mark.parametrize("pattern", [r"re:(\d)\1", r"re:(?P<d>\d)(?P=d)"])
+def test_back_reference_rejected(pattern):
+    with pytest.raises(RuleError, match="反向引用"):
+        _rules(f"10,重复数字,{pattern},a")
+
+
+@pytest.mark.parametrize("row, message", [
+    ("10,坏正则,re:(,a", "正则无法编译"),
+    ("10,坏模板,收入,{revenue", "回答模板格式错误"),
+    ("高,收入,收入,a", "优先级须为整数"),
+    ("10,,收入,a", "缺少名称或回答"),
+])
+def test_invalid_rules(row, message):
+    with pytest.raises(RuleError, match=message):
+        _rules(row)
+
+
+def test_shipped_rules_compile():
+    rules = load_rules(RULES_DIR)
+    assert rules.default is not None
+    assert load_rules(RULES_DIR) is rules
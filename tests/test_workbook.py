@@ -0,0 +1,118 @@
+"""流式入库（ingest）后读回的 Sheet 与 pd.read_excel 的列类型、取值一致；上传文件的内容寻址保存"""
+
+import io
+import os
+from datetime import datetime, time
+
+import pandas as pd
+import pytest
+
+from workbook import LazyWorkbook, SheetCache, content_hash, stage_upload, store_upload
+
+openpyxl = pytest.importorskip("openpyxl")
+
+COLUMNS = {
+    "科目编码":   ["1001", "1002", "100201", "1122"],            # 数字文本：read_excel 同样转为整数
+    "明细编码":   ["001", "002A", "0031", None],                 # 含非数字：保留文本与前导零
+    "期初余额":   [1200.5, 0, None, -3.25],
+    "整数":       [1, 2.0, 3, 4],                                # 整值小数按整数读取
+    "日期":       [datetime(2026, 9, 30), None, datetime(2026, 10, 1, 8, 30), datetime(2025, 1, 1)],
+    "时间":       [time(8, 0), None, time(17, 30), time(0, 0)],
+    "是否结转":   [True, False, False, True],
+    "文本布尔":   ["TRUE", "false", None, "True"],
+    "缺失文本":   ["NA", "现金", "N/A", ""],
+    "混合":       ["—", 1500, "(200.00)", 3.5],
+    "空列":       [None, None, None, None],
+}
+
+
+def _same(a, b) -> bool:
+    if pd.isna(a) and pd.isna(b):
+        return True
+    return type(a) is type(b) and a == b
+
+
+@pytest.fixture
+def xlsx(tmp_path):
+    path = tmp_path / "nc.xlsx"
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "科目余额表"
+    ws.append(list(COLUMNS))
+    for row in zip(*COLUMNS.values()):
+        ws.append(list(row))
+    wb.save(path)
+    return path
+
+
+def test_ingested_sheet_matches_read_excel(xlsx, tmp_path):
+    cache = SheetCache(tmp_path / "cache", 1 << 30)
+    wb = LazyWorkbook(xlsx, "xlsx", cache=cache)
+    wb.ingest()
+    assert wb.ingested
+
+    reopened = LazyWorkbook(xlsx, "xlsx", cache=cache)   # 从缓存读回，不再打开工作簿
+    got = reopened.sheet("科目余额表")
+    expected = pd.read_excel(xlsx)
+    assert list(got.columns) == list(expected.columns)
+    for col in expected.columns:
+        assert got[col].dtype == expected[col].dtype, col
+        assert all(_same(a, b) for a, b in zip(got[col].tolist(), expected[col].tolist())), col
+
+    head = reopened.head("科目余额表", 2)
+    assert head["明细编码"].tolist() == ["001", "002A"]
+    assert head["日期"].dtype == expected["日期"].dtype
+
+
+
+# ====================================================================
+# 内容寻址保存
+# ====================================================================
+@pytest.fixture
+def store(tmp_path):
+    """stage(内容) → 暂存文件；save(暂存文件, 期间, 文件名) → 期间目录下的路径"""
+    def stage(data: bytes):
+        return stage_upload(io.BytesIO(data), tmp_path / "incoming", "xlsx")
+
+    def save(staged, period: str, filename: str):
+        dest_dir = tmp_path / "periods" / period
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        return store_upload(staged, tmp_path / "objects", dest_dir, filename)
+    return stage, save, tmp_path / "objects"
+
+
+def test_store_upload_hard_links_object(store):
+    stage, save, objects = store
+    staged = stage(b"ledger-2026-09")
+    digest = content_hash(staged)
+    assert staged.name == f"{digest}.xlsx"
+
+    dest = save(staged, "2026-09", "余额表.xlsx")
+    obj = objects / digest[:2] / f"{digest}.xlsx"
+    assert dest.name == "余额表.xlsx" and dest.read_bytes() == b"ledger-2026-09"
+    assert os.path.samefile(dest, obj)
+    # 另一期间保存同一内容：仍链接到同一份对象
+    other = save(staged, "2026-10", "copy.xlsx")
+    assert os.path.samefile(other, obj)
+    assert [p.name for p in objects.rglob("*") if p.is_file()] == [obj.name]
+
+
+def test_store_upload_same_name_same_content_reuses_file(store):
+    stage, save, _ = store
+    first = save(stage(b"same"), "2026-09", "余额表.xlsx")
+    again = save(stage(b"same"), "2026-09", "余额表.xlsx")
+    assert again == first
+    assert sorted(p.name for p in first.parent.iterdir()) == ["余额表.xlsx"]
+
+
+def test_store_upload_name_collision_gets_hash_suffix(store):
+    stage, save, objects = store
+    first = save(stage(b"version-1"), "2026-09", "余额表.xlsx")
+    staged = stage(b"version-2")
+    second = save(staged, "2026-09", "余额表.xlsx")
+    digest = content_hash(staged)
+    assert second.name == f"余额表_{digest[:8]}.xlsx"
+    assert first.read_bytes() == b"version-1" and second.read_bytes() == b"version-2"
+    assert os.path.samefile(second, objects / digest[:2] / f"{digest}.xlsx")
+    # 改名后的文件再次保存同一内容：沿用带后缀的文件
+    assert save(staged, "2026-09", "余额表.xlsx") == second
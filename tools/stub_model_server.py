@@ -0,0 +1,111 @@
+"""
+本地模型桩服务
+==============
+模拟 Gemini REST 接口，用于在没有外网 / API Key 的环境下联调 AI 取数对话：
+
+    python tools/stub_model_server.py --port 8765 --delay 0.5
+
+然后在 .env 中配置：
+
+    GEMINI_API_KEY=stub
+    AI_BASE_URL=http://127.0.0.1:8765
+
+应答内容为固定模板加上用户指令摘要；--delay 模拟上游首字延迟，--chunk-delay 为流式接口
+（streamGenerateContent?alt=sse）每段之间的间隔，--fail 让所有请求返回 500。
+"""
+
+import argparse
+import json
+import logging
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger("stub_model_server")
+
+ANSWER = (
+    "【桩服务应答】已收到指令「{query}」。主营业务收入取自科目余额表 6001 本期贷方发生额，"
+    "营业成本取自 6401 本期借方发生额，毛利率 = (收入 − 成本) / 收入。"
+)
+
+
+def _query_of(prompt: str) -> str:
+    m = re.search(r"用户指令：(.*)", prompt)
+    return (m.group(1) if m else prompt).strip()[:60]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    delay = 0.0
+    chunk_delay = 0.05
+    fail = False
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _json(self, status: int, payload: dict):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            prompt = payload["contents"][-1]["parts"][0]["text"]
+        except (ValueError, KeyError, IndexError):
+            return self._json(400, {"error": {"message": "bad request"}})
+        if self.fail:
+            return self._json(500, {"error": {"message": "stub failure"}})
+        time.sleep(self.delay)
+        text = ANSWER.format(query=_query_of(prompt))
+        if ":generateContent" in self.path:
+            return self._json(200, _candidate(text))
+        if ":streamGenerateContent" in self.path:
+            return self._sse(text)
+        self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _sse(self, text: str, size: int = 8):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        try:
+            for i in range(0, len(text), size):
+                event = json.dumps(_candidate(text[i:i + size]), ensure_ascii=False)
+                self.wfile.write(f"data: {event}\r\n\r\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(self.chunk_delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass      # 客户端中途取消
+        self.close_connection = True
+
+
+def _candidate(text: str) -> dict:
+    return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+
+def serve(port: int = 8765, delay: float = 0.0, fail: bool = False,
+          chunk_delay: float = 0.05) -> ThreadingHTTPServer:
+    """启动桩服务（调用方负责 serve_forever / shutdown）"""
+    handler = type("Handler", (StubHandler,), {"delay": delay, "fail": fail, "chunk_delay": chunk_delay})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Gemini REST 本地桩服务")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--delay", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    ap.add_argument("--chunk-delay", type=float, default=0.05, help="流式应答每段间隔（秒）")
+    ap.add_argument("--fail", action="store_true", help="所有请求返回 HTTP 500")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    server = serve(args.port, args.delay, args.fail, args.chunk_delay)
+    log.info("listening on http://127.0.0.1:%d", server.server_address[1])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,328 @@
+"""
+Word 报告生成
+=============
+按 templates/ 下的 docx 模板生成月度财务分析报告。模板为普通 Word 文档，正文中写占位符：
+
+    {{revenue}}            取数变量（与取数对话规则同一套，见 engine.LedgerFacts）
+    {{table:利润表}}       独占一段时，整段替换为该报表的表格（版式同页面财务表格）
+
+模板首次使用时编译：合并被 Word 拆散在多个 run 中的占位符，把 document.xml 切分为
+「固定 XML 片段 + 变量 / 表格」序列，其余部件原样缓存。编译结果按文件修改时间缓存在进程内，
+生成报告只做取值与拼接，不再解析模板。模板不存在时写出一份默认模板，可在 Word 中修改后覆盖。
+"""
+
+import io
+import re
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from display import classify_rows
+
+DOCUMENT = "word/document.xml"
+
+_PLACEHOLDER = re.compile(r"\{\{\s*([^{}\s]+)\s*\}\}")
+_PARAGRAPH   = re.compile(r"<w:p\b[^>]*?(?:/>|>.*?</w:p>)", re.S)
+_TEXT        = re.compile(r"<w:t(?:\s[^>]*)?>(.*?)</w:t>", re.S)
+_PPR         = re.compile(r"<w:pPr>.*?</w:pPr>", re.S)
+_RPR         = re.compile(r"<w:rPr>.*?</w:rPr>", re.S)
+_PSTYLE      = re.compile(r'<w:pStyle w:val="([^"]+)"')
+
+
+class TemplateError(ValueError):
+    """模板格式错误或变量无法取值"""
+
+
+def _unescape(xml_text: str) -> str:
+    return (xml_text.replace("&lt;", "<").replace("&gt;", ">")
+            .replace("&quot;", '"').replace("&apos;", "'").replace("&amp;", "&"))
+
+
+def _run_text(text: str) -> str:
+    """变量值 → w:t 内容；换行转为 w:br"""
+    return escape(text).replace("\n", '</w:t><w:br/><w:t xml:space="preserve">')
+
+
+# ====================================================================
+# 报表表格
+# ====================================================================
+CELL_STYLES = {   # 行类型 → (底色, 字色, 加粗)，取自页面财务表格配色
+    "header":     ("0C3060", "DDEEFF", True),
+    "section":    ("D6E9FF", "0C3060", True),
+    "subtotal":   ("EEF5FF", "1E4A8A", True),
+    "grandtotal": ("1255A8", "FFFFFF", True),
+    "odd":        ("FFFFFF", "243040", False),
+    "even":       ("F5F8FD", "243040", False),
+}
+MARK_COLORS = (("↑", "16A34A"), ("↓", "DC2626"), ("✅", "16A34A"), ("⚠️", "D97706"))
+
+
+def _cell(text: str, style: str, align: str, indent: int = 0) -> str:
+    fill, color, bold = CELL_STYLES[style]
+    color = next((c for p, c in MARK_COLORS if text.startswith(p)), color)
+    ind = f'<w:ind w:left="{indent * 200}"/>' if indent else ""
+    return (
+        f'<w:tc><w:tcPr><w:shd w:val="clear" w:color="auto" w:fill="{fill}"/></w:tcPr>'
+        f'<w:p><w:pPr><w:spacing w:before="20" w:after="20"/>{ind}<w:jc w:val="{align}"/></w:pPr>'
+        f'<w:r><w:rPr>{"<w:b/>" if bold else ""}<w:color w:val="{color}"/><w:sz w:val="18"/></w:rPr>'
+        f'<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p></w:tc>'
+    )
+
+
+def table_xml(df) -> str:
+    """报表 DataFrame（展示用字符串表）→ w:tbl：表头、分类、小计、总计与奇偶底纹同页面"""
+    cols = [str(c) for c in df.columns]
+    widths = [2800] + [1500] * (len(cols) - 1)
+    grid = "".join(f'<w:gridCol w:w="{w}"/>' for w in widths)
+    borders = "".join(
+        f'<w:{side} w:val="single" w:sz="4" w:space="0" w:color="9EB8D8"/>'
+        for side in ("top", "left", "bottom", "right", "insideH", "insideV")
+    )
+    rows = ["<w:tr><w:trPr><w:tblHeader/></w:trPr>" + "".join(
+        _cell(c, "header", "left" if j == 0 else "right") for j, c in enumerate(cols)) + "</w:tr>"]
+    if len(df):
+        rtype, level = classify_rows(df.iloc[:, 0].to_numpy())
+        odd = (np.cumsum(rtype == "normal") % 2) == 1
+        for i, values in enumerate(df.itertuples(index=False, name=None)):
+            if rtype[i] == "sep":
+                continue
+            style = ("odd" if odd[i] else "even") if rtype[i] == "normal" else rtype[i]
+            cells = [_cell(str(values[0]).strip(), style, "left", int(level[i]))]
+            cells += ["" if v is None or (isinstance(v, float) and np.isnan(v)) else str(v) for v in values[1:]]
+            rows.append("<w:tr>" + cells[0] + "".join(_cell(t, style, "right") for t in cells[1:]) + "</w:tr>")
+    return (
+        f'<w:tbl><w:tblPr><w:tblW w:w="5000" w:type="pct"/><w:tblBorders>{borders}</w:tblBorders>'
+        f'<w:tblLayout w:type="autofit"/></w:tblPr><w:tblGrid>{grid}</w:tblGrid>{"".join(rows)}</w:tbl>'
+    )
+
+
+# ====================================================================
+# 模板编译
+# ====================================================================
+class CompiledTemplate:
+    """编译后的 docx 模板：document.xml 切分为片段序列，其余部件原样保留"""
+
+    def __init__(self, parts: dict, document: str):
+        self.parts = parts                 # 部件名 → 原始字节（不含 document.xml）
+        self.segments: list = []           # str 固定 XML / ("field", 名称) / ("table", 报表)
+        self.blocks: list = []             # 预览用：(段落样式, 片段序列) / ("table", 报表)
+        self.fields: set = set()
+        self.tables: list = []
+        pos = 0
+        for m in _PARAGRAPH.finditer(document):
+            para = m.group(0)
+            text = _unescape("".join(_TEXT.findall(para)))
+            style = (_PSTYLE.search(para) or [None, ""])[1]
+            if "{{" not in text:
+                if text.strip():
+                    self.blocks.append((style, [text]))
+                continue
+            self._literal(document[pos:m.start()])
+            pos = m.end()
+            whole = _PLACEHOLDER.fullmatch(text.strip())
+            if whole and whole.group(1).startswith("table:"):
+                name = whole.group(1)[6:]
+                self.tables.append(name)
+                self.segments.append(("table", name))
+                self.blocks.append(("table", name))
+                continue
+            # 合并为单个 run：保留段落属性与首个 run 的字体属性
+            ppr = _PPR.search(para)
+            rpr = _RPR.search(para[ppr.end():] if ppr else para)
+            head = para[:para.index(">") + 1] + (ppr.group(0) if ppr else "")
+            self._literal(f'{head}<w:r>{rpr.group(0) if rpr else ""}<w:t xml:space="preserve">')
+            block = []
+            last = 0
+            for f in _PLACEHOLDER.finditer(text):
+                self._literal(escape(text[last:f.start()]))
+                block.append(text[last:f.start()])
+                self.segments.append(("field", f.group(1)))
+                self.fields.add(f.group(1))
+                block.append(("field", f.group(1)))
+                last = f.end()
+            self._literal(escape(text[last:]) + "</w:t></w:r></w:p>")
+            block.append(text[last:])
+            self.blocks.append((style, block))
+        self._literal(document[pos:])
+
+    def _literal(self, xml: str):
+        if not xml:
+            return
+        if self.segments and isinstance(self.segments[-1], str):
+            self.segments[-1] += xml
+        else:
+            self.segments.append(xml)
+
+    def _value(self, values, name: str) -> str:
+        try:
+            return str(values[name])
+        except KeyError:
+            raise TemplateError(f"模板变量 {{{{{name}}}}} 无法取值") from None
+
+    def render(self, values, tables: dict) -> bytes:
+        """values：变量映射（按需取值）；tables：报表名称 → 展示用 DataFrame"""
+        out = []
+        for seg in self.segments:
+            if isinstance(seg, str):
+                out.append(seg)
+            elif seg[0] == "field":
+                out.append(_run_text(self._value(values, seg[1])))
+            else:
+                if seg[1] not in tables:
+                    raise TemplateError(f"模板中的表格 {seg[1]} 没有数据")
+                out.append(table_xml(tables[seg[1]]))
+        buf = io.BytesIO()
+        with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, data in self.parts.items():
+                zf.writestr(name, data)
+            zf.writestr(DOCUMENT, "".join(out))
+        return buf.getvalue()
+
+    def preview(self, values) -> list:
+        """[(段落样式, 文本) 或 ("table", 报表名称)]，用于页面预览"""
+        out = []
+        for style, block in self.blocks:
+            if style == "table":
+                out.append((style, block))
+            else:
+                out.append((style, "".join(
+                    b if isinstance(b, str) else self._value(values, b[1]) for b in block)))
+        return out
+
+
+def compile_template(data: bytes) -> CompiledTemplate:
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            parts = {n: zf.read(n) for n in zf.namelist()}
+    except zipfile.BadZipFile:
+        raise TemplateError("模板不是有效的 docx 文件") from None
+    if DOCUMENT not in parts:
+        raise TemplateError("模板缺少 word/document.xml")
+    return CompiledTemplate(parts, parts.pop(DOCUMENT).decode("utf-8"))
+
+
+_compiled: dict = {}
+
+
+def load_template(path) -> CompiledTemplate:
+    """编译模板；文件未变化时复用进程内缓存的编译结果"""
+    path = Path(path)
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    cached = _compiled.get(str(path))
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    template = compile_template(path.read_bytes())
+    _compiled[str(path)] = (stamp, template)
+    return template
+
+
+# ====================================================================
+# 默认模板
+# ====================================================================
+DEFAULT_OUTLINE = [
+    ("Title", "{{company}}"),
+    ("Title", "{{period}}月度财务分析报告"),
+    ("Subtitle", "编制日期：{{generated_at}}　金额单位：{{unit}}"),
+    ("Heading1", "一、主要经营指标完成情况"),
+    ("", "{{period}}实现营业收入 {{revenue}} {{unit}}，同比{{revenue_yoy}}、环比{{revenue_mom}}；"
+         "营业成本 {{cost}} {{unit}}，毛利率 {{gross_margin}}，较上年同期{{gross_margin_yoy}}；"
+         "净利润 {{net_profit}} {{unit}}，同比{{net_profit_yoy}}，净利率 {{net_margin}}。"),
+    ("Caption", "表 1　利润表"),
+    ("", "{{table:利润表}}"),
+    ("Heading1", "二、利润总额情况（同比分析）"),
+    ("", "本期营业利润 {{op_profit}} {{unit}}，利润总额 {{total_profit}} {{unit}}，同比{{total_profit_yoy}}。"
+         "投资收益 {{inv_income}} {{unit}}，营业外收入 {{non_op_inc}} {{unit}}，营业外支出 {{non_op_exp}} {{unit}}。"),
+    ("Caption", "表 2　同比分析底稿"),
+    ("", "{{table:同比分析底稿}}"),
+    ("Heading1", "三、成本费用情况"),
+    ("", "本期生产成本（5001）借方发生额 {{acct_5001_debit}} {{unit}}。销售费用 {{selling}} {{unit}}（同比{{selling_yoy}}），"
+         "管理费用 {{admin}} {{unit}}（同比{{admin_yoy}}），财务费用 {{finance}} {{unit}}（同比{{finance_yoy}}）。"),
+    ("Caption", "表 3　成本构成分析"),
+    ("", "{{table:成本构成分析}}"),
+    ("Caption", "表 4　费用明细分析"),
+    ("", "{{table:费用明细分析}}"),
+    ("Heading1", "四、两金及资产负债情况"),
+    ("", "期末应收账款 {{ar}} {{unit}}（较期初{{ar_mom}}），存货 {{inventory}} {{unit}}（较期初{{inventory_mom}}）；"
+         "货币资金 {{cash}} {{unit}}。资产总额 {{total_assets}} {{unit}}，负债合计 {{total_liab}} {{unit}}，"
+         "资产负债率 {{debt_ratio}}，较期初{{debt_ratio_mom}}。"),
+    ("Caption", "表 5　资产负债表"),
+    ("", "{{table:资产负债表}}"),
+    ("Heading1", "五、需关注事项"),
+    ("", "{{attention}}"),
+]
+
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" ' \
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"'
+
+_STYLES = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<w:styles {_W_NS}>
+<w:docDefaults><w:rPrDefault><w:rPr><w:rFonts w:ascii="Arial" w:hAnsi="Arial" w:eastAsia="微软雅黑"/>
+<w:sz w:val="21"/><w:lang w:eastAsia="zh-CN"/></w:rPr></w:rPrDefault>
+<w:pPrDefault><w:pPr><w:spacing w:after="120" w:line="360" w:lineRule="auto"/></w:pPr></w:pPrDefault></w:docDefaults>
+<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>
+<w:pPr><w:ind w:firstLineChars="200" w:firstLine="420"/><w:jc w:val="both"/></w:pPr></w:style>
+<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>
+<w:pPr><w:ind w:firstLine="0"/><w:jc w:val="center"/><w:spacing w:after="60"/></w:pPr>
+<w:rPr><w:b/><w:color w:val="0C3060"/><w:sz w:val="36"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Subtitle"><w:name w:val="Subtitle"/><w:basedOn w:val="Normal"/>
+<w:pPr><w:ind w:firstLine="0"/><w:jc w:val="center"/><w:spacing w:after="240"/></w:pPr>
+<w:rPr><w:color w:val="5A6B85"/><w:sz w:val="20"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/>
+<w:pPr><w:keepNext/><w:ind w:firstLine="0"/><w:spacing w:before="240" w:after="120"/><w:outlineLvl w:val="0"/></w:pPr>
+<w:rPr><w:b/><w:color w:val="0C3060"/><w:sz w:val="28"/></w:rPr></w:style>
+<w:style w:type="paragraph" w:styleId="Caption"><w:name w:val="caption"/><w:basedOn w:val="Normal"/>
+<w:pPr><w:keepNext/><w:ind w:firstLine="0"/><w:jc w:val="center"/><w:spacing w:before="120" w:after="60"/></w:pPr>
+<w:rPr><w:b/><w:color w:val="1E4A8A"/><w:sz w:val="19"/></w:rPr></w:style>
+</w:styles>"""
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>
+</Types>"""
+
+_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>"""
+
+_DOC_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+
+
+def default_template() -> bytes:
+    paras = []
+    for style, text in DEFAULT_OUTLINE:
+        ppr = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+        paras.append(f'<w:p>{ppr}<w:r><w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+    document = (
+        f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<w:document {_W_NS}><w:body>'
+        + "".join(paras)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+          '<w:pgMar w:top="1440" w:right="1247" w:bottom="1440" w:left="1247" w:header="851" w:footer="992" w:gutter="0"/>'
+          "</w:sectPr></w:body></w:document>"
+    )
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _RELS)
+        zf.writestr(DOCUMENT, document)
+        zf.writestr("word/_rels/document.xml.rels", _DOC_RELS)
+        zf.writestr("word/styles.xml", _STYLES)
+    return buf.getvalue()
+
+
+def ensure_template(path) -> Path:
+    """模板不存在时写出默认模板"""
+    path = Path(path)
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(default_template())
+    return path
@@ -0,0 +1,661 @@
+"""
+工作簿解析与缓存
+================
+NC 系统导出文件（xlsx / xls / csv）的解析，以及按文件内容哈希落盘的 Sheet 缓存。
+缓存以 Parquet 列式格式存放在 DATA_DIR 下，跨重启有效，超出容量按 LRU 淘汰。
+"""
+
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from datetime import datetime, time as dtime
+from pathlib import Path
+
+import pandas as pd
+
+from metrics import timed
+
+
+@timed("parse")
+def read_excel_file(path_or_bytes, ext: str) -> dict:
+    if ext == "csv":
+        if isinstance(path_or_bytes, (str, Path)):
+            return {"Sheet1": pd.read_csv(path_or_bytes)}
+        return {"Sheet1": pd.read_csv(io.BytesIO(path_or_bytes))}
+    engine = "xlrd" if ext == "xls" else "openpyxl"
+    if isinstance(path_or_bytes, (str, Path)):
+        xls = pd.ExcelFile(path_or_bytes, engine=engine)
+    else:
+        xls = pd.ExcelFile(io.BytesIO(path_or_bytes), engine=engine)
+    return {name: xls.parse(name) for name in xls.sheet_names}
+
+
+# ====================================================================
+# 内容哈希
+# ====================================================================
+_HASH_CHUNK = 1024 * 1024
+_path_hash_memo: dict = {}
+
+
+def content_hash(path_or_bytes) -> str:
+    """文件内容 SHA-256；路径按 (大小, 修改时间) 记忆，避免每次重跑都重新读盘"""
+    if not isinstance(path_or_bytes, (str, Path)):
+        return hashlib.sha256(path_or_bytes).hexdigest()
+    st_ = os.stat(path_or_bytes)
+    memo_key = (str(path_or_bytes), st_.st_size, st_.st_mtime_ns)
+    digest = _path_hash_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path_or_bytes, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _path_hash_memo[memo_key] = digest
+    return digest
+
+
+# ====================================================================
+# Sheet 缓存（Parquet + LRU）
+# ====================================================================
+def _parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """Parquet 要求列名为字符串、单列类型一致；混合类型列的非空值转为文本"""
+    out = df.copy()
+    out.columns = [str(c) for c in out.columns]
+    for col in out.columns:
+        if out[col].dtype == object:
+            out[col] = out[col].map(lambda v: v if v is None or isinstance(v, str) or pd.isna(v) else str(v))
+    return out
+
+
+class SheetCache:
+    """按 (内容哈希, 扩展名) 缓存解析结果：每个条目一个目录，每个 Sheet 一个 Parquet 文件。
+
+    manifest.json 记录 Sheet 索引（名称、行数、列数），其修改时间即 LRU 访问时间；
+    Sheet 数据 <序号>.parquet 在首次解析后写入，未打开过的 Sheet 不占空间。
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, root, budget_bytes: int):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.budget = budget_bytes
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key_for(path_or_bytes, ext: str) -> str:
+        return f"{content_hash(path_or_bytes)}-{ext}"
+
+    def _write_atomic(self, path: Path, write):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            write(tmp)
+            os.replace(tmp, path)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    def get_index(self, key: str):
+        manifest_path = self.root / key / self.MANIFEST
+        try:
+            index = json.loads(manifest_path.read_text(encoding="utf-8"))["sheets"]
+        except Exception:
+            return None
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return index
+
+    def put_index(self, key: str, index: list):
+        entry = self.root / key
+        entry.mkdir(exist_ok=True)
+        payload = json.dumps({"sheets": index}, ensure_ascii=False)
+        self._write_atomic(entry / self.MANIFEST, lambda p: p.write_text(payload, encoding="utf-8"))
+        self.evict(keep=key)
+
+    def has_sheet(self, key: str, i: int) -> bool:
+        return (self.root / key / f"{i}.parquet").exists()
+
+    def get_sheet(self, key: str, i: int, meta: dict = None, nrows: int = None):
+        """读取已缓存的 Sheet；nrows 只读前若干行（按行组流式读取）"""
+        path = self.root / key / f"{i}.parquet"
+        try:
+            if nrows is None:
+                df = pd.read_parquet(path)
+            else:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                pf = pq.ParquetFile(path)
+                batches, n = [], 0
+                for batch in pf.iter_batches(batch_size=min(nrows, INGEST_BATCH_ROWS)):
+                    batches.append(batch)
+                    n += batch.num_rows
+                    if n >= nrows:
+                        break
+                table = pa.Table.from_batches(batches, schema=pf.schema_arrow)
+                df = table.to_pandas().head(nrows)
+        except Exception:
+            return None
+        return _restore_types(df, meta) if meta else df
+
+    def write_sheet(self, key: str, i: int, write):
+        """write(path) 负责把 Sheet 写入给定路径；完成后原子替换"""
+        entry = self.root / key
+        if not entry.exists():
+            return
+        self._write_atomic(entry / f"{i}.parquet", write)
+        self.evict(keep=key)
+
+    def put_sheet(self, key: str, i: int, df: pd.DataFrame):
+        def write(p):
+            try:
+                df.to_parquet(p, index=False)
+            except Exception:
+                _parquet_safe(df).to_parquet(p, index=False)
+
+        self.write_sheet(key, i, write)
+
+    def evict(self, keep: str = ""):
+        """总容量超出预算时，按最近访问时间从旧到新删除条目"""
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in self.root.iterdir():
+                manifest_path = entry / self.MANIFEST
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    size = sum(p.stat().st_size for p in entry.iterdir())
+                    entries.append((manifest_path.stat().st_mtime, size, entry))
+                except OSError:
+                    continue
+                total += size
+            entries.sort(key=lambda e: e[0])
+            for _, size, entry in entries:
+                if total <= self.budget:
+                    break
+                if entry.name == keep:
+                    continue
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+
+# ====================================================================
+# 流式入库（内存峰值与文件大小无关）
+# ====================================================================
+INGEST_BATCH_ROWS = 50_000
+STAGE_TTL_SECONDS = 24 * 3600
+
+
+def stage_upload(fileobj, dest_dir, ext: str) -> Path:
+    """上传文件分块写入暂存目录，同时计算内容哈希；文件以哈希命名，重复上传不再落盘"""
+    dest_dir = Path(dest_dir)
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    cutoff = time.time() - STAGE_TTL_SECONDS
+    for p in dest_dir.iterdir():
+        try:
+            if p.stat().st_mtime < cutoff:
+                p.unlink()
+        except OSError:
+            pass
+    h = hashlib.sha256()
+    tmp = dest_dir / f".{os.getpid()}.{threading.get_ident()}.tmp"
+    fileobj.seek(0)
+    with open(tmp, "wb") as f:
+        for chunk in iter(lambda: fileobj.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+            f.write(chunk)
+    digest = h.hexdigest()
+    final = dest_dir / f"{digest}.{ext}"
+    if final.exists():
+        tmp.unlink()
+    else:
+        os.replace(tmp, final)
+    st_ = final.stat()
+    _path_hash_memo[(str(final), st_.st_size, st_.st_mtime_ns)] = digest
+    return final
+
+
+# ====================================================================
+# 内容寻址存储
+# ====================================================================
+def _link_or_copy(src: Path, dest: Path):
+    """原子地建立 dest：优先硬链接（同一份数据不重复占用磁盘），文件系统不支持时复制"""
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    try:
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def store_upload(staged, objects_dir, dest_dir, filename: str) -> Path:
+    """保存暂存的上传文件，返回期间目录下的文件路径。
+
+    内容只在 objects/<哈希前两位>/<哈希>.<扩展名> 存一份，期间目录中的文件是它的硬链接；
+    期间目录已有同名但内容不同的文件时，新文件改名为 <名称>_<哈希前8位>，不覆盖原文件。
+    """
+    staged = Path(staged)
+    digest = content_hash(staged)
+    obj = Path(objects_dir) / digest[:2] / f"{digest}{staged.suffix}"
+    if not obj.exists():
+        obj.parent.mkdir(parents=True, exist_ok=True)
+        _link_or_copy(staged, obj)
+    dest = Path(dest_dir) / filename
+    if dest.exists() and not os.path.samefile(dest, obj) and content_hash(dest) != digest:
+        dest = dest.with_name(f"{dest.stem}_{digest[:8]}{dest.suffix}")
+    if not dest.exists():
+        _link_or_copy(obj, dest)
+    st_ = dest.stat()
+    _path_hash_memo[(str(dest), st_.st_size, st_.st_mtime_ns)] = digest
+    return dest
+
+
+def _header_names(header, ncols: int) -> list:
+    """与 pandas 一致：空表头记为 Unnamed: N，重名依次加 .1 / .2"""
+    names, seen = [], {}
+    for j in range(ncols):
+        v = header[j] if j < len(header) else None
+        name = f"Unnamed: {j}" if v is None or str(v).strip() == "" else str(v)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+# ── 单元格编码与列类型 ─────────────────────────────────────────────
+# 流式入库的单元格一律以文本落盘：文本原样保存，其他类型加「\x00 + 类型码」前缀（均为 2 个字符），
+# 以 \x00 开头的文本记为 \x00s 转义；pandas 视为缺失的文本（NA、N/A、空串……）直接记为空。
+# 入库时按 pandas 读取 Excel 的推断规则汇总每列的单元格类型，列类型写入 Sheet 索引（dtypes），
+# 读取时按列类型还原，结果与 pd.read_excel 一致。
+_TAG = "\x00"
+_NA_TEXT = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+    "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null",
+})
+_INT_TEXT = re.compile(r"\s*[+-]?\d+\s*")
+_FLOAT_TEXT = re.compile(r"\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?|inf(?:inity)?)\s*", re.I)
+_BOOL_TEXT = {"True": True, "TRUE": True, "true": True, "False": False, "FALSE": False, "false": False}
+
+# 单元格类型码：i 整数（含整值小数）、f 小数、b 布尔、d 日期时间、t 时间、
+# si / sf / sb 形如整数 / 小数 / 布尔的文本、s 其他文本、n 缺失
+_NUMERIC_KINDS = frozenset("i f b si sf".split())
+_TEXT_KINDS = frozenset("si sf sb s".split())
+
+
+def _encode_cell(v) -> tuple:
+    """单元格 → (落盘文本或 None, 类型码)"""
+    if v is None:
+        return None, "n"
+    if isinstance(v, str):
+        if v in _NA_TEXT:
+            return None, "n"
+        kind = "si" if _INT_TEXT.fullmatch(v) else "sf" if _FLOAT_TEXT.fullmatch(v) else \
+            "sb" if v in _BOOL_TEXT else "s"
+        return (_TAG + "s" + v if v.startswith(_TAG) else v), kind
+    if isinstance(v, bool):
+        return _TAG + ("b1" if v else "b0"), "b"
+    if isinstance(v, int):
+        return _TAG + "i" + str(v), "i"
+    if isinstance(v, float):
+        if v != v:
+            return None, "n"
+        if v.is_integer():
+            return _TAG + "i" + str(int(v)), "i"
+        return _TAG + "f" + repr(v), "f"
+    if isinstance(v, datetime):
+        return _TAG + "d" + v.isoformat(), "d"
+    if isinstance(v, dtime):
+        return _TAG + "t" + v.isoformat(), "t"
+    return str(v), "s"
+
+
+def _decode_cell(v):
+    if not isinstance(v, str):          # 缺失（读回时为 None / NaN）
+        return float("nan")
+    if not v.startswith(_TAG):
+        return v
+    tag, body = v[1], v[2:]
+    if tag == "i":
+        return int(body)
+    if tag == "f":
+        return float(body)
+    if tag == "b":
+        return body == "1"
+    if tag == "d":
+        return datetime.fromisoformat(body)
+    if tag == "t":
+        return dtime.fromisoformat(body)
+    return body
+
+
+def _column_dtype(kinds: set) -> str:
+    """一列出现过的单元格类型码 → 列类型（int / float / bool / bool_na / datetime / str / object）"""
+    has_na = "n" in kinds
+    kinds = kinds - {"n"}
+    if kinds and not has_na and (kinds <= {"b"} or kinds == {"sb"}):
+        return "bool"
+    if kinds <= _NUMERIC_KINDS:
+        return "float" if has_na or kinds & {"f", "sf"} or not kinds else "int"
+    if kinds == {"sb"}:
+        return "bool_na"        # 布尔文本 + 缺失：对象列，文本转为布尔值
+    if kinds == {"d"}:
+        return "datetime"
+    if kinds <= _TEXT_KINDS:
+        return "str"
+    return "object"
+
+
+def _ingest_rows(rows, path, ncols_hint: int = 0, batch_rows: int = INGEST_BATCH_ROWS) -> dict:
+    """逐行写入 Parquet：单元格按 _encode_cell 编码为文本落盘，返回的 dtypes 供读取时还原列类型。
+
+    与 pandas 一致，中间空行保留、尾部空行丢弃。
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    it = iter(rows)
+    header = next(it, None) or ()
+    ncols = max(len(header), ncols_hint)
+    names = _header_names(header, ncols)
+    schema = pa.schema([(n, pa.string()) for n in names])
+    columns = [[] for _ in range(ncols)]
+    kinds = [set() for _ in range(ncols)]
+    buffered = total = pending_blank = 0
+
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        def flush():
+            nonlocal columns, buffered
+            if buffered:
+                writer.write_table(pa.Table.from_arrays(
+                    [pa.array(c, type=pa.string()) for c in columns], schema=schema,
+                ))
+                columns = [[] for _ in range(ncols)]
+                buffered = 0
+
+        for r in it:
+            if all(v is None or v == "" for v in r):
+                pending_blank += 1
+                continue
+            for _ in range(pending_blank):
+                for c in columns:
+                    c.append(None)
+            if pending_blank:
+                for k in kinds:
+                    k.add("n")
+            buffered += pending_blank
+            total += pending_blank
+            pending_blank = 0
+            for j in range(ncols):
+                text, kind = _encode_cell(r[j] if j < len(r) else None)
+                columns[j].append(text)
+                kinds[j].add(kind)
+            buffered += 1
+            total += 1
+            if buffered >= batch_rows:
+                flush()
+        flush()
+    finally:
+        writer.close()
+    return {"rows": total, "cols": ncols, "text": True, "dtypes": [_column_dtype(k) for k in kinds]}
+
+
+def _ingest_csv(path_or_buf, path, batch_rows: int = INGEST_BATCH_ROWS) -> dict:
+    """分块读取 CSV，按块写入 Parquet"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = schema = None
+    total = 0
+    try:
+        for chunk in pd.read_csv(path_or_buf, chunksize=batch_rows, dtype=str):
+            if writer is None:
+                chunk.columns = [str(c) for c in chunk.columns]
+                schema = pa.schema([(c, pa.string()) for c in chunk.columns])
+                writer = pq.ParquetWriter(path, schema)
+            else:
+                chunk.columns = schema.names
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            total += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is None:
+        pd.DataFrame().to_parquet(path, index=False)
+        return {"rows": 0, "cols": 0, "text": True}
+    return {"rows": total, "cols": len(schema.names), "text": True}
+
+
+def _restore_column(col: pd.Series, dtype: str) -> pd.Series:
+    if dtype in ("int", "float"):
+        tagged = col.str.startswith(_TAG, na=False)
+        num = pd.to_numeric(col.where(~tagged, col.str.slice(2)))
+        return num.astype("float64") if dtype == "float" else num
+    values = [_decode_cell(v) for v in col.astype(object).tolist()]
+    if dtype in ("bool", "bool_na"):
+        values = [_BOOL_TEXT.get(v, v) if isinstance(v, str) else v for v in values]
+    if dtype in ("bool", "datetime", "str"):
+        return pd.Series(values, index=col.index)      # 与 read_excel 相同，由 pandas 推断具体类型
+    return pd.Series(values, index=col.index, dtype=object)
+
+
+def _restore_types(df: pd.DataFrame, meta: dict) -> pd.DataFrame:
+    """流式入库的 Sheet 以文本存储，按索引中记录的列类型还原（见 _column_dtype）。
+
+    CSV 与早期入库、没有 dtypes 的 Sheet：与 read_csv 的推断一致，非空值全部可转为数值的列还原为数值。
+    """
+    if not meta.get("text"):
+        return df
+    dtypes = meta.get("dtypes")
+    if dtypes and len(dtypes) == len(df.columns):
+        for col, dtype in zip(df.columns, dtypes):
+            df[col] = _restore_column(df[col], dtype)
+        return df
+    for col in df.columns:
+        num = pd.to_numeric(df[col], errors="coerce")
+        if num.notna().sum() == df[col].notna().sum():
+            df[col] = num
+    return df
+
+
+def ingest_workbook(path, ext: str, cache: SheetCache, key: str, progress=None) -> list:
+    """流式解析 xlsx（openpyxl 只读模式）/ csv（分块读取），按批直接写入 Sheet 缓存。
+
+    返回精确的 Sheet 索引；progress(i, n, name) 用于界面进度提示。
+    """
+    (cache.root / key).mkdir(exist_ok=True)
+    index = []
+    if ext == "csv":
+        meta = {}
+        cache.write_sheet(key, 0, lambda p: meta.update(_ingest_csv(path, p)))
+        index.append({"name": "Sheet1", **meta})
+    else:
+        from openpyxl import load_workbook
+        wb = load_workbook(path, read_only=True, data_only=True)
+        try:
+            names = wb.sheetnames
+            for i, name in enumerate(names):
+                if progress:
+                    progress(i, len(names), name)
+                ws = wb[name]
+                hint = getattr(ws, "max_column", None) or 0
+                meta = {}
+                cache.write_sheet(
+                    key, i,
+                    lambda p: meta.update(_ingest_rows(ws.iter_rows(values_only=True), p, hint)),
+                )
+                index.append({"name": name, **meta})
+        finally:
+            wb.close()
+    cache.put_index(key, index)
+    return index
+
+
+# ====================================================================
+# 惰性工作簿
+# ====================================================================
+def _as_source(path_or_bytes):
+    if isinstance(path_or_bytes, (str, Path)):
+        return path_or_bytes
+    return io.BytesIO(path_or_bytes)
+
+
+def scan_sheet_index(path_or_bytes, ext: str) -> list:
+    """只读取工作簿结构，返回 [{name, rows, cols}]；行数不含表头行"""
+    if ext == "xls":
+        import xlrd
+        if isinstance(path_or_bytes, (str, Path)):
+            book = xlrd.open_workbook(str(path_or_bytes), on_demand=True)
+        else:
+            book = xlrd.open_workbook(file_contents=path_or_bytes, on_demand=True)
+        index = []
+        for name in book.sheet_names():
+            sh = book.sheet_by_name(name)
+            index.append({"name": name, "rows": max(sh.nrows - 1, 0), "cols": sh.ncols})
+            book.unload_sheet(name)
+        book.release_resources()
+        return index
+
+    from openpyxl import load_workbook
+    wb = load_workbook(_as_source(path_or_bytes), read_only=True, data_only=True)
+    index = []
+    try:
+        for name in wb.sheetnames:
+            ws = wb[name]
+            rows, cols = getattr(ws, "max_row", None), getattr(ws, "max_column", None)
+            if not rows or not cols or (rows, cols) == (1, 1):
+                # 部分导出工具不写 <dimension>，逐行扫描（只读模式内存恒定）
+                rows = cols = 0
+                for r in ws.iter_rows(values_only=True):
+                    rows += 1
+                    cols = max(cols, len(r))
+            index.append({"name": name, "rows": max(rows - 1, 0), "cols": cols})
+    finally:
+        wb.close()
+    return index
+
+
+class LazyWorkbook:
+    """惰性工作簿：打开时只取 Sheet 索引，Sheet 在首次访问时才解析，并在进程内记忆。
+
+    传入 SheetCache 时，索引与已解析的 Sheet 同时落盘，重启后仍可直接读取。
+    """
+
+    def __init__(self, path_or_bytes, ext: str, cache: SheetCache = None, key: str = None):
+        self.source = path_or_bytes
+        self.ext = ext
+        self.cache = cache
+        self.key = key or SheetCache.key_for(path_or_bytes, ext)
+        self._frames: dict = {}
+        self._excel = None
+        self._lock = threading.Lock()
+        self.index = self._load_index()
+
+    def _load_index(self) -> list:
+        index = self.cache.get_index(self.key) if self.cache else None
+        if index is not None:
+            return index
+        if self.ext == "csv":
+            # CSV 只有一个 Sheet，直接解析并记忆
+            df = read_excel_file(self.source, "csv")["Sheet1"]
+            self._frames["Sheet1"] = df
+            index = [{"name": "Sheet1", "rows": len(df), "cols": len(df.columns)}]
+        else:
+            index = scan_sheet_index(self.source, self.ext)
+        if self.cache:
+            try:
+                self.cache.put_index(self.key, index)
+                if "Sheet1" in self._frames:
+                    self.cache.put_sheet(self.key, 0, self._frames["Sheet1"])
+            except Exception:
+                pass
+        return index
+
+    @property
+    def sheet_names(self) -> list:
+        return [s["name"] for s in self.index]
+
+    @property
+    def total_rows(self) -> int:
+        return sum(s["rows"] for s in self.index)
+
+    def dims(self, name: str) -> tuple:
+        for s in self.index:
+            if s["name"] == name:
+                return s["rows"], s["cols"]
+        raise KeyError(name)
+
+    @property
+    def streamable(self) -> bool:
+        return self.cache is not None and self.ext in ("xlsx", "csv") \
+            and isinstance(self.source, (str, Path))
+
+    @property
+    def ingested(self) -> bool:
+        """全部 Sheet 已入库；早期入库、未记录列类型的 xlsx 需重新入库"""
+        return self.cache is not None and all(
+            self.cache.has_sheet(self.key, i) and (self.ext == "csv" or "dtypes" in meta or not meta.get("text"))
+            for i, meta in enumerate(self.index)
+        )
+
+    def ingest(self, progress=None):
+        """流式入库全部 Sheet；之后读取 Sheet 直接走 Parquet，不再打开工作簿"""
+        if not self.streamable or self.ingested:
+            return
+        with self._lock:
+            self._frames.clear()
+            self.index = ingest_workbook(self.source, self.ext, self.cache, self.key, progress)
+
+    def head(self, name: str, n: int) -> pd.DataFrame:
+        """预览前 n 行：已入库的大表只读取所需行组，不整表载入"""
+        with self._lock:
+            df = self._frames.get(name)
+        if df is not None:
+            return df.head(n)
+        i = self.sheet_names.index(name)
+        meta = self.index[i]
+        if self.cache and meta.get("rows", 0) > n:
+            df = self.cache.get_sheet(self.key, i, meta, nrows=n)
+            if df is not None:
+                return df
+        return self.sheet(name).head(n)
+
+    @timed("parse")
+    def _parse(self, name: str) -> pd.DataFrame:
+        if self.ext == "csv":
+            return read_excel_file(self.source, "csv")["Sheet1"]
+        if self._excel is None:
+            engine = "xlrd" if self.ext == "xls" else "openpyxl"
+            self._excel = pd.ExcelFile(_as_source(self.source), engine=engine)
+        return self._excel.parse(name)
+
+    def sheet(self, name: str) -> pd.DataFrame:
+        with self._lock:
+            df = self._frames.get(name)
+            if df is not None:
+                return df
+            i = self.sheet_names.index(name)
+            df = self.cache.get_sheet(self.key, i, self.index[i]) if self.cache else None
+            if df is None:
+                df = self._parse(name)
+                if self.cache:
+                    try:
+                        self.cache.put_sheet(self.key, i, df)
+                    except Exception:
+                        pass
+            self._frames[name] = df
+            return df